@@ -0,0 +1,101 @@
+import json
+import os
+import re
+import threading
+
+from game_controls import games_actions
+from available_gesture_and_pose import available_gestures, available_poses
+
+DEFAULT_ALIAS_PATH = "./aliases.json"
+# Words that do not change which catalog entry is meant, e.g. "the fist" or "my index pinch"
+IGNORED_WORDS = {"a", "an", "the", "my"}
+
+
+def normalize_alias(text):
+    """
+    Lowercases, turns underscores, dashes and punctuation into spaces and drops articles,
+    so "Index-Pinch", "index pinch" and "index_pinch" all become "index pinch".
+    """
+    words = re.sub(r"[^0-9a-z]+", " ", text.lower()).split()
+    return " ".join(word for word in words if word not in IGNORED_WORDS)
+
+
+def load_aliases(alias_path):
+    """
+    Reads a JSON object of alias to catalog entry, e.g. {"thumbs up": "thumb_up", "hop": "jump"}.
+    """
+    with open(alias_path, encoding="utf-8") as alias_file:
+        aliases = json.load(alias_file)
+    if not isinstance(aliases, dict) or not all(isinstance(value, str) for value in aliases.values()):
+        raise ValueError(f"{alias_path} must be a JSON object of alias to catalog entry")
+    return aliases
+
+
+class AliasTable:
+    """
+    Resolves phrases that name a catalog entry (almost) literally without the sentence model.
+    Each candidate list gets a table of normalized label and alias to label, so an alias only
+    resolves to an entry that is actually one of the candidates. The catalog tables are built up
+    front, other lists on first use; a list that changes gets a new table. Only the max_tables most
+    recently built tables are kept, so a large game catalog does not keep a table for every game.
+    """
+
+    def __init__(self, aliases=None, gestures=available_gestures, poses=available_poses, actions=games_actions, max_tables=1024):
+        """
+        :param aliases: An optional dict of alias to catalog entry, see load_aliases.
+        :param max_tables: The number of candidate list tables that are kept.
+        """
+        self.max_tables = max_tables
+        self.aliases = {}
+        for alias, label in (aliases or {}).items():
+            self.aliases.setdefault(label, []).append(normalize_alias(alias))
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        for labels in [gestures, poses, *actions.values()]:
+            self._table_for(labels)
+
+    @classmethod
+    def from_file(cls, alias_path=DEFAULT_ALIAS_PATH, **catalogs):
+        """
+        Builds the table with the aliases of alias_path, or only the catalog entries if that file does not exist.
+        """
+        return cls(load_aliases(alias_path) if alias_path and os.path.exists(alias_path) else None, **catalogs)
+
+    def _table_for(self, labels):
+        key = tuple(labels)
+        table = self._tables.get(key)
+        if table is None:
+            table = {}
+            for label in labels:
+                for alias in [normalize_alias(label), *self.aliases.get(label, [])]:
+                    table.setdefault(alias, label)
+            with self._lock:
+                self._tables[key] = table
+                if len(self._tables) > self.max_tables:
+                    # Dicts keep insertion order, the oldest table goes first
+                    self._tables.pop(next(iter(self._tables)))
+        return table
+
+    def lookup(self, phrase, labels, record=True):
+        """
+        Returns the entry of labels the phrase names, or None if the sentence model has to decide.
+        Hits and misses are counted unless record is False.
+        """
+        label = self._table_for(labels).get(normalize_alias(phrase))
+        if record:
+            with self._lock:
+                if label is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        return label
+
+    def stats(self):
+        """
+        Returns how often the fast path resolved a phrase and how often the encoder was still needed.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,3 @@
+"""
+Speed measurements of the prediction pipeline, see the Benchmarks section of the README.
+"""
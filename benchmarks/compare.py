@@ -0,0 +1,60 @@
+import argparse
+import json
+import sys
+
+
+def metrics(results):
+    """
+    Flattens the timings of a results file into {"stages.ner.p95_ms": 1.2, ...}, skipping counts and settings.
+    """
+    flat = {}
+    for section in ("stages", "end_to_end"):
+        for name, summary in results.get(section, {}).items():
+            for key, value in summary.items():
+                if key.endswith("_ms") or key.endswith("_per_s"):
+                    flat[f"{section}.{name}.{key}"] = value
+    return flat
+
+
+def regression(key, old, new):
+    """
+    Returns how much worse new is than old as a fraction: higher latency or lower throughput is worse.
+    """
+    if not old:
+        return 0.0
+    change = (new - old) / old
+    return -change if key.endswith("_per_s") else change
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two results files written by pipeline_benchmark.py.")
+    parser.add_argument("baseline", help="Results of the reference run.")
+    parser.add_argument("candidate", help="Results of the run to check.")
+    parser.add_argument("--fail-above", type=float, default=None,
+                        help="Exit with an error if a p50, p95 or throughput figure is this many percent worse than the baseline.")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as baseline_file, open(args.candidate, encoding="utf-8") as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+    if baseline.get("schema") != candidate.get("schema"):
+        print(f"Warning: results use schema {baseline.get('schema')} and {candidate.get('schema')}", file=sys.stderr)
+    for name, results in (("baseline", baseline), ("candidate", candidate)):
+        env = results.get("environment", {})
+        print(f"{name:>9}: {env.get('commit') or 'unknown commit'}{' (dirty)' if env.get('dirty') else ''}, "
+              f"{env.get('processor') or env.get('machine')}, {env.get('cpu_count')} CPUs, Python {env.get('python')}")
+
+    old, new = metrics(baseline), metrics(candidate)
+    failed = []
+    for key in sorted(old.keys() & new.keys()):
+        worse = regression(key, old[key], new[key])
+        print(f"{key:<45} {old[key]:12.3f} {new[key]:12.3f} {-worse if key.endswith('_per_s') else worse:+8.1%}")
+        # p99 is too noisy on short runs to gate on
+        if args.fail_above is not None and not key.endswith("p99_ms") and worse * 100 > args.fail_above:
+            failed.append(key)
+    if failed:
+        print(f"Worse than the baseline by more than {args.fail_above}%: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from game_controls import games_actions
+from available_gesture_and_pose import available_gestures, available_poses
+from train_data import TRAIN_DATA
+
+ORIENTATIONS = ["left", "right"]
+
+
+def clause_templates(train_data=TRAIN_DATA):
+    """
+    Splits the annotated TRAIN_DATA sentences into game clauses (a GAME and no action) and binding clauses
+    (an ACTION-O with a pose or gesture). Each template is (text, [(start, end, label), ...]).
+    """
+    game_clauses = []
+    binding_clauses = []
+    for text, annotations in train_data:
+        entities = sorted(annotations["entities"])
+        labels = {label for _, _, label in entities}
+        if "GAME" in labels and "ACTION-O" not in labels:
+            game_clauses.append((text, entities))
+        elif "ACTION-O" in labels and labels & {"POSES", "GESTURE"}:
+            binding_clauses.append((text, entities))
+    return game_clauses, binding_clauses
+
+
+def fill_template(template, rng, game, offset=0):
+    """
+    Replaces every entity of a template with a catalog entry of the same kind and returns the new text
+    and its entities shifted by offset.
+    """
+    text, entities = template
+    parts = []
+    filled = []
+    position = 0
+    length = 0
+    for start, end, label in entities:
+        if label == "GAME":
+            value = game
+        elif label == "POSES":
+            value = rng.choice(available_poses).replace("_", " ")
+        elif label == "GESTURE":
+            value = rng.choice(available_gestures).replace("_", " ")
+        elif label == "ACTION-O":
+            value = rng.choice(games_actions[game])
+        elif label == "ORI":
+            value = rng.choice(ORIENTATIONS)
+        else:
+            value = text[start:end]
+        parts.append(text[position:start])
+        length += start - position
+        filled.append((offset + length, offset + length + len(value), label))
+        parts.append(value)
+        length += len(value)
+        position = end
+    parts.append(text[position:])
+    return "".join(parts), filled
+
+
+def clause_binding(text, entities):
+    """
+    Returns the expected output of a filled binding clause with exactly one pose or gesture and one action:
+    its output list ("poses" or "gestures"), the pose or gesture phrase and the catalog file it names, the action
+    phrase and the game action it names. The phrases are the catalog entries themselves, so the mapper resolves
+    them without the encoder and evaluate_pipeline.py scores them as literal bindings.
+    Returns None for other clauses, whose pairing is ambiguous.
+    """
+    motions = [(start, end, label) for start, end, label in entities if label in ("POSES", "GESTURE")]
+    actions = [(start, end) for start, end, label in entities if label == "ACTION-O"]
+    if len(motions) != 1 or len(actions) != 1:
+        return None
+    start, end, label = motions[0]
+    action = text[actions[0][0]:actions[0][1]]
+    # fill_template writes the catalog entries with spaces instead of underscores
+    return {"type": "poses" if label == "POSES" else "gestures", "motion_text": text[start:end], "files": text[start:end].replace(" ", "_"),
+            "action_text": action, "action": action}
+
+
+def generate_corpus(size, seed=0, max_bindings=3):
+    """
+    Returns size synthetic commands, each a game clause followed by up to max_bindings binding clauses
+    built from the TRAIN_DATA templates with random games, poses, gestures and actions from the catalogs.
+    Each command is a dict with "text", "game", the gold "entities" as (start, end, label) tuples and the gold
+    "bindings" of the clauses with one pose or gesture and one action, see clause_binding.
+    The same size and seed always give the same corpus.
+    """
+    rng = random.Random(seed)
+    game_clauses, binding_clauses = clause_templates()
+    games = list(games_actions)
+    corpus = []
+    for _ in range(size):
+        game = rng.choice(games)
+        text, entities = fill_template(rng.choice(game_clauses), rng, game)
+        bindings = []
+        for _ in range(rng.randint(0, max_bindings)):
+            clause, clause_entities = fill_template(rng.choice(binding_clauses), rng, game, offset=len(text) + 2)
+            text = f"{text}, {clause}"
+            entities += clause_entities
+            binding = clause_binding(text, clause_entities)
+            if binding is not None:
+                bindings.append(binding)
+        corpus.append({"text": text, "game": game, "entities": entities, "bindings": bindings})
+    return corpus
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Write a synthetic command corpus as JSONL.")
+    parser.add_argument("--size", type=int, default=1000, help="Number of commands.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+    for command in generate_corpus(args.size, args.seed):
+        print(json.dumps(command))
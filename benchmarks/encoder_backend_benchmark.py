@@ -0,0 +1,96 @@
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from label_index import LabelIndex, normalize_rows
+from game_controls import games_actions
+from available_gesture_and_pose import available_gestures, available_poses
+from onnx_encoder import OnnxSentenceEncoder, default_onnx_path
+from train_data import TRAIN_DATA
+
+
+def project_phrases():
+    """
+    Returns the pose/gesture and the action entity phrases of TRAIN_DATA plus the phrases of the integration tests.
+    """
+    motions = {"index pinch", "jump"}
+    actions = {"jump", "run", "walk"}
+    for text, annotations in TRAIN_DATA:
+        for start, end, label in annotations["entities"]:
+            if label in ("POSES", "GESTURE"):
+                motions.add(text[start:end])
+            elif label.startswith("ACTION"):
+                actions.add(text[start:end])
+    return sorted(motions), sorted(actions)
+
+
+def top1_labels(model, motions, actions):
+    """
+    Returns the top-1 label of every motion against the poses and the gestures, and of every action against every game's actions.
+    """
+    index = LabelIndex(model)
+    motion_embeddings = normalize_rows(np.asarray(model.encode(motions), dtype=np.float32))
+    action_embeddings = normalize_rows(np.asarray(model.encode(actions), dtype=np.float32))
+    labels = []
+    for catalog in [available_poses, available_gestures]:
+        matrix = index.matrix_for(catalog)
+        labels += [index.best_match(embedding, catalog, matrix) for embedding in motion_embeddings]
+    for game_actions in games_actions.values():
+        matrix = index.matrix_for(game_actions)
+        labels += [index.best_match(embedding, game_actions, matrix) for embedding in action_embeddings]
+    return labels
+
+
+def time_encode(model, phrases, repeat):
+    """
+    Returns the median milliseconds to encode one phrase and to encode all phrases in one call.
+    """
+    model.encode(phrases[:4])  # warm up
+    single = []
+    batch = []
+    for _ in range(repeat):
+        for phrase in phrases:
+            start = time.perf_counter()
+            model.encode([phrase])
+            single.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        model.encode(phrases, batch_size=32)
+        batch.append(time.perf_counter() - start)
+    return statistics.median(single) * 1000, statistics.median(batch) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the top-1 labels and the latency of the PyTorch and ONNX encoder backends.")
+    parser.add_argument("--model-path", default="./fine-tuned-model", help="Path of the sentence model.")
+    parser.add_argument("--onnx-path", default=None, help="Directory written by onnx_encoder.py, by default <model-path>-onnx.")
+    parser.add_argument("--repeat", type=int, default=5, help="How many times every phrase is encoded.")
+    parser.add_argument("--min-agreement", type=float, default=0.99, help="Exit with an error if a backend agrees with PyTorch on fewer top-1 labels.")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    onnx_path = args.onnx_path or default_onnx_path(args.model_path)
+    backends = {
+        "torch": SentenceTransformer(args.model_path),
+        "onnx": OnnxSentenceEncoder(onnx_path, quantized=False),
+        "onnx-int8": OnnxSentenceEncoder(onnx_path, quantized=True),
+    }
+    motions, actions = project_phrases()
+    reference = top1_labels(backends["torch"], motions, actions)
+    failed = False
+    for name, model in backends.items():
+        labels = reference if name == "torch" else top1_labels(model, motions, actions)
+        agreement = sum(label == expected for label, expected in zip(labels, reference)) / len(reference)
+        single_ms, batch_ms = time_encode(model, motions + actions, args.repeat)
+        print(f"{name:>9}: top-1 agreement {agreement:7.2%} ({len(reference)} lookups), "
+              f"{single_ms:6.2f} ms/phrase, {batch_ms:7.1f} ms per batch of {len(motions + actions)}")
+        failed |= agreement < args.min_agreement
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import spacy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import train_ner  # registers the legacy per-label matchers
+import entity_matchers  # registers the fused motion_entity_matcher
+from train_data import TRAIN_DATA
+
+LEGACY_COMPONENTS = ["game_entity_matcher", "gesture_entity_matcher", "pose_entity_matcher"]
+
+
+def build_pipelines(ner_model_path):
+    """
+    Loads the NER model twice, once with the three legacy matchers and once with the fused matcher.
+    """
+    legacy = spacy.load(ner_model_path, exclude=["motion_entity_matcher"] + LEGACY_COMPONENTS)
+    for name in LEGACY_COMPONENTS:
+        legacy.add_pipe(name)
+    fused = spacy.load(ner_model_path, exclude=LEGACY_COMPONENTS)
+    if "motion_entity_matcher" not in fused.pipe_names:
+        fused.add_pipe("motion_entity_matcher")
+    return legacy, fused
+
+
+def time_matchers(nlp, texts, repeat):
+    """
+    Returns the mean time in microseconds the matcher components spend per doc, and the mean end-to-end time per doc.
+    """
+    matchers = [(name, proc) for name, proc in nlp.pipeline if name != "ner"]
+    matcher_seconds = 0.0
+    total_seconds = 0.0
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            with nlp.select_pipes(enable=["ner"]):
+                doc = nlp(text)
+            matcher_start = time.perf_counter()
+            for _, proc in matchers:
+                doc = proc(doc)
+            end = time.perf_counter()
+            matcher_seconds += end - matcher_start
+            total_seconds += end - start
+    docs = repeat * len(texts)
+    return matcher_seconds / docs * 1e6, total_seconds / docs * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-doc cost of the legacy and fused entity matchers.")
+    parser.add_argument("--ner-model", default="./ner_model", help="Path of the spaCy NER model.")
+    parser.add_argument("--repeat", type=int, default=20, help="How many times every text is processed.")
+    args = parser.parse_args()
+
+    legacy, fused = build_pipelines(args.ner_model)
+    texts = []
+    for text, _ in TRAIN_DATA:
+        try:
+            legacy(text)
+        except IndexError:
+            # The legacy matchers label stale spans after a merge and crash on some docs
+            continue
+        texts.append(text)
+
+    for name, nlp in (("legacy", legacy), ("fused", fused)):
+        time_matchers(nlp, texts[:5], 1)  # warm up
+        matcher_us, total_us = time_matchers(nlp, texts, args.repeat)
+        print(f"{name:>6}: matchers {matcher_us:8.1f} us/doc, end-to-end {total_us:8.1f} us/doc ({len(texts)} docs x {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from importlib import metadata
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from benchmarks.corpus import generate_corpus
+from motion_game_mapper import MotionGameMapper, ENCODER_BACKENDS
+from available_gesture_and_pose import available_gestures, available_poses
+
+# Bumped when the layout of the results file changes
+SCHEMA_VERSION = 1
+PACKAGES = ["numpy", "spacy", "torch", "sentence-transformers", "onnxruntime"]
+
+
+def summarize(seconds):
+    """
+    Returns the count, mean and p50/p95/p99 in milliseconds of a list of durations in seconds.
+    """
+    milliseconds = np.asarray(seconds, dtype=np.float64) * 1000
+    if not len(milliseconds):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {"count": len(milliseconds), "mean_ms": float(milliseconds.mean()), "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def environment():
+    """
+    Returns what the results depend on besides the code: the commit, the interpreter, the machine and the package versions.
+    """
+    root = Path(__file__).resolve().parent.parent
+
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    packages = {}
+    for package in PACKAGES:
+        try:
+            packages[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            packages[package] = None
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "packages": packages,
+    }
+
+
+def time_stages(mapper, texts, json_path):
+    """
+    Runs every text through the pipeline one stage at a time and returns the durations of each stage in seconds:
+    tokenization, the statistical NER, the matcher components, encoding the entity phrases, similarity scoring
+    against the label index and writing the output as JSON. Phrases are encoded without the embedding cache,
+    and the similarity stage includes embedding a game's actions the first time that game comes up.
+    """
+    nlp = mapper.nlp
+    components = [(name, proc) for name, proc in nlp.pipeline if name != "ner"]
+    ner = nlp.get_pipe("ner")
+    stages = {name: [] for name in ("tokenize", "ner", "matchers", "encode", "similarity", "json")}
+    for text in texts:
+        start = time.perf_counter()
+        doc = nlp.make_doc(text)
+        stages["tokenize"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        doc = ner(doc)
+        stages["ner"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _, proc in components:
+            doc = proc(doc)
+        stages["matchers"].append(time.perf_counter() - start)
+
+        output_data = mapper.initialize_output_structure()
+        fields, game, pairs = mapper._parse_doc(doc)
+        output_data.update(fields)
+        game = mapper.resolve_game(game) if game else game
+        actions = mapper._game_actions(game) if game else []
+        if pairs:
+            phrases = list(dict.fromkeys(phrase for pair in pairs for _, phrase in pair))
+            start = time.perf_counter()
+            embeddings = mapper.sentence_model.encode(phrases)
+            stages["encode"].append(time.perf_counter() - start)
+            embeddings = dict(zip(phrases, np.asarray(embeddings, dtype=np.float32)))
+
+            start = time.perf_counter()
+            for (kind, motion), (_, action) in pairs:
+                labels = available_poses if kind == "P" else available_gestures
+                mapper.label_index.best_match(embeddings[motion], labels, mapper.label_index.matrix_for(labels))
+                if actions:
+                    mapper.label_index.best_match(embeddings[action], actions, mapper.label_index.matrix_for_game(game, actions))
+            stages["similarity"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with open(json_path, 'w', encoding='utf-8') as json_file:
+            json.dump(output_data, json_file, indent=4)
+        stages["json"].append(time.perf_counter() - start)
+    return stages
+
+
+def time_end_to_end(mapper, texts, json_path, batch_size):
+    """
+    Returns the latency of predict_to_json per text, the throughput of calling it for every text in turn
+    and the throughput of predict_batch. The embedding cache is cleared before each run.
+    """
+    mapper.embedding_cache.clear()
+    latencies = []
+    start = time.perf_counter()
+    for text in texts:
+        text_start = time.perf_counter()
+        mapper.predict_to_json(text, json_path)
+        latencies.append(time.perf_counter() - text_start)
+    sequential_seconds = time.perf_counter() - start
+
+    mapper.embedding_cache.clear()
+    start = time.perf_counter()
+    mapper.predict_batch(texts, batch_size=batch_size)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "predict_to_json": dict(summarize(latencies), throughput_per_s=len(texts) / sequential_seconds),
+        "predict_batch": {"count": len(texts), "batch_size": batch_size, "throughput_per_s": len(texts) / batch_seconds},
+    }
+
+
+def run(size=500, seed=0, warmup=20, batch_size=64, mapper_kwargs=None):
+    """
+    Benchmarks a mapper on a synthetic corpus and returns the results as a JSON serializable dict.
+    """
+    config = {"size": size, "seed": seed, "warmup": warmup, "batch_size": batch_size, **(mapper_kwargs or {})}
+    start = time.perf_counter()
+    mapper = MotionGameMapper(**(mapper_kwargs or {}))
+    load_seconds = time.perf_counter() - start
+    texts = [command["text"] for command in generate_corpus(size, seed)]
+    warmup_texts = [command["text"] for command in generate_corpus(warmup, seed + 1)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, "output.json")
+        time_stages(mapper, warmup_texts, json_path)
+        stages = time_stages(mapper, texts, json_path)
+        end_to_end = time_end_to_end(mapper, texts, json_path, batch_size)
+    return {
+        "schema": SCHEMA_VERSION,
+        "environment": environment(),
+        "config": config,
+        "load_seconds": load_seconds,
+        "stages": {stage: summarize(seconds) for stage, seconds in stages.items()},
+        "end_to_end": end_to_end,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of the prediction pipeline and the end-to-end latency on a synthetic command corpus.")
+    parser.add_argument("--size", type=int, default=500, help="Number of commands in the corpus.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the corpus.")
+    parser.add_argument("--warmup", type=int, default=20, help="Number of commands run before timing.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Batch size of the predict_batch run.")
+    parser.add_argument("--model-path", default="./fine-tuned-model", help="Path of the sentence model.")
+    parser.add_argument("--ner-model", default="./ner_model", help="Path of the spaCy NER model.")
+    parser.add_argument("--encoder-backend", choices=ENCODER_BACKENDS, default="torch", help="Sentence encoder backend.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file, compare two of them with benchmarks/compare.py.")
+    args = parser.parse_args()
+
+    results = run(args.size, args.seed, args.warmup, args.batch_size,
+                  {"model_path": args.model_path, "ner_model_path": args.ner_model, "encoder_backend": args.encoder_backend})
+    for stage, summary in results["stages"].items():
+        if summary["count"]:
+            print(f"{stage:>10}: mean {summary['mean_ms']:7.3f} ms, p50 {summary['p50_ms']:7.3f} ms, p95 {summary['p95_ms']:7.3f} ms, "
+                  f"p99 {summary['p99_ms']:7.3f} ms ({summary['count']} docs)")
+    single = results["end_to_end"]["predict_to_json"]
+    print(f"end-to-end: p50 {single['p50_ms']:.2f} ms, p95 {single['p95_ms']:.2f} ms, p99 {single['p99_ms']:.2f} ms, "
+          f"{single['throughput_per_s']:.1f} commands/s")
+    print(f"     batch: {results['end_to_end']['predict_batch']['throughput_per_s']:.1f} commands/s")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
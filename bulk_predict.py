@@ -0,0 +1,125 @@
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+from motion_game_mapper import MotionGameMapper
+from prefork import pin_threads
+
+# The mapper of the current worker process, loaded once by _init_worker
+_mapper = None
+_load_error = None
+
+
+def read_records(lines, input_format="text"):
+    """
+    Yields one record dict per input line. Plain text lines become {"text": line}, JSONL lines must be
+    objects with a "text" string or a bare string. Blank lines are skipped.
+    """
+    for line_number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+        if input_format == "text":
+            yield {"text": line}
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"line": line_number, "error": f"Invalid JSON: {e}"}
+            continue
+        if isinstance(record, str):
+            record = {"text": record}
+        if not isinstance(record, dict) or not isinstance(record.get("text"), str):
+            yield {"line": line_number, "error": "Expected an object with a \"text\" string"}
+            continue
+        yield record
+
+
+def chunked(records, chunk_size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(mapper_kwargs, threads=None):
+    global _mapper, _load_error
+    if threads:
+        # Before the models start their thread pools, so the workers share the cores instead of each taking all of them
+        pin_threads(threads)
+    try:
+        _mapper = MotionGameMapper(**mapper_kwargs)
+        # Pool workers end with os._exit, which skips the embedding store's own flush at exit
+        multiprocessing.util.Finalize(None, _mapper.flush_embedding_store, exitpriority=10)
+    except SystemExit:
+        # The mapper printed the error and exits, the pool would keep restarting a worker that exits
+        _load_error = "see the error above"
+    except Exception as e:
+        _load_error = str(e)
+
+
+def _predict_chunk(chunk):
+    """
+    Returns the output records of a chunk of input records, in order. The prediction is added under "prediction".
+    """
+    if _mapper is None:
+        raise RuntimeError(f"Error loading models: {_load_error}")
+    texts = [record["text"] for record in chunk if "error" not in record]
+    predictions = iter(_mapper.predict_batch(texts))
+    return [record if "error" in record else dict(record, prediction=next(predictions)) for record in chunk]
+
+
+def predict_chunks(chunks, workers, mapper_kwargs):
+    """
+    Yields the output of each chunk in input order. At most two chunks per worker are in flight,
+    so the input is read only as fast as it is processed and memory does not grow with its size.
+    With workers=0 the chunks are processed in this process.
+    """
+    if workers == 0:
+        _init_worker(mapper_kwargs)
+        for chunk in chunks:
+            yield _predict_chunk(chunk)
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(mapper_kwargs, threads)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_predict_chunk, (chunk,)))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        # Lets the workers exit and run their finalizers, leaving the with block would terminate them
+        pool.close()
+        pool.join()
+
+
+def run(input_file, output_file, input_format="text", workers=1, chunk_size=64, mapper_kwargs=None, progress_seconds=2.0, progress=sys.stderr):
+    """
+    Streams predictions for every line of input_file to output_file as JSONL and returns the number of records.
+    Progress and the final throughput are written to progress (pass None to stay quiet).
+    """
+    start = last_report = time.perf_counter()
+    count = 0
+    records = read_records(input_file, input_format)
+    for outputs in predict_chunks(chunked(records, chunk_size), workers, mapper_kwargs or {}):
+        for output in outputs:
+            output_file.write(json.dumps(output) + "\n")
+        count += len(outputs)
+        now = time.perf_counter()
+        if progress is not None and now - last_report >= progress_seconds:
+            last_report = now
+            print(f"{count} records, {count / (now - start):.1f} records/s", file=progress, flush=True)
+    output_file.flush()
+    if progress is not None:
+        seconds = time.perf_counter() - start
+        print(f"Processed {count} records in {seconds:.1f} s ({count / seconds if seconds else 0.0:.1f} records/s)", file=progress, flush=True)
+    return count
@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+
+
+def normalize_phrase(phrase):
+    """
+    Lowercases the phrase and collapses whitespace. The fine-tuned encoder is uncased,
+    so phrases that only differ in case or spacing share one embedding.
+    """
+    return " ".join(phrase.lower().split())
+
+
+class EmbeddingCache:
+    """
+    A thread-safe LRU cache of phrase embeddings keyed on the encoder model identity and the normalized phrase.
+    """
+
+    def __init__(self, max_entries=4096, max_bytes=None):
+        """
+        Initializes an empty cache.
+
+        :param max_entries: The maximum number of embeddings kept, or None for no entry cap.
+        :param max_bytes: The maximum total size of the kept embeddings in bytes, or None for no byte cap.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, model_id, phrase):
+        """
+        Returns the cached embedding for the phrase, or None on a miss.
+        """
+        key = (model_id, normalize_phrase(phrase))
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, model_id, phrase, embedding):
+        """
+        Stores an embedding, evicting the least recently used entries to stay within the caps.
+        """
+        if self.max_entries == 0:
+            return
+        key = (model_id, normalize_phrase(phrase))
+        # Cached arrays are shared between callers, so make sure nobody modifies them in place
+        embedding = embedding.copy()
+        embedding.setflags(write=False)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[key] = embedding
+            self._bytes += embedding.nbytes
+            while self._entries and self._over_capacity():
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def _over_capacity(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+    def clear(self):
+        """
+        Drops every cached embedding. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns the hit, miss and eviction counters along with the current size of the cache.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def __len__(self):
+        return len(self._entries)
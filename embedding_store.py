@@ -0,0 +1,285 @@
+import atexit
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows, where writers are not serialized and a segment written at the same time as another can miss the manifest
+    fcntl = None
+
+from embedding_cache import normalize_phrase
+
+
+def model_fingerprint(model_path):
+    """
+    Content hash of every file in a sentence model directory, so a retrained model gets a new fingerprint.
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, model_path).replace(os.sep, "/").encode("utf-8"))
+            with open(path, "rb") as model_file:
+                for chunk in iter(lambda: model_file.read(1 << 20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """
+    An on-disk store of phrase and label embeddings for one encoder fingerprint.
+
+    Embeddings are kept in segments: a float32 .npy matrix that is memory-mapped read-only, plus a JSON list of
+    the keys of its rows. manifest.json lists the live segments with a generation that every write increments,
+    and a reader only reads it again once the file changed, so looking for other processes' writes costs one stat.
+
+    Appended embeddings are buffered in memory and written as one segment once flush_size of them are pending or
+    the oldest is flush_seconds old, and when the process exits. A writer holds a lock file while it adds its
+    segment to the manifest, and merges all segments into one once there are more than max_segments. Files are only
+    ever written to a temporary file and renamed into place, manifest last, so readers in other processes never
+    see a partial segment and a crash while writing leaves at most an ignored temporary file behind. Merged
+    segments are deleted retire_seconds later, so a reader that read the manifest just before can still map them.
+    """
+
+    KEYS_SUFFIX = ".keys.json"
+    MANIFEST = "manifest.json"
+    LOCK = ".lock"
+
+    def __init__(self, root, fingerprint, flush_size=256, flush_seconds=5.0, max_segments=16, retire_seconds=60.0):
+        """
+        Opens (or creates) the store for the given encoder fingerprint.
+
+        :param root: The directory holding the stores of all encoders.
+        :param fingerprint: The fingerprint of the encoder, see model_fingerprint.
+        :param flush_size: The number of buffered embeddings that are written as a segment.
+        :param flush_seconds: How long an appended embedding is buffered at most, checked on the next append.
+        :param max_segments: The number of segments above which a write merges them all into one.
+        :param retire_seconds: How long merged segments are kept for the readers that still map them.
+        """
+        self.fingerprint = fingerprint
+        self.directory = os.path.join(root, fingerprint[:16])
+        os.makedirs(self.directory, exist_ok=True)
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.max_segments = max_segments
+        self.retire_seconds = retire_seconds
+        self._lock = threading.RLock()
+        self._segments = {}
+        self._rows = {}
+        self._pending = {}
+        self._pending_since = None
+        # The stat of the manifest last read, False until it is read
+        self._manifest_stat = False
+        self.refresh()
+        # A weak reference, so the handler does not keep every store ever opened alive
+        atexit.register(_flush_store, weakref.ref(self))
+
+    def refresh(self):
+        """
+        Maps the segments written by other processes if the manifest changed since the last refresh.
+        Returns the number of new segments.
+        """
+        with self._lock:
+            manifest_stat = self._stat_manifest()
+            if manifest_stat == self._manifest_stat:
+                return 0
+            # Read after the stat, a write in between only makes the next refresh read the manifest again
+            segments = self._read_manifest()["segments"]
+            self._manifest_stat = manifest_stat
+            if any(segment not in segments for segment in self._segments):
+                # Merged into a new segment, drop the maps of the old ones
+                self._segments = {}
+                self._rows = {}
+            new_segments = 0
+            for segment in segments:
+                if segment not in self._segments:
+                    new_segments += self._open_segment(segment)
+            return new_segments
+
+    def _stat_manifest(self):
+        try:
+            stat = os.stat(os.path.join(self.directory, self.MANIFEST))
+        except FileNotFoundError:
+            return None
+        # A new manifest is renamed into place, so its inode changes with every write
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, self.MANIFEST), "r", encoding="utf-8") as manifest_file:
+                return json.load(manifest_file)
+        except FileNotFoundError:
+            # A store written before the manifest existed, or an empty one
+            segments = sorted(name[:-len(self.KEYS_SUFFIX)] for name in os.listdir(self.directory) if name.endswith(self.KEYS_SUFFIX))
+            return {"generation": 0, "segments": segments, "retired": {}}
+
+    def _open_segment(self, segment):
+        try:
+            with open(os.path.join(self.directory, segment + self.KEYS_SUFFIX), "r", encoding="utf-8") as keys_file:
+                keys = json.load(keys_file)
+            matrix = np.load(os.path.join(self.directory, segment + ".npy"), mmap_mode="r")
+        except FileNotFoundError:
+            # Merged and deleted since the manifest was read, the next refresh reads the newer manifest
+            self._manifest_stat = False
+            return False
+        self._segments[segment] = matrix
+        for row, key in enumerate(keys):
+            # The first segment to store a key wins, later duplicates from racing writers are ignored
+            self._rows.setdefault(key, (segment, row))
+        return True
+
+    def get(self, phrase):
+        """
+        Returns the stored embedding of a phrase as a read-only view, or None if it is not stored.
+        """
+        key = normalize_phrase(phrase)
+        with self._lock:
+            embedding = self._pending.get(key)
+            if embedding is not None:
+                return embedding
+            location = self._rows.get(key)
+            if location is None:
+                return None
+            segment, row = location
+            return self._segments[segment][row]
+
+    def get_many(self, phrases):
+        """
+        Returns a dict of phrase to stored embedding for the phrases found in the store.
+        Segments written by other processes are picked up when a phrase is missing.
+        """
+        found = {phrase: self.get(phrase) for phrase in phrases}
+        if any(embedding is None for embedding in found.values()) and self.refresh():
+            found = {phrase: self.get(phrase) for phrase in phrases}
+        return {phrase: embedding for phrase, embedding in found.items() if embedding is not None}
+
+    def append(self, embeddings):
+        """
+        Buffers the given dict of phrase to embedding, skipping phrases already stored, and writes the buffer
+        as a new segment once it is full or old enough.
+        """
+        with self._lock:
+            for phrase, embedding in embeddings.items():
+                key = normalize_phrase(phrase)
+                if key not in self._rows and key not in self._pending:
+                    self._pending[key] = np.asarray(embedding, dtype=np.float32)
+            if not self._pending:
+                return
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            if len(self._pending) >= self.flush_size or time.monotonic() - self._pending_since >= self.flush_seconds:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered embeddings as a new segment.
+        """
+        self._write(compact=False)
+
+    def compact(self):
+        """
+        Writes the buffered embeddings and merges all segments into one, which writes also do on their own
+        once there are more than max_segments.
+        """
+        self._write(compact=True)
+
+    def _write(self, compact):
+        with self._lock:
+            keys = list(self._pending)
+            if not keys and not compact:
+                return
+            with self._writer_lock():
+                manifest = self._read_manifest()
+                segments = list(manifest["segments"])
+                if keys:
+                    matrix = np.asarray([self._pending[key] for key in keys], dtype=np.float32).reshape(len(keys), -1)
+                    segments.append(self._write_segment(keys, matrix))
+                if len(segments) < 2 and not keys:
+                    return
+                retired = manifest.get("retired", {})
+                if len(segments) > self.max_segments or (compact and len(segments) > 1):
+                    merged = self._write_segment(*self._merge(segments))
+                    retired.update(dict.fromkeys(segments, time.time()))
+                    segments = [merged]
+                self._remove_retired(retired)
+                manifest = {"generation": manifest["generation"] + 1, "segments": segments, "retired": retired}
+                self._write_atomically(self.MANIFEST, lambda manifest_file: manifest_file.write(json.dumps(manifest).encode("utf-8")))
+            self._pending = {}
+            self._pending_since = None
+            self.refresh()
+
+    @contextlib.contextmanager
+    def _writer_lock(self):
+        with open(os.path.join(self.directory, self.LOCK), "ab") as lock_file:
+            if fcntl is not None:
+                # Released when the file is closed
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _merge(self, segments):
+        """
+        Returns the keys and the matrix of all rows of the segments, the first row of a duplicated key wins.
+        """
+        rows = {}
+        for segment in segments:
+            with open(os.path.join(self.directory, segment + self.KEYS_SUFFIX), "r", encoding="utf-8") as keys_file:
+                keys = json.load(keys_file)
+            matrix = np.load(os.path.join(self.directory, segment + ".npy"), mmap_mode="r")
+            for row, key in enumerate(keys):
+                rows.setdefault(key, matrix[row])
+        keys = list(rows)
+        return keys, np.asarray([rows[key] for key in keys], dtype=np.float32).reshape(len(keys), -1)
+
+    def _write_segment(self, keys, matrix):
+        segment = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._write_atomically(segment + ".npy", lambda segment_file: np.save(segment_file, matrix))
+        self._write_atomically(segment + self.KEYS_SUFFIX, lambda keys_file: keys_file.write(json.dumps(keys).encode("utf-8")))
+        return segment
+
+    def _remove_retired(self, retired):
+        now = time.time()
+        for segment, retired_at in list(retired.items()):
+            if now - retired_at < self.retire_seconds:
+                continue
+            # Remove the keys file first so a reader never maps a segment without its matrix
+            for name in (segment + self.KEYS_SUFFIX, segment + ".npy"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+            del retired[segment]
+
+    def _write_atomically(self, name, write):
+        path = os.path.join(self.directory, name)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as temp_file:
+            write(temp_file)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+
+    def __contains__(self, phrase):
+        key = normalize_phrase(phrase)
+        return key in self._rows or key in self._pending
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rows) + len(self._pending)
+
+
+def _flush_store(store_ref):
+    store = store_ref()
+    if store is not None:
+        try:
+            store.flush()
+        except OSError as e:
+            print(f"Error writing the buffered embeddings to {store.directory}: {e}")
@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+
+class MicroBatchEncoder:
+    """
+    Coalesces encode calls from concurrent callers into one encoder batch. The first pending call waits
+    at most max_wait_ms for others to join, or less once max_batch_size phrases are pending; then every
+    distinct pending phrase is encoded together and each caller gets its own rows back.
+    """
+
+    def __init__(self, encode, max_wait_ms=5.0, max_batch_size=64):
+        """
+        Starts the background thread that runs the batches.
+
+        :param encode: A function that takes a list of phrases and returns one embedding row per phrase.
+        :param max_wait_ms: How long the first pending call waits for others to join its batch.
+        :param max_batch_size: The number of pending phrases that starts a batch without waiting any longer.
+        """
+        self._encode = encode
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = {}
+        self._batches = 0
+        self._requests = 0
+        self._phrases = 0
+        self._queue_delay_total = 0.0
+        self._queue_delay_max = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="micro-batch-encoder", daemon=True)
+        self._thread.start()
+
+    def encode(self, phrases):
+        """
+        Returns the embeddings of the phrases as a matrix, in the order given. Blocks until their batch ran.
+        Raises RuntimeError once the encoder is closed, no batch would run for the phrases anymore.
+        """
+        if not phrases:
+            return np.zeros((0, 0), dtype=np.float32)
+        future = Future()
+        # Checked and enqueued under the lock, so a call racing close() is either run before the stop or rejected
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatchEncoder is closed")
+            self._queue.put((list(phrases), future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        requests = [first]
+        pending = len(first[0])
+        deadline = first[2] + self.max_wait_ms / 1000
+        while pending < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                # Finish this batch, then stop
+                self._queue.put(None)
+                break
+            requests.append(request)
+            pending += len(request[0])
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            if requests is None:
+                return
+            started = time.perf_counter()
+            # Length-sorted distinct phrases keep the padding inside the encoder batch small
+            phrases = sorted({phrase for request in requests for phrase in request[0]}, key=lambda phrase: (len(phrase), phrase))
+            try:
+                embeddings = np.asarray(self._encode(phrases), dtype=np.float32).reshape(len(phrases), -1)
+            except Exception as e:
+                for _, future, _ in requests:
+                    future.set_exception(e)
+                continue
+            rows = {phrase: i for i, phrase in enumerate(phrases)}
+            for request_phrases, future, _ in requests:
+                future.set_result(embeddings[[rows[phrase] for phrase in request_phrases]])
+            self._record(requests, len(phrases), started)
+
+    def _record(self, requests, batch_size, started):
+        with self._lock:
+            self._batches += 1
+            self._requests += len(requests)
+            self._phrases += batch_size
+            self._batch_sizes[batch_size] = self._batch_sizes.get(batch_size, 0) + 1
+            for _, _, enqueued in requests:
+                delay = started - enqueued
+                self._queue_delay_total += delay
+                self._queue_delay_max = max(self._queue_delay_max, delay)
+
+    def stats(self):
+        """
+        Returns the achieved batch sizes (in distinct phrases) and the time calls spent queued before their batch ran.
+        """
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "requests": self._requests,
+                "phrases": self._phrases,
+                "mean_batch_size": self._phrases / self._batches if self._batches else 0.0,
+                "max_batch_size": max(self._batch_sizes, default=0),
+                "batch_size_counts": dict(sorted(self._batch_sizes.items())),
+                "mean_queue_delay_ms": self._queue_delay_total / self._requests * 1000 if self._requests else 0.0,
+                "max_queue_delay_ms": self._queue_delay_max * 1000,
+            }
+
+    def close(self):
+        """
+        Runs the pending batches and stops the background thread. Later encode calls raise RuntimeError.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
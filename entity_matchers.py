@@ -0,0 +1,243 @@
+from spacy.language import Language
+from spacy.matcher import Matcher
+from spacy.tokens import Span
+from spacy.util import filter_spans
+
+from game_controls import games_actions
+from available_gesture_and_pose import available_gestures, available_poses
+
+# Game patterns that cannot be derived from the game names in games_actions
+EXTRA_GAME_PATTERNS = [
+    [{"LOWER": "horizon"}],
+    [{"LOWER": "final"}, {"LOWER": "fantasy"}],
+    [{"LOWER": "poker"}],
+    [{"LOWER": "final"}, {"LOWER": "fantasy"}, {"IS_DIGIT": True}],
+    [{"LOWER": "final"}, {"LOWER": "fantasy"}, {"TEXT": {"REGEX": "^(X|V|I)+$"}}],
+    [{"LOWER": "rocketleague"}, {"OP": "?"}],
+    [{"LOWER": "star"}, {"LOWER": "wars"}, {"IS_ALPHA": True, "OP": "*"}],
+]
+
+
+def phrase_patterns(nlp, phrases):
+    """
+    Turns catalog entries like "index_pinch" or "Rocket League" into case-insensitive token patterns.
+    """
+    patterns = []
+    for phrase in phrases:
+        pattern = [{"LOWER": token.lower_} for token in nlp.make_doc(phrase.replace("_", " "))]
+        if pattern and pattern not in patterns:
+            patterns.append(pattern)
+    return patterns
+
+
+class MotionEntityMatcher:
+    """
+    Matches game, gesture and pose names in a doc, merges every match into a single token
+    and labels it. All patterns are compiled once when the pipeline is loaded.
+    """
+
+    def __init__(self, nlp, name, label_priority, split_labels):
+        """
+        Compiles the patterns of every label.
+
+        :param nlp: The pipeline the component is added to.
+        :param name: The component name.
+        :param label_priority: The labels in the order they win overlapping matches.
+        :param split_labels: The labels whose matches are split off from a longer NER entity.
+        """
+        self.name = name
+        self.label_priority = label_priority
+        self.split_labels = set(split_labels)
+        self.matcher = Matcher(nlp.vocab)
+        patterns = {
+            "GAME": phrase_patterns(nlp, games_actions) + EXTRA_GAME_PATTERNS,
+            "GESTURE": phrase_patterns(nlp, available_gestures),
+            "POSES": phrase_patterns(nlp, available_poses),
+        }
+        for label in label_priority:
+            self.matcher.add(label, patterns[label])
+
+    def __call__(self, doc):
+        matches_by_label = {label: [] for label in self.label_priority}
+        for match_id, start, end in self.matcher(doc):
+            matches_by_label[doc.vocab.strings[match_id]].append(doc[start:end])
+
+        # A label only gets the tokens left over by the labels before it, longest match first within a label
+        taken = set()
+        selected = []
+        for label in self.label_priority:
+            candidates = [span for span in matches_by_label[label] if taken.isdisjoint(range(span.start, span.end))]
+            for span in filter_spans(candidates):
+                taken.update(range(span.start, span.end))
+                selected.append((span.start_char, span.end_char, label))
+        if not selected:
+            return doc
+
+        with doc.retokenize() as retokenizer:
+            for start_char, end_char, label in selected:
+                retokenizer.merge(doc.char_span(start_char, end_char))
+
+        # Character offsets survive the merge, token indices do not
+        relabel = {}
+        for start_char, end_char, label in selected:
+            token = doc.char_span(start_char, end_char)[0]
+            if token.ent_iob_ != "O":
+                relabel[token.i] = label
+        if relabel:
+            doc.ents = self._relabel_entities(doc, relabel)
+        return doc
+
+    def _relabel_entities(self, doc, relabel):
+        """
+        Matches never create entities. A match that is a whole NER entity relabels it, and a match of a
+        split label inside a longer NER entity is split off as its own entity. Other matches inside a
+        longer entity leave it as the NER found it.
+        """
+        entities = []
+        for ent in doc.ents:
+            if len(ent) == 1 and ent.start in relabel:
+                entities.append(Span(doc, ent.start, ent.end, label=relabel[ent.start]))
+                continue
+            start = ent.start
+            for i in range(ent.start, ent.end):
+                if relabel.get(i) in self.split_labels:
+                    if start < i:
+                        entities.append(Span(doc, start, i, label=ent.label))
+                    entities.append(Span(doc, i, i + 1, label=relabel[i]))
+                    start = i + 1
+            if start < ent.end:
+                entities.append(Span(doc, start, ent.end, label=ent.label))
+        return entities
+
+
+@Language.factory("motion_entity_matcher", default_config={"label_priority": ["GAME", "GESTURE", "POSES"], "split_labels": ["GAME"]})
+def create_motion_entity_matcher(nlp, name, label_priority, split_labels):
+    return MotionEntityMatcher(nlp, name, label_priority, split_labels)
+
+
+# The per-label matchers below are kept so models saved before motion_entity_matcher still load
+@Language.component("game_entity_matcher")
+def game_entity_matcher(doc):
+    matcher = Matcher(doc.vocab)
+    patterns = [
+        [{"LOWER": "minecraft"}],
+        [{"LOWER": "rocket"}, {"LOWER": "league"}],
+        [{"LOWER": "tetris"}],
+        [{"LOWER": "tetris"}],
+        [{"LOWER": "horizon"}],
+        [{"LOWER": "fifa"}],
+        [{"LOWER": "final"}, {"LOWER": "fantasy"}],
+        [{"LOWER": "poker"}],
+        [{"LOWER": "roblox"}],
+        [{"LOWER": "final"}, {"LOWER": "fantasy"}, {"IS_DIGIT": True}],
+        [{"LOWER": "final"}, {"LOWER": "fantasy"}, {"TEXT": {"REGEX": "^(X|V|I)+$"}}],
+        [{"LOWER": "rocketleague"}, {"OP": "?"}],
+        [{"LOWER": "star"}, {"LOWER": "wars"}, {"IS_ALPHA": True, "OP": "*"}],
+    ]
+    matcher.add("GAME", patterns)
+    matches = matcher(doc)
+    spans = [doc[start:end] for match_id, start, end in matches]
+    filtered_spans = filter_spans(spans)
+
+    with doc.retokenize() as retokenizer:
+        for span in filtered_spans:
+            retokenizer.merge(span)
+
+    for span in filtered_spans:
+        span.root.ent_type_ = "GAME"
+    return doc
+
+@Language.component("gesture_entity_matcher")
+def gesture_entity_matcher(doc):
+    matcher = Matcher(doc.vocab)
+    # Patterns based on the gestures list
+    gesture_patterns = [
+        [{"LOWER": "bow"}, {"LOWER": "arrow"}],
+        [{"LOWER": "fighting"}, {"LOWER": "stance"}],
+        [{"LOWER": "front"}, {"LOWER": "kick"}],
+        [{"LOWER": "hadouken"}],
+        [{"LOWER": "helicopter"}],
+        [{"LOWER": "index"}, {"LOWER": "pinch"}],
+        [{"LOWER": "kick"}],
+        [{"LOWER": "left"}, {"LOWER": "hook"}],
+        [{"LOWER": "left"}, {"LOWER": "kick"}],
+        [{"LOWER": "left"}, {"LOWER": "punch"}],
+        [{"LOWER": "mine"}],
+        [{"LOWER": "punch"}],
+        [{"LOWER": "push"}, {"LOWER": "back"}],
+        [{"LOWER": "right"}, {"LOWER": "clockwise"}, {"LOWER": "circle"}],
+        [{"LOWER": "right"}, {"LOWER": "hook"}],
+        [{"LOWER": "right"}, {"LOWER": "kick"}],
+        [{"LOWER": "right"}, {"LOWER": "punch"}],
+        [{"LOWER": "uppercut"}],
+        [{"LOWER": "walk"}, {"LOWER": "left"}],
+        [{"LOWER": "walk"}, {"LOWER": "right"}],
+    ]
+    matcher
+    matcher.add("GESTURE", gesture_patterns)
+    matches = matcher(doc)
+    spans = [doc[start:end] for match_id, start, end in matches]
+    filtered_spans = filter_spans(spans)
+
+    with doc.retokenize() as retokenizer:
+        for span in filtered_spans:
+            retokenizer.merge(span)
+
+    for span in filtered_spans:
+        span.root.ent_type_ = "GESTURE"
+    return doc
+
+@Language.component("pose_entity_matcher")
+def pose_entity_matcher(doc):
+    matcher = Matcher(doc.vocab)
+    # Patterns based on the poses list
+    pose_patterns = [
+        [{"LOWER": "fist"}],
+        [{"LOWER": "fist2"}],
+        [{"LOWER": "five"}, {"LOWER": "fingers"}, {"LOWER": "pinch"}],
+        [{"LOWER": "four"}, {"LOWER": "fingers"}, {"LOWER": "pinch"}],
+        [{"LOWER": "full"}, {"LOWER": "pinch"}],
+        [{"LOWER": "gun"}, {"LOWER": "click"}],
+        [{"LOWER": "gun"}, {"LOWER": "click2"}],
+        [{"LOWER": "gun"}, {"LOWER": "click3"}],
+        [{"LOWER": "hand"}, {"LOWER": "backward"}],
+        [{"LOWER": "hand"}, {"LOWER": "forward"}],
+        [{"LOWER": "index"}, {"LOWER": "pinch"}],
+        [{"LOWER": "index"}],
+        [{"LOWER": "palm"}, {"LOWER": "stop"}],
+        [{"LOWER": "peace"}],
+        [{"LOWER": "pinky"}, {"LOWER": "2"}, {"LOWER": "up"}],
+        [{"LOWER": "pinky"}, {"LOWER": "3"}, {"LOWER": "up"}],
+        [{"LOWER": "pinky"}, {"LOWER": "up"}, {"LOWER": "education"}],
+        [{"LOWER": "pinky"}, {"LOWER": "up"}],
+        [{"LOWER": "punch"}, {"LOWER": "heavy"}],
+        [{"LOWER": "punch"}, {"LOWER": "light"}],
+        [{"LOWER": "shoot"}],
+        [{"LOWER": "three"}, {"LOWER": "fingers"}, {"LOWER": "pinch"}, {"LOWER": "hand"}, {"LOWER": "closed"}],
+        [{"LOWER": "three"}, {"LOWER": "fingers"}, {"LOWER": "pinch"}],
+        [{"LOWER": "three"}, {"LOWER": "fingers"}, {"LOWER": "release"}, {"LOWER": "hand"}, {"LOWER": "closed"}],
+        [{"LOWER": "three"}, {"LOWER": "fingers"}],
+        [{"LOWER": "thumb"}, {"LOWER": "index"}, {"LOWER": "pinch"}, {"LOWER": "hand"}, {"LOWER": "closed"}],
+        [{"LOWER": "thumb"}, {"LOWER": "index"}, {"LOWER": "pinch"}],
+        [{"LOWER": "thumb"}, {"LOWER": "index"}, {"LOWER": "release"}, {"LOWER": "hand"}, {"LOWER": "closed"}],
+        [{"LOWER": "thumb"}, {"LOWER": "index"}, {"LOWER": "release"}],
+        [{"LOWER": "thumb"}, {"LOWER": "middle"}, {"LOWER": "pinch"}],
+        [{"LOWER": "thumb"}, {"LOWER": "middle"}, {"LOWER": "release"}],
+        [{"LOWER": "thumb"}, {"LOWER": "pinky"}, {"LOWER": "pinch"}],
+        [{"LOWER": "thumb"}, {"LOWER": "pinky"}, {"LOWER": "release"}],
+        [{"LOWER": "thumb"}, {"LOWER": "ring"}, {"LOWER": "pinch"}],
+        [{"LOWER": "thumb"}, {"LOWER": "ring"}, {"LOWER": "release"}],
+        [{"LOWER": "thumb"}, {"LOWER": "up"}],
+    ]
+    matcher.add("POSES", pose_patterns)
+    matches = matcher(doc)
+    spans = [doc[start:end] for match_id, start, end in matches]
+    filtered_spans = filter_spans(spans)
+
+    with doc.retokenize() as retokenizer:
+        for span in filtered_spans:
+            retokenizer.merge(span)
+
+    for span in filtered_spans:
+        span.root.ent_type_ = "POSES"
+    return doc
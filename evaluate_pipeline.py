@@ -0,0 +1,256 @@
+import argparse
+import json
+import sys
+import time
+
+from alias_table import normalize_alias
+from benchmarks.pipeline_benchmark import summarize
+from lazy_import import LazyLoader
+
+ENTITY_LABELS = ["GAME", "ORI", "LANDMARK", "POSES", "GESTURE", "ACTION-O"]
+MAPPINGS = ["game", "poses", "gestures", "actions"]
+# A binding phrase that names its catalog entry is resolved by the alias table without the encoder, so the
+# literal and the paraphrased bindings are also scored apart, e.g. mappings.actions_paraphrased.accuracy
+LITERAL, PARAPHRASED = "literal", "paraphrased"
+# Exit status when a threshold is violated, argparse uses 2 for usage errors
+THRESHOLD_FAILURE = 1
+
+
+def read_gold(path):
+    """
+    Yields the examples of a gold JSONL file. Each line has "text", the gold "entities" as [start, end, label]
+    and optionally the expected "game" and "bindings": {"type": "poses" or "gestures", "files", "action_text", "action"},
+    the output entry expected for the pose or gesture bound to the action phrase action_text. A binding may also have
+    the pose or gesture phrase in "motion_text", so its file mapping is scored as literal or paraphrased too.
+    """
+    with open(path, encoding="utf-8") as gold_file:
+        for line in gold_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def entity_counts(gold_entities, predicted_entities, counts):
+    """
+    Adds the true positives, false positives and false negatives of one text to counts, per label.
+    An entity is correct only if its start, end and label all match.
+    """
+    gold = {tuple(entity) for entity in gold_entities}
+    predicted = {tuple(entity) for entity in predicted_entities}
+    for label in ENTITY_LABELS:
+        gold_label = {entity for entity in gold if entity[2] == label}
+        predicted_label = {entity for entity in predicted if entity[2] == label}
+        label_counts = counts.setdefault(label, {"tp": 0, "fp": 0, "fn": 0})
+        label_counts["tp"] += len(gold_label & predicted_label)
+        label_counts["fp"] += len(predicted_label - gold_label)
+        label_counts["fn"] += len(gold_label - predicted_label)
+
+
+def entity_scores(counts):
+    """
+    Returns precision, recall and F-score per label and micro-averaged over all labels.
+    """
+    def scores(tp, fp, fn):
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f_score = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        return {"precision": precision, "recall": recall, "f": f_score, "support": tp + fn}
+
+    results = {label: scores(**label_counts) for label, label_counts in counts.items()}
+    results["micro"] = scores(*(sum(label_counts[key] for label_counts in counts.values()) for key in ("tp", "fp", "fn")))
+    return results
+
+
+def phrase_kind(phrase, entry):
+    """
+    Returns literal if phrase names the catalog entry the way the alias table matches it, else paraphrased.
+    """
+    return LITERAL if normalize_alias(phrase) == normalize_alias(entry) else PARAPHRASED
+
+
+def count(counts, names, correct):
+    for name in names:
+        name_counts = counts.setdefault(name, {"correct": 0, "total": 0})
+        name_counts["total"] += 1
+        name_counts["correct"] += correct
+
+
+def mapping_counts(example, output, counts):
+    """
+    Adds whether the predicted game and the top-1 file and game action of each gold binding are right to counts.
+    A binding is looked up by its action phrase, one that the pipeline did not output counts as wrong.
+    Each binding is also counted under <mapping>_literal or <mapping>_paraphrased, see phrase_kind.
+    """
+    if "game" in example:
+        count(counts, ["game"], output["mode"] == example["game"])
+    for binding in example.get("bindings", []):
+        entries = {entry["action"]["tmpt"]: entry for entry in output.get(binding["type"], [])}
+        entry = entries.get(binding["action_text"])
+        file_names = [binding["type"]]
+        if "motion_text" in binding:
+            file_names.append(f"{binding['type']}_{phrase_kind(binding['motion_text'], binding['files'])}")
+        count(counts, file_names, entry is not None and entry["files"] == binding["files"])
+        count(counts, ["actions", f"actions_{phrase_kind(binding['action_text'], binding['action'])}"],
+              entry is not None and entry["action"]["class"] == binding["action"])
+
+
+def evaluate(mapper, examples, batch_size=64, warmup=1):
+    """
+    Runs the gold examples through mapper.predict_batch in batches of batch_size and returns the entity
+    scores, the mapping accuracies and the latency of the batches. The first warmup batches are run once
+    untimed before, so model loading is not counted. Their phrase embeddings are not kept in the mapper's
+    embedding cache or written to its embedding store, so the timed batches still encode every phrase they would
+    encode cold.
+    """
+    examples = list(examples)
+    batches = [examples[start:start + batch_size] for start in range(0, len(examples), batch_size)]
+    store = mapper.embedding_store
+    if store is not None and isinstance(mapper.label_index, LazyLoader):
+        # Built with the store, before it is detached for the warmup
+        mapper.label_index.load()
+    mapper.embedding_store = None
+    try:
+        for batch in batches[:warmup]:
+            mapper.predict_batch([example["text"] for example in batch], batch_size=batch_size)
+    finally:
+        mapper.embedding_store = store
+    mapper.embedding_cache.clear()
+
+    entities = {}
+    mappings = {}
+    batch_seconds = []
+    for batch in batches:
+        texts = [example["text"] for example in batch]
+        start = time.perf_counter()
+        outputs = mapper.predict_batch(texts, batch_size=batch_size)
+        batch_seconds.append(time.perf_counter() - start)
+        # The entities of the NER model and the matchers, outside the timed call
+        for example, doc, output in zip(batch, mapper.nlp.pipe(texts, batch_size=batch_size), outputs):
+            entity_counts(example["entities"], [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents], entities)
+            mapping_counts(example, output, mappings)
+
+    total_seconds = sum(batch_seconds)
+    return {
+        "examples": len(examples),
+        "batch_size": batch_size,
+        "entities": entity_scores(entities),
+        "mappings": {name: {"accuracy": counts["correct"] / counts["total"] if counts["total"] else 0.0, "total": counts["total"]}
+                     for name, counts in mappings.items()},
+        "latency": {
+            "batch": summarize(batch_seconds),
+            "per_text_ms": total_seconds * 1000 / len(examples) if examples else 0.0,
+            "texts_per_s": len(examples) / total_seconds if total_seconds else 0.0,
+        },
+    }
+
+
+def flatten(results):
+    """
+    Returns the metrics thresholds can refer to, e.g. entities.GAME.recall, mappings.actions.accuracy,
+    latency.batch.p95_ms and latency.texts_per_s.
+    """
+    metrics = {}
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                walk(f"{prefix}.{key}" if prefix else key, child)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[prefix] = value
+
+    walk("", {key: results[key] for key in ("entities", "mappings", "latency")})
+    return metrics
+
+
+def check_thresholds(results, minimums=None, maximums=None):
+    """
+    Returns a message for every metric below its minimum or above its maximum. A metric that the results do not
+    have, e.g. a mapping without gold bindings, is a violation too, so a typo cannot pass silently.
+    """
+    metrics = flatten(results)
+    violations = []
+    for thresholds, below in ((minimums or {}, True), (maximums or {}, False)):
+        for name, limit in thresholds.items():
+            if name not in metrics:
+                violations.append(f"{name}: no such metric")
+            elif metrics[name] < limit if below else metrics[name] > limit:
+                violations.append(f"{name} = {metrics[name]:.4g}, {'minimum' if below else 'maximum'} {limit:g}")
+    return violations
+
+
+def format_report(results):
+    lines = [f"{results['examples']} examples in batches of {results['batch_size']}", "",
+             f"{'entity':>10} {'precision':>9} {'recall':>9} {'F':>9} {'support':>8}"]
+    for label in ENTITY_LABELS + ["micro"]:
+        scores = results["entities"].get(label)
+        if scores:
+            lines.append(f"{label:>10} {scores['precision']:9.3f} {scores['recall']:9.3f} {scores['f']:9.3f} {scores['support']:8d}")
+    lines += ["", f"{'mapping':>20} {'top-1 acc':>9} {'total':>9}"]
+    for name in MAPPINGS:
+        for key in (name, f"{name}_{LITERAL}", f"{name}_{PARAPHRASED}"):
+            if key in results["mappings"]:
+                lines.append(f"{key:>20} {results['mappings'][key]['accuracy']:9.3f} {results['mappings'][key]['total']:9d}")
+    batch = results["latency"]["batch"]
+    lines += ["", f"batch latency: p50 {batch.get('p50_ms', 0):.1f} ms, p95 {batch.get('p95_ms', 0):.1f} ms, p99 {batch.get('p99_ms', 0):.1f} ms",
+              f"per text: {results['latency']['per_text_ms']:.2f} ms, {results['latency']['texts_per_s']:.1f} texts/s"]
+    return "\n".join(lines)
+
+
+def parse_threshold(value):
+    name, separator, limit = value.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {value}")
+    try:
+        return name, float(limit)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{limit} is not a number")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the entity, mapping accuracy and latency of the pipeline on a labeled gold set.")
+    parser.add_argument("gold", nargs="?", default=None, help="Gold JSONL file, see read_gold.")
+    parser.add_argument("--synthetic", type=int, default=None, help="Evaluate on this many synthetic commands of benchmarks/corpus.py instead.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic commands.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per predict_batch call.")
+    parser.add_argument("--model-path", default="./fine-tuned-model", help="Path of the sentence model.")
+    parser.add_argument("--ner-model-path", default="./ner_model", help="Path of the spaCy NER model.")
+    parser.add_argument("--thresholds", default=None, help="JSON file of {\"min\": {metric: value}, \"max\": {metric: value}}.")
+    parser.add_argument("--min", type=parse_threshold, action="append", default=[], metavar="METRIC=VALUE",
+                        help="Fail if the metric is lower, e.g. entities.GAME.recall=0.9 or mappings.actions.accuracy=0.8.")
+    parser.add_argument("--max", type=parse_threshold, action="append", default=[], metavar="METRIC=VALUE",
+                        help="Fail if the metric is higher, e.g. latency.batch.p95_ms=500.")
+    parser.add_argument("--output", default=None, help="Write the results and the violations to this JSON file.")
+    args = parser.parse_args(argv)
+    if (args.gold is None) == (args.synthetic is None):
+        parser.error("give either a gold file or --synthetic")
+
+    minimums, maximums = {}, {}
+    if args.thresholds:
+        with open(args.thresholds, encoding="utf-8") as thresholds_file:
+            thresholds = json.load(thresholds_file)
+        minimums.update(thresholds.get("min", {}))
+        maximums.update(thresholds.get("max", {}))
+    minimums.update(args.min)
+    maximums.update(args.max)
+
+    if args.synthetic is not None:
+        from benchmarks.corpus import generate_corpus
+        examples = generate_corpus(args.synthetic, args.seed)
+    else:
+        examples = list(read_gold(args.gold))
+    from motion_game_mapper import MotionGameMapper
+    mapper = MotionGameMapper(model_path=args.model_path, ner_model_path=args.ner_model_path)
+    results = evaluate(mapper, examples, args.batch_size)
+    violations = check_thresholds(results, minimums, maximums)
+
+    print(format_report(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({**results, "violations": violations}, output_file, indent=4)
+    if violations:
+        print("\nThresholds violated:\n  " + "\n  ".join(violations))
+        return THRESHOLD_FAILURE
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict, namedtuple
+
+from game_controls import games_actions, game_key_mappings
+
+# One game of the catalog: its action list, in catalog order, and its action to key binding dict
+GameEntry = namedtuple("GameEntry", ["title", "actions", "key_mappings"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (id INTEGER PRIMARY KEY, title TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS actions (
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    position INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    key TEXT,
+    PRIMARY KEY (game_id, position)
+);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+class DictGameCatalog:
+    """
+    The catalog of games_actions and game_key_mappings in game_controls.py.
+    """
+
+    def __init__(self, actions=games_actions, key_mappings=game_key_mappings):
+        self.actions = actions
+        self.key_mappings = key_mappings
+        self._titles = tuple(actions)
+
+    def get(self, title):
+        """
+        Returns the GameEntry of a title, or None if the catalog has no such game.
+        """
+        actions = self.actions.get(title)
+        if actions is None:
+            return None
+        return GameEntry(title, actions, self.key_mappings.get(title, {}))
+
+    def titles(self):
+        return iter(self.actions)
+
+    def refresh(self):
+        """
+        Returns True if games were added or removed since the last call. Actions are read on every lookup.
+        """
+        titles = tuple(self.actions)
+        if titles == self._titles:
+            return False
+        self._titles = titles
+        return True
+
+    def __contains__(self, title):
+        return title in self.actions
+
+    def __len__(self):
+        return len(self.actions)
+
+
+class SqliteGameCatalog:
+    """
+    A catalog of games, their actions and key bindings in a SQLite database, for catalogs too large for
+    Python source. Games are read one at a time when first requested and kept in a bounded LRU cache.
+    Each thread gets its own read-only connection.
+    """
+
+    def __init__(self, path, cache_size=256):
+        """
+        Opens a database written by import_catalog.
+
+        :param path: Path of the SQLite database.
+        :param cache_size: The number of games kept in memory.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Game catalog {path} does not exist, create it with: python game_catalog.py import {path}")
+        self.path = path
+        self.cache_size = cache_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.version = self._read_version()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+            self._local.connection = connection
+        return connection
+
+    def _read_version(self):
+        row = self._connection().execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        return row[0] if row else None
+
+    def get(self, title):
+        """
+        Returns the GameEntry of a title, or None if the catalog has no such game.
+        """
+        with self._lock:
+            if title in self._entries:
+                self._entries.move_to_end(title)
+                return self._entries[title]
+        rows = self._connection().execute(
+            "SELECT actions.action, actions.key FROM games JOIN actions ON actions.game_id = games.id "
+            "WHERE games.title = ? ORDER BY actions.position", (title,)).fetchall()
+        if not rows:
+            return None
+        entry = GameEntry(title, [action for action, _ in rows], {action: key for action, key in rows if key is not None})
+        with self._lock:
+            self._entries[title] = entry
+            while len(self._entries) > self.cache_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def titles(self):
+        """
+        Yields every game title, without loading the whole list in memory.
+        """
+        for (title,) in self._connection().execute("SELECT title FROM games ORDER BY id"):
+            yield title
+
+    def refresh(self):
+        """
+        Drops the cached games if the database was imported again. Returns True when that happened.
+        """
+        version = self._read_version()
+        if version == self.version:
+            return False
+        with self._lock:
+            self._entries.clear()
+            self.version = version
+        return True
+
+    def __contains__(self, title):
+        return self.get(title) is not None
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+
+def import_catalog(path, actions, key_mappings=None):
+    """
+    Adds the games of an actions dict (game to action list) and a key mappings dict (game to action to key)
+    to the database at path, replacing games that are already there. Returns the number of games imported.
+    """
+    key_mappings = key_mappings or {}
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            connection.executescript(SCHEMA)
+            for title, game_actions in actions.items():
+                connection.execute("DELETE FROM actions WHERE game_id IN (SELECT id FROM games WHERE title = ?)", (title,))
+                connection.execute("DELETE FROM games WHERE title = ?", (title,))
+                game_id = connection.execute("INSERT INTO games (title) VALUES (?)", (title,)).lastrowid
+                keys = key_mappings.get(title, {})
+                connection.executemany("INSERT INTO actions (game_id, position, action, key) VALUES (?, ?, ?, ?)",
+                                       [(game_id, position, action, keys.get(action)) for position, action in enumerate(game_actions)])
+            # Open catalogs drop their cached games when the version changes
+            connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('version', ?)", (uuid.uuid4().hex,))
+    finally:
+        connection.close()
+    return len(actions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the SQLite game catalog.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import games into the catalog, by default the ones of game_controls.py.")
+    import_parser.add_argument("database", help="Path of the SQLite database, created if it does not exist.")
+    import_parser.add_argument("--from-json", default=None,
+                               help="JSON file of {title: {\"actions\": [...], \"keys\": {action: key}}} to import instead.")
+    args = parser.parse_args()
+
+    if args.from_json:
+        with open(args.from_json, encoding="utf-8") as json_file:
+            games = json.load(json_file)
+        actions = {title: game["actions"] for title, game in games.items()}
+        key_mappings = {title: game.get("keys", {}) for title, game in games.items()}
+    else:
+        actions, key_mappings = games_actions, game_key_mappings
+    print(f"Imported {import_catalog(args.database, actions, key_mappings)} games into {args.database}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from game_controls import games_actions
+from available_gesture_and_pose import available_gestures, available_poses
+
+
+def catalog_fingerprint(gestures, poses, actions):
+    """
+    Content hash of the gesture, pose and game action catalogs.
+    """
+    payload = json.dumps({"gestures": gestures, "poses": poses, "games_actions": actions}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_rows(matrix):
+    """
+    L2-normalize the last axis so that a dot product equals the cosine similarity.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class LabelIndex:
+    """
+    Holds L2-normalized embedding matrices for every gesture, pose and per-game action list.
+    A lookup is then a single matrix-vector product against the encoded target phrase.
+    Games of a large catalog can be left out of actions and embedded on first use with matrix_for_game,
+    which keeps the max_games most recently used games.
+    """
+
+    def __init__(self, model, gestures=available_gestures, poses=available_poses, actions=games_actions, store=None, max_games=256):
+        """
+        Builds the index with the given sentence model.
+
+        :param model: The SentenceTransformer used to embed the labels.
+        :param gestures: The list of available gestures.
+        :param poses: The list of available poses.
+        :param actions: A dict of game name to its list of actions.
+        :param store: An optional EmbeddingStore to read label embeddings from and save new ones to.
+        :param max_games: The number of games embedded on first use that are kept.
+        """
+        self.model = model
+        self.store = store
+        self.gestures = gestures
+        self.poses = poses
+        self.actions = actions
+        self.max_games = max_games
+        self.fingerprint = None
+        self._matrices = {}
+        self._game_matrices = OrderedDict()
+        self._game_lock = threading.Lock()
+        self.game_loads = 0
+        self.game_evictions = 0
+        self.build()
+
+    def _label_lists(self):
+        return [self.gestures, self.poses] + list(self.actions.values())
+
+    def build(self):
+        """
+        Encodes every distinct label once and slices the per-list matrices out of the result.
+        """
+        label_lists = self._label_lists()
+        labels = list(dict.fromkeys(label for label_list in label_lists for label in label_list))
+        embeddings = normalize_rows(self._encode(labels))
+        rows = {label: i for i, label in enumerate(labels)}
+
+        self._matrices = {}
+        for label_list in label_lists:
+            self._matrices[tuple(label_list)] = embeddings[[rows[label] for label in label_list]]
+        self.fingerprint = catalog_fingerprint(self.gestures, self.poses, self.actions)
+
+    def _encode(self, labels):
+        if self.store is None:
+            return np.asarray(self.model.encode(labels), dtype=np.float32).reshape(len(labels), -1)
+        stored = self.store.get_many(labels)
+        missing = [label for label in labels if label not in stored]
+        if missing:
+            encoded = np.asarray(self.model.encode(missing), dtype=np.float32).reshape(len(missing), -1)
+            new_embeddings = dict(zip(missing, encoded))
+            self.store.append(new_embeddings)
+            stored.update(new_embeddings)
+        return np.asarray([stored[label] for label in labels], dtype=np.float32).reshape(len(labels), -1)
+
+    def refresh(self):
+        """
+        Rebuilds the index if the catalogs changed since it was built. Returns True when a rebuild happened.
+        """
+        if catalog_fingerprint(self.gestures, self.poses, self.actions) == self.fingerprint:
+            return False
+        self.build()
+        return True
+
+    def matrix_for(self, labels):
+        """
+        Returns the precomputed matrix for a list of labels, or None if that list is not indexed.
+        """
+        return self._matrices.get(tuple(labels))
+
+    def matrix_for_game(self, game, actions):
+        """
+        Returns the matrix of a game's action list, embedding it the first time the game is requested.
+        A changed action list is embedded again.
+        """
+        matrix = self.matrix_for(actions)
+        if matrix is not None:
+            return matrix
+        key = (game, tuple(actions))
+        with self._game_lock:
+            matrix = self._game_matrices.get(key)
+            if matrix is not None:
+                self._game_matrices.move_to_end(key)
+                return matrix
+        # Encoded outside the lock, two threads loading the same game at once both get a correct matrix
+        matrix = normalize_rows(self._encode(list(actions)))
+        with self._game_lock:
+            self._game_matrices[key] = matrix
+            self.game_loads += 1
+            while len(self._game_matrices) > self.max_games:
+                self._game_matrices.popitem(last=False)
+                self.game_evictions += 1
+        return matrix
+
+    def clear_games(self):
+        """
+        Drops the games embedded on first use, e.g. after the game catalog changed.
+        """
+        with self._game_lock:
+            self._game_matrices.clear()
+
+    def game_stats(self):
+        """
+        Returns how many games are embedded and how often a game was embedded or evicted.
+        """
+        with self._game_lock:
+            return {"loaded": len(self._game_matrices), "loads": self.game_loads, "evictions": self.game_evictions}
+
+    @staticmethod
+    def best_match(target_embedding, labels, matrix, threshold=0.2):
+        """
+        Returns the label most similar to the target embedding, or "none" if below the threshold.
+        """
+        if len(labels) == 0:
+            return "none"
+        similarities = matrix @ normalize_rows(target_embedding).reshape(-1)
+        best = int(np.argmax(similarities))
+        return "none" if similarities[best] < threshold else labels[best]
@@ -0,0 +1,112 @@
+import importlib
+import sys
+import threading
+import time
+
+# Seconds spent importing each lazily imported module, in import order
+IMPORT_SECONDS = {}
+
+
+class _HiddenModules:
+    """
+    Meta path finder that makes modules look uninstalled to the imports of the thread that created it,
+    imports in other threads find them as usual.
+    """
+
+    def __init__(self, names):
+        self.names = set(names)
+        self.thread = threading.get_ident()
+
+    def find_spec(self, name, path=None, target=None):
+        if threading.get_ident() == self.thread and name.partition(".")[0] in self.names:
+            raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+        return None
+
+
+def import_without(name, hidden=("torch",)):
+    """
+    Imports a module while the hidden modules look uninstalled. thinc imports torch for its optional
+    torch support when spaCy is imported, which takes seconds and is not needed to run ./ner_model.
+    Modules that were already imported are not hidden, and the hidden ones can be imported normally afterwards.
+    Only this thread's imports are affected, another thread importing torch meanwhile still gets it.
+    """
+    # A finder instead of sys.modules[module] = None, which would hide the modules from every thread
+    finder = _HiddenModules(module for module in hidden if module not in sys.modules)
+    sys.meta_path.insert(0, finder)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.meta_path.remove(finder)
+
+
+class LazyModule:
+    """
+    Stands in for a module and imports it on first attribute access, so heavy libraries
+    like spaCy are only imported by the code paths that need them.
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+
+    def _load(self):
+        if self._module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self._name)
+            IMPORT_SECONDS.setdefault(self._name, time.perf_counter() - start)
+            object.__setattr__(self, "_module", module)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._load(), attr)
+
+
+class LazyAttribute:
+    """
+    Stands in for a callable of a module, e.g. a class, and imports the module when it is first called.
+    """
+
+    def __init__(self, module_name, attr):
+        self._module = LazyModule(module_name)
+        self._attr = attr
+
+    def __call__(self, *args, **kwargs):
+        return getattr(self._module, self._attr)(*args, **kwargs)
+
+
+class LazyLoader:
+    """
+    Stands in for an object that is expensive to create, e.g. a model. The object is created by
+    the loader function the first time it is used and every attribute access is forwarded to it.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._target = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Creates the object if it was not created yet and returns it.
+        """
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._loader()
+        return self._target
+
+    @property
+    def loaded(self):
+        return self._target is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
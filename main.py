@@ -1,17 +1,85 @@
 #"I want to play Minecraft with my right arm I want to jump when I pose thumb down I want to do index pinch to place down a block three fingers to destroy."
+import time
+_start = time.perf_counter()
 import argparse
-from motion_game_mapper import MotionGameMapper
+import os
+import sys
+from motion_game_mapper import MotionGameMapper, ENCODER_BACKENDS
+_module_import_seconds = time.perf_counter() - _start
 
-def main(predict_text):
-    mapper = MotionGameMapper()
+def main(predict_text, embedding_store=None, timings=False, encoder_backend="torch", game_catalog=None, profile_dir=None, profile_sample_rate=None):
+    # Models are loaded on first use, so inputs without a game never load the sentence model
+    mapper = MotionGameMapper(embedding_store_path=embedding_store, lazy_load=True, encoder_backend=encoder_backend, game_catalog=game_catalog,
+                              profile_dir=profile_dir, profile_sample_rate=profile_sample_rate)
+    start = time.perf_counter()
     # Use the passed predict_text instead of a hardcoded string
     mapper.predict_to_json(predict_text, "prediction_output.json")
+    predict_seconds = time.perf_counter() - start
+    if timings:
+        print_timings(mapper, predict_seconds)
+
+def print_timings(mapper, predict_seconds):
+    """
+    Reports import, model load and first inference time separately. Imports and loads that happen during
+    the first prediction are not counted as inference time.
+    """
+    import_seconds = _module_import_seconds + sum(seconds for stage, seconds in mapper.timings.items() if stage.startswith("import_"))
+    load_seconds = sum(seconds for stage, seconds in mapper.timings.items() if not stage.startswith("import_"))
+    inference_seconds = predict_seconds - sum(mapper.timings.values())
+    print(f"import:          {import_seconds * 1000:8.1f} ms")
+    print(f"load:            {load_seconds * 1000:8.1f} ms")
+    print(f"first inference: {inference_seconds * 1000:8.1f} ms")
+    for stage, seconds in mapper.timings.items():
+        print(f"  {stage}: {seconds * 1000:.1f} ms")
+
+def bulk_main(input_path, output_path, input_format, workers, chunk_size, embedding_store=None, encoder_backend="torch", game_catalog=None,
+              profile_dir=None, profile_sample_rate=None):
+    """
+    Predicts every line of input_path and streams the results to output_path as JSONL, "-" means stdin/stdout.
+    Each worker process loads the models once.
+    """
+    import bulk_predict
+    if input_format is None:
+        input_format = "jsonl" if input_path.endswith(".jsonl") else "text"
+    input_file = sys.stdin if input_path == "-" else open(input_path, encoding="utf-8")
+    output_file = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+    try:
+        mapper_kwargs = {"embedding_store_path": embedding_store, "encoder_backend": encoder_backend, "game_catalog": game_catalog,
+                         "profile_dir": profile_dir, "profile_sample_rate": profile_sample_rate}
+        bulk_predict.run(input_file, output_file, input_format, workers, chunk_size, mapper_kwargs)
+    except RuntimeError as e:
+        print(e)
+        exit(1)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
 
 if __name__ == "__main__":
     # Initialize the parser
     parser = argparse.ArgumentParser(description="Map motion game controls from natural language input.")
     # Add the positional argument for the input text
-    parser.add_argument('text', type=str, help="The input text to process.")
+    parser.add_argument('text', type=str, nargs='?', help="The input text to process.")
+    parser.add_argument('--embedding-store', type=str, default=None, help="Directory of the on-disk embedding store reused across runs.")
+    parser.add_argument('--encoder-backend', choices=ENCODER_BACKENDS, default="torch", help="Runtime of the sentence model, onnx needs python onnx_encoder.py first.")
+    parser.add_argument('--game-catalog', type=str, default=None, help="SQLite game catalog written by game_catalog.py, instead of game_controls.py.")
+    parser.add_argument('--timings', action='store_true', help="Report import, model load and first inference time.")
+    parser.add_argument('--profile-dir', type=str, default=None,
+                        help="Write cProfile and tracemalloc reports of the predictions here (or set $MOTION_PROFILE_DIR), summarize them with profiling.py.")
+    parser.add_argument('--profile-sample-rate', type=float, default=None, help="Fraction of the predictions that is profiled, 1 by default.")
+    # Bulk mode
+    parser.add_argument('--input', type=str, default=None, help="Process every line of this JSONL or text file (- for stdin) instead of one text.")
+    parser.add_argument('--output', type=str, default="predictions.jsonl", help="JSONL file the bulk predictions are streamed to (- for stdout).")
+    parser.add_argument('--format', choices=["jsonl", "text"], default=None, help="Format of the input file, by default jsonl for .jsonl files.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes in bulk mode, 0 runs in this process.")
+    parser.add_argument('--chunk-size', type=int, default=64, help="Number of lines sent to a worker at once.")
     
     args = parser.parse_args()
-    main(args.text)
+    if args.input:
+        bulk_main(args.input, args.output, args.format, args.workers, args.chunk_size, args.embedding_store, args.encoder_backend, args.game_catalog,
+                  args.profile_dir, args.profile_sample_rate)
+    elif args.text is None:
+        parser.error("either a text or --input is required")
+    else:
+        main(args.text, args.embedding_store, args.timings, args.encoder_backend, args.game_catalog, args.profile_dir, args.profile_sample_rate)
@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from contextlib import nullcontext
+
+# Upper bounds in seconds of the latency histogram buckets, from half a millisecond to a few seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """
+    In-process counters and latency histograms, e.g. the time spent per pipeline stage and spaCy component
+    and how many entities, action pairs and unmatched phrases were seen. Each metric has a name and
+    optional labels. The registry can be dumped in the Prometheus text format or as JSON.
+    """
+
+    enabled = True
+
+    def __init__(self, prefix="motion_game_mapper", buckets=DEFAULT_BUCKETS):
+        """
+        :param prefix: Prepended to every metric name in the Prometheus output.
+        :param buckets: Upper bounds in seconds of the histogram buckets.
+        """
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # name -> {label tuple: value}
+        self._counters = {}
+        # name -> {label tuple: [bucket counts, count, sum]}
+        self._histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        """
+        Adds amount to a counter.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        """
+        Records one duration in a histogram.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += 1
+            histogram[2] += seconds
+
+    def timer(self, name, **labels):
+        """
+        Returns a context manager that records the duration of its block in a histogram.
+        """
+        return _Timer(self, name, labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """
+        Returns every metric as a JSON serializable dict. Histogram bucket counts are per bucket, not cumulative.
+        """
+        with self._lock:
+            counters = {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                        for name, series in self._counters.items()}
+            histograms = {name: [{"labels": dict(key), "buckets": dict(zip(map(str, self.buckets), counts)), "count": count, "sum": total}
+                                 for key, (counts, count, total) in series.items()]
+                          for name, series in self._histograms.items()}
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=4)
+
+    def to_prometheus(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, series in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {self.prefix}_{name} counter")
+            for entry in series:
+                lines.append(f"{self.prefix}_{name}{_format_labels(entry['labels'])} {entry['value']}")
+        for name, series in sorted(snapshot["histograms"].items()):
+            lines.append(f"# TYPE {self.prefix}_{name} histogram")
+            for entry in series:
+                cumulative = 0
+                for bound, count in entry["buckets"].items():
+                    cumulative += count
+                    lines.append(f"{self.prefix}_{name}_bucket{_format_labels(entry['labels'], le=bound)} {cumulative}")
+                lines.append(f"{self.prefix}_{name}_bucket{_format_labels(entry['labels'], le='+Inf')} {entry['count']}")
+                lines.append(f"{self.prefix}_{name}_sum{_format_labels(entry['labels'])} {entry['sum']}")
+                lines.append(f"{self.prefix}_{name}_count{_format_labels(entry['labels'])} {entry['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class NullMetrics:
+    """
+    Stands in for MetricsRegistry when metrics are turned off. Every call does nothing.
+    """
+
+    enabled = False
+    _timer = nullcontext()
+
+    def inc(self, name, amount=1, **labels):
+        pass
+
+    def observe(self, name, seconds, **labels):
+        pass
+
+    def timer(self, name, **labels):
+        return self._timer
+
+
+NULL_METRICS = NullMetrics()
+
+
+def _format_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f"{name}=\"{value}\"" for name, value in zip(labels, escaped)) + "}"
@@ -1,57 +1,209 @@
-import spacy
+import importlib
 import json
-from sentence_transformers import SentenceTransformer
-from scipy.spatial.distance import cosine
+import os
+import time
+import numpy as np
 
-from train_ner import game_entity_matcher, gesture_entity_matcher, pose_entity_matcher
-from game_controls import games_actions, game_key_mappings
+from lazy_import import LazyModule, LazyAttribute, LazyLoader, import_without
+from game_catalog import DictGameCatalog, SqliteGameCatalog
+from title_resolver import TitleResolver
 from available_gesture_and_pose import available_gestures, available_poses
+from label_index import LabelIndex, normalize_rows
+from embedding_cache import EmbeddingCache
+from embedding_store import EmbeddingStore, model_fingerprint
+from encode_scheduler import MicroBatchEncoder
+from transcript_session import TranscriptSession
+from alias_table import AliasTable, DEFAULT_ALIAS_PATH
+from onnx_encoder import OnnxSentenceEncoder, backend_fingerprint, default_onnx_path
+from metrics import NULL_METRICS
+from profiling import Profiler
+
+# spaCy, torch and sentence_transformers are only imported once a model is loaded
+spacy = LazyModule("spacy")
+SentenceTransformer = LazyAttribute("sentence_transformers", "SentenceTransformer")
+# "torch" runs the sentence model with sentence_transformers, the others run its ONNX export (see onnx_encoder.py)
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
 
 class MotionGameMapper:
-    def __init__(self, model_path="./fine-tuned-model", ner_model_path="./ner_model"):
-        # Try to load models outside of functions to avoid reloading them on each function call
+    def __init__(self, model_path="./fine-tuned-model", ner_model_path="./ner_model", cache_size=4096, cache_bytes=None, embedding_cache=None,
+                 embedding_store_path=None, lazy_load=False, micro_batch_wait_ms=None, micro_batch_size=64, encoder_backend="torch", onnx_path=None,
+                 alias_path=DEFAULT_ALIAS_PATH, game_catalog=None, game_cache_size=256, metrics=None,
+                 profile_dir=None, profile_sample_rate=None):
+        """
+        Loads the sentence model and the NER model. With lazy_load, each model is only loaded the
+        first time it is used, so inputs that never reach similarity matching never load the encoder.
+        With micro_batch_wait_ms, phrases encoded by concurrent callers (e.g. server threads) are coalesced
+        into one encoder batch of up to micro_batch_size phrases, see MicroBatchEncoder.
+        encoder_backend "onnx" or "onnx-int8" runs the ONNX export of the sentence model in onnx_path
+        (by default <model_path>-onnx) with onnxruntime instead of PyTorch.
+        Phrases that name a catalog entry or an alias of alias_path are resolved without the encoder, see AliasTable.
+        game_catalog holds the games, their actions and key bindings: a catalog object, the path of a SQLite
+        catalog or None for the dicts of game_controls.py (see game_catalog.py). A game's actions are only embedded when the game is first requested, and the
+        game_cache_size most recently used games are kept. GAME entities are resolved to the catalog title
+        despite case, spacing and small typos, see TitleResolver.
+        metrics is a MetricsRegistry that records the time spent per pipeline stage and spaCy component and
+        counts entities, action pairs and unmatched phrases, see metrics.py. None turns metrics off.
+        With profile_dir (or $MOTION_PROFILE_DIR), a profile_sample_rate fraction of the predict_to_json and
+        predict_batch calls is profiled with cProfile and tracemalloc and a report is written there, see profiling.py.
+        """
+        if encoder_backend not in ENCODER_BACKENDS:
+            raise ValueError(f"Unknown encoder backend {encoder_backend!r}, expected one of {ENCODER_BACKENDS}")
+        self.model_path = model_path
+        self.ner_model_path = ner_model_path
+        self.encoder_backend = encoder_backend
+        self.onnx_path = onnx_path or default_onnx_path(model_path)
+        # Seconds spent importing libraries and loading models, per stage
+        self.timings = {}
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.profiler = Profiler.from_env(profile_dir, profile_sample_rate)
+        # Phrase embeddings are cached per encoder, pass the same embedding_cache to share it between mappers
+        self.model_id = os.path.abspath(model_path) if encoder_backend == "torch" else f"{os.path.abspath(self.onnx_path)}:{encoder_backend}"
+        self.embedding_cache = embedding_cache or EmbeddingCache(max_entries=cache_size, max_bytes=cache_bytes)
+        self.embedding_store = None
+        if embedding_store_path:
+            # The on-disk store is tied to the encoder fingerprint so a retrained model never reads stale vectors
+            if encoder_backend == "torch":
+                self.model_id = model_fingerprint(model_path)
+            else:
+                self.model_id = backend_fingerprint(self.onnx_path, quantized=encoder_backend == "onnx-int8")
+            self.embedding_store = EmbeddingStore(embedding_store_path, self.model_id)
+        self.micro_batch_wait_ms = micro_batch_wait_ms
+        self.micro_batch_size = micro_batch_size
+        self.encode_scheduler = None
+        self._start_encode_scheduler()
+
+        if isinstance(game_catalog, str):
+            game_catalog = SqliteGameCatalog(game_catalog, cache_size=game_cache_size)
+        self.game_catalog = game_catalog if game_catalog is not None else DictGameCatalog()
+        self.game_cache_size = game_cache_size
+        # Indexes every catalog title, only built when the first game has to be resolved
+        self.title_resolver = LazyLoader(self._build_title_resolver)
+        # Game action lists get their alias tables on first use, like their embeddings
+        self.alias_table = AliasTable.from_file(alias_path, actions={})
+
+        self.sentence_model = LazyLoader(self._load_sentence_model)
+        self.nlp = LazyLoader(self._load_nlp)
+        self.label_index = LazyLoader(self._build_label_index)
+        if not lazy_load:
+            # Try to load models outside of functions to avoid reloading them on each function call
+            self.sentence_model = self.sentence_model.load()
+            self.nlp = self.nlp.load()
+            self.label_index = self.label_index.load()
+
+    def _start_encode_scheduler(self):
+        if self.micro_batch_wait_ms is not None:
+            self.encode_scheduler = MicroBatchEncoder(lambda phrases: self.sentence_model.encode(phrases, batch_size=self.micro_batch_size),
+                                                      max_wait_ms=self.micro_batch_wait_ms, max_batch_size=self.micro_batch_size)
+
+    def after_fork(self, intra_op_threads=None):
+        """
+        Makes a mapper inherited from a parent process usable in a forked child: threads do not survive a fork,
+        so the micro-batch scheduler and the onnxruntime session are started again. The loaded model weights
+        are kept and stay shared with the parent until written to.
+        """
+        self._start_encode_scheduler()
+        sentence_model = self.sentence_model
+        if isinstance(sentence_model, LazyLoader):
+            sentence_model = sentence_model.load() if sentence_model.loaded else None
+        if isinstance(sentence_model, OnnxSentenceEncoder):
+            sentence_model.reset_session(intra_op_threads)
+
+    def _timed(self, stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+        return result
+
+    def _load_sentence_model(self):
         try:
-            self.sentence_model = SentenceTransformer(model_path)
-            self.nlp = spacy.load(ner_model_path)
+            if self.encoder_backend != "torch":
+                # Never imports torch or sentence_transformers
+                self._timed("import_onnxruntime", importlib.import_module, "onnxruntime")
+                return self._timed("load_sentence_model", OnnxSentenceEncoder, self.onnx_path, self.encoder_backend == "onnx-int8")
+            self._timed("import_sentence_transformers", importlib.import_module, "sentence_transformers")
+            return self._timed("load_sentence_model", SentenceTransformer, self.model_path)
         except Exception as e:
             print(f"Error loading models: {e}")
             exit(1)
 
-    @staticmethod
-    def _similarities_match(target_phrase, possible_phrases, model):
+    def _load_nlp(self):
+        try:
+            # Registers the matcher components used by ./ner_model, it imports spaCy
+            self._timed("import_spacy", import_without, "entity_matchers")
+            return self._timed("load_ner_model", spacy.load, self.ner_model_path)
+        except Exception as e:
+            print(f"Error loading models: {e}")
+            exit(1)
+
+    def _build_label_index(self):
+        try:
+            # Embed every gesture, pose and game action once so lookups only encode the target phrase
+            return self._timed("build_label_index", lambda: LabelIndex(self.sentence_model, actions={}, store=self.embedding_store,
+                                                                             max_games=self.game_cache_size))
+        except Exception as e:
+            print(f"Error loading models: {e}")
+            exit(1)
+
+    def _build_title_resolver(self):
+        return self._timed("build_title_resolver", TitleResolver, self.game_catalog.titles())
+
+    def resolve_game(self, title):
+        """
+        Returns the catalog title a GAME entity refers to, e.g. "rocketleague" -> "Rocket League",
+        or the entity text itself if no title is close enough.
         """
-        Create embbed for target and possible phrases then calculate the max similarities between target and possible phrases.
+        if self.game_catalog.get(title) is not None:
+            return title
+        return self.title_resolver.resolve(title) or title
+
+    def _similarities_match(self, target_phrase, possible_phrases, model=None, target_embedding=None, game=None):
+        """
+        Create embbed for target phrase then calculate the max similarities between target and possible phrases.
+        Possible phrases from the catalogs are looked up in the label index instead of being encoded again.
+        A precomputed target_embedding (e.g. from a batch encode) skips encoding the target phrase.
+        A target phrase that names one of the possible phrases (or an alias of it) is matched without the encoder.
+        With game, possible phrases are that game's actions and are embedded the first time the game is requested.
         """
         try:
-            # Generate embeddings for the target phrase and possible phrases
-            target_embedding = model.encode(target_phrase)
-            possible_phrase_embeddings = model.encode(possible_phrases)
-            #Future UPGRADE encode all the possible phrase and look up those instead (Save a lot of processing time)
-            similarities = {phrase: 1 - cosine(target_embedding, embedding) for phrase, embedding in zip(possible_phrases, possible_phrase_embeddings)}
-            most_similar_phrase, highest_similarity = max(similarities.items(), key=lambda item: item[1], default=(None, 0))
-            # for phrase, similarity in similarities.items():
-            # print(f"Similarity to '{phrase}': {similarity:.4f}")
-            return "none" if highest_similarity < 0.2 else most_similar_phrase
+            if not possible_phrases:
+                return "none"
+            alias = self.alias_table.lookup(target_phrase, possible_phrases)
+            if alias is not None:
+                return alias
+            model = model or self.sentence_model
+            if target_embedding is None:
+                target_embedding = self._encode_phrases([target_phrase], model=model)[target_phrase]
+            target_embedding = np.asarray(target_embedding, dtype=np.float32)
+            with self.metrics.timer("stage_seconds", stage="similarity"):
+                if game is not None and model is self.sentence_model:
+                    possible_phrase_embeddings = self.label_index.matrix_for_game(game, possible_phrases)
+                else:
+                    possible_phrase_embeddings = self.label_index.matrix_for(possible_phrases)
+                if possible_phrase_embeddings is None:
+                    possible_phrase_embeddings = normalize_rows(np.asarray(model.encode(possible_phrases), dtype=np.float32).reshape(len(possible_phrases), -1))
+                return self.label_index.best_match(target_embedding, possible_phrases, possible_phrase_embeddings)
         except Exception as e:
             print(f"Error in similarity matching: {e}")
             return "none"
 
-    def motion_to_action_mapping(self, motion, game):
+    def motion_to_action_mapping(self, motion, game, motion_embedding=None):
         """
         Use similarities match to map the closest motion by user to in game action.
         """
-        if game in games_actions:
+        entry = self.game_catalog.get(game)
+        if entry is not None:
             # Use the similarties_match function to find the most similar action
-            return self._similarities_match(motion, games_actions[game], self.sentence_model)
+            return self._similarities_match(motion, entry.actions, self.sentence_model, target_embedding=motion_embedding, game=game)
         else:
+            self.metrics.inc("games_not_found_total")
             return "Game not found"
 
-    @staticmethod
-    def action_to_key_input(action, game):
+    def action_to_key_input(self, action, game):
         """
         Maps a game action to the corresponding keyboard input.
         """
-        return game_key_mappings.get(game, {}).get(action, "Action not found")
+        entry = self.game_catalog.get(game)
+        return (entry.key_mappings if entry is not None else {}).get(action, "Action not found")
 
     @staticmethod
     def initialize_output_structure():
@@ -66,16 +218,149 @@ class MotionGameMapper:
             "gestures": []
         }
 
-    def predict_to_json(self, sentences, output_file):
-        try:
+    def predict(self, sentences):
+        """
+        Returns the output structure for the input sentence(s) without writing it to a file.
+        """
+        with self.metrics.timer("stage_seconds", stage="predict"):
             output_data = self.initialize_output_structure()
             self._predict_without_comma(sentences, output_data)
-            with open(output_file, 'w', encoding='utf-8') as json_file:
-                json.dump(output_data, json_file, indent=4)
+        self.metrics.inc("predictions_total")
+        return output_data
+
+    def predict_to_json(self, sentences, output_file):
+        try:
+            with self.profiler.profile("predict_to_json", text=sentences, output_file=output_file):
+                output_data = self.predict(sentences)
+                with self.metrics.timer("stage_seconds", stage="json_write"):
+                    with open(output_file, 'w', encoding='utf-8') as json_file:
+                        json.dump(output_data, json_file, indent=4)
         except Exception as e:
             print(f"Error during prediction or file writing: {e}")
             # Handle accordingly, e.g., try again, log error, etc.
 
+    def _game_actions(self, game):
+        entry = self.game_catalog.get(game)
+        return entry.actions if entry is not None else []
+
+    def start_session(self):
+        """
+        Returns a TranscriptSession that parses a live transcript incrementally and reports config diffs.
+        """
+        return TranscriptSession(self)
+
+    def predict_batch(self, texts, batch_size=64, encode_batch_size=32):
+        """
+        Processes many input texts at once and returns one output structure per text, in input order.
+        The texts go through spaCy with nlp.pipe, and every distinct entity phrase across all docs is
+        encoded in a single call, so the result is the same as calling _predict_without_comma per text.
+
+        Parameters:
+        - texts: A list of input strings.
+        - batch_size: The number of texts spaCy processes per batch.
+        - encode_batch_size: The batch size used by the sentence model.
+        """
+        with self.profiler.profile("predict_batch", texts=len(texts), first_text=texts[0] if texts else None, batch_size=batch_size):
+            return self._predict_batch(texts, batch_size, encode_batch_size)
+
+    def _predict_batch(self, texts, batch_size, encode_batch_size):
+        start = time.perf_counter()
+        with self.metrics.timer("stage_seconds", stage="spacy"):
+            docs = list(self.nlp.pipe(texts, batch_size=batch_size))
+        # Phrases the alias table resolves are never encoded
+        phrases = []
+        for doc in docs:
+            _, game, pairs = self._parse_doc(doc)
+            game = self.resolve_game(game) if pairs else game
+            for pose_or_gesture, action in pairs:
+                candidates = [(pose_or_gesture[1], available_poses if pose_or_gesture[0] == "P" else available_gestures),
+                              (action[1], self._game_actions(game))]
+                phrases += [phrase for phrase, labels in candidates if labels and self.alias_table.lookup(phrase, labels, record=False) is None]
+        phrases = list(dict.fromkeys(phrases))
+        phrase_embeddings = self._encode_phrases(phrases, encode_batch_size)
+
+        results = []
+        for doc in docs:
+            output_data = self.initialize_output_structure()
+            self._populate_output(doc, output_data, phrase_embeddings)
+            results.append(output_data)
+        self.metrics.observe("stage_seconds", time.perf_counter() - start, stage="predict_batch")
+        self.metrics.inc("predictions_total", len(texts))
+        return results
+
+    def _encode_phrases(self, phrases, batch_size=32, model=None):
+        """
+        Returns a dict of phrase to embedding. Phrases in the embedding cache are not encoded again,
+        the rest are encoded in one call and added to the cache.
+        Phrases are sorted by length first so each encoder batch holds phrases of similar length and pads little.
+        With the micro-batch scheduler, the mapper's own encoder calls share batches with concurrent callers.
+        """
+        model = model or self.sentence_model
+        # Only the mapper's own encoder is cached, other models would share its keys
+        cache = self.embedding_cache if model is self.sentence_model else None
+        store = self.embedding_store if model is self.sentence_model else None
+        embeddings = {}
+        missing = []
+        for phrase in phrases:
+            cached = cache.get(self.model_id, phrase) if cache is not None else None
+            if cached is None:
+                missing.append(phrase)
+            else:
+                embeddings[phrase] = cached
+        if missing and store is not None:
+            stored = store.get_many(missing)
+            for phrase, embedding in stored.items():
+                embeddings[phrase] = embedding
+                cache.put(self.model_id, phrase, embedding)
+            missing = [phrase for phrase in missing if phrase not in stored]
+        if missing:
+            missing = sorted(missing, key=len)
+            with self.metrics.timer("stage_seconds", stage="encode"):
+                if self.encode_scheduler is not None and model is self.sentence_model:
+                    encoded = self.encode_scheduler.encode(missing)
+                else:
+                    encoded = np.asarray(model.encode(missing, batch_size=batch_size), dtype=np.float32).reshape(len(missing), -1)
+            self.metrics.inc("phrases_encoded_total", len(missing))
+            for phrase, embedding in zip(missing, encoded):
+                embeddings[phrase] = embedding
+                if cache is not None:
+                    cache.put(self.model_id, phrase, embedding)
+            if store is not None:
+                store.append(dict(zip(missing, encoded)))
+        return embeddings
+
+    def flush_embedding_store(self):
+        """
+        Writes the embeddings the on-disk store still buffers. The store does it itself when the process exits
+        normally, call this before forking or in processes that end with os._exit.
+        """
+        if self.embedding_store is not None:
+            self.embedding_store.flush()
+
+    def cache_stats(self):
+        """
+        Returns the hit, miss and eviction counters of the phrase embedding cache.
+        """
+        return self.embedding_cache.stats()
+
+    def alias_stats(self):
+        """
+        Returns how often the alias fast path matched a phrase without the encoder.
+        """
+        return self.alias_table.stats()
+
+    def game_stats(self):
+        """
+        Returns how many games have their actions embedded and how often a game was embedded or evicted.
+        """
+        return self.label_index.game_stats()
+
+    def encoder_stats(self):
+        """
+        Returns the batch sizes and queueing delays of the micro-batch scheduler, or None if it is not used.
+        """
+        return self.encode_scheduler.stats() if self.encode_scheduler is not None else None
+
     def _predict_without_comma(self, sentences, output_data):
         """
         Processes a single sentence to identify game-related actions and updates the output data structure with these actions.
@@ -85,51 +370,141 @@ class MotionGameMapper:
         - sentences: A string containing the input sentence(s) to process.
         - output_data: A dictionary where the processed information will be stored.
         """
-        gestures = available_gestures
-        poses = available_poses
+        if self.metrics.enabled:
+            doc = self._run_pipeline(sentences)
+        else:
+            doc = self.nlp(sentences)
+        self._populate_output(doc, output_data)
 
+    def _run_pipeline(self, text):
+        """
+        Same as self.nlp(text), but records the time spent in the tokenizer and in each pipeline component.
+        """
+        nlp = self.nlp
+        with self.metrics.timer("stage_seconds", stage="spacy"):
+            with self.metrics.timer("component_seconds", component="tokenizer"):
+                doc = nlp.make_doc(text)
+            for name, proc in nlp.pipeline:
+                with self.metrics.timer("component_seconds", component=name):
+                    doc = proc(doc)
+        return doc
+
+    @staticmethod
+    def _parse_doc(doc):
+        """
+        Splits the entities of a processed doc into the fields of the output structure, the game and the action pairs.
+        Each action pair is a (pose_or_gesture, action) tuple of (label initial, text) entries.
+        """
+        return MotionGameMapper._parse_entities([(ent.label_, ent.text) for ent in doc.ents])
+
+    @staticmethod
+    def _parse_entities(entities):
+        """
+        Same as _parse_doc for a list of (label, text) entities, e.g. collected from several docs.
+        """
+        fields = {}
         game = ""
-        doc = self.nlp(sentences)
         actions = []
         # Loop through the entities identified by the custom NER model.
-        for ent in doc.ents:
-            if ent.label_ == "GAME":
-                output_data["mode"] = ent.text
-                game = ent.text
-            elif ent.label_ == "ORI":
-                output_data["orientation"] = ent.text
-            elif ent.label_ == "LANDMARK":
-                output_data["landmark"] = ent.text
+        for label, text in entities:
+            if label == "GAME":
+                fields["mode"] = text
+                game = text
+            elif label == "ORI":
+                fields["orientation"] = text
+            elif label == "LANDMARK":
+                fields["landmark"] = text
             else:
-                actions.append((ent.label_[0], ent.text))
-        
+                actions.append((label[0], text))
+
         # Act as a break point in MotionInput, as to not have a game mean mode can't be created
         if game == '':
-            output_data["mode"] = "No Game Selected"
-            return
+            return fields, game, []
 
         # Pair adjacent actions for further processing. Assumes actions come in meaningful pairs.
-        result = []
+        pairs = []
         for i in range(0, len(actions) - 1, 2):
-            result.append((actions[i], actions[i+1]))
-        # Process each action pair to update the output_data with the action details.
-        for action1, action2 in result:
+            action1, action2 = actions[i], actions[i+1]
             if action1[0] == "A" or action2[0] == "A":
-                pose_or_gesture, action = (action2, action1) if action1[0] == "A" else (action1, action2)
-                action_type = "poses" if pose_or_gesture[0] == "P" else "gestures"
-                files = self._similarities_match(pose_or_gesture[1], poses if pose_or_gesture[0] == "P" else gestures, self.sentence_model)
-                ignaction = self.motion_to_action_mapping(action[1], game)
-                ignkey = self.action_to_key_input(ignaction, game)
-                action_data = {
-                    "files": files,
-                    "action": {
-                        "tmpt": action[1],
-                        "class": ignaction,
-                        "method": "hold" if pose_or_gesture[0] == "P" else "click",
-                        "args": [ignkey]
-                    }
-                }
-                output_data[action_type].append(action_data)
+                pairs.append((action2, action1) if action1[0] == "A" else (action1, action2))
+        return fields, game, pairs
+
+    def _populate_output(self, doc, output_data, phrase_embeddings=None):
+        """
+        Updates the output data structure from a processed doc.
+
+        Parameters:
+        - doc: The spaCy doc of the input sentence(s).
+        - output_data: A dictionary where the processed information will be stored.
+        - phrase_embeddings: Optional dict of entity phrase to its precomputed embedding.
+        """
+        fields, game, pairs = self._parse_doc(doc)
+        if self.metrics.enabled:
+            for ent in doc.ents:
+                self.metrics.inc("entities_total", label=ent.label_)
+        output_data.update(fields)
+        if game == '':
+            output_data["mode"] = "No Game Selected"
+            self.metrics.inc("no_game_selected_total")
+            return
+        self._refresh_game_catalog()
+        game = self.resolve_game(game)
+        output_data["mode"] = game
+        if pairs:
+            self._refresh_catalogs()
+
+        # Process each action pair to update the output_data with the action details.
+        for pose_or_gesture, action in pairs:
+            action_type, action_data = self._bind_pair(pose_or_gesture, action, game, phrase_embeddings)
+            output_data[action_type].append(action_data)
+
+    def _refresh_catalogs(self):
+        """
+        Picks up catalog changes: the gesture and pose lists, and a game catalog that was imported again.
+        Returns True when something changed.
+        """
+        changed = self.label_index.refresh()
+        return self._refresh_game_catalog() or changed
+
+    def _refresh_game_catalog(self):
+        """
+        Drops the embedded games and the title index if the game catalog changed. Returns True when it did.
+        """
+        if not self.game_catalog.refresh():
+            return False
+        if not isinstance(self.label_index, LazyLoader) or self.label_index.loaded:
+            self.label_index.clear_games()
+        self.title_resolver = LazyLoader(self._build_title_resolver)
+        return True
+
+    def _bind_pair(self, pose_or_gesture, action, game, phrase_embeddings=None):
+        """
+        Matches one (pose_or_gesture, action) pair to a pose or gesture file and an in game action.
+        Returns the output list it belongs to ("poses" or "gestures") and its entry.
+        """
+        phrase_embeddings = phrase_embeddings or {}
+        action_type = "poses" if pose_or_gesture[0] == "P" else "gestures"
+        files = self._similarities_match(pose_or_gesture[1], available_poses if pose_or_gesture[0] == "P" else available_gestures, self.sentence_model,
+                                         target_embedding=phrase_embeddings.get(pose_or_gesture[1]))
+        ignaction = self.motion_to_action_mapping(action[1], game, motion_embedding=phrase_embeddings.get(action[1]))
+        ignkey = self.action_to_key_input(ignaction, game)
+        self.metrics.inc("action_pairs_total")
+        if files == "none":
+            self.metrics.inc("none_matches_total", target=action_type)
+        if ignaction == "none":
+            self.metrics.inc("none_matches_total", target="action")
+        if ignkey == "Action not found":
+            self.metrics.inc("keys_not_found_total")
+        action_data = {
+            "files": files,
+            "action": {
+                "tmpt": action[1],
+                "class": ignaction,
+                "method": "hold" if pose_or_gesture[0] == "P" else "click",
+                "args": [ignkey]
+            }
+        }
+        return action_type, action_data
 
 def main():
     mapper = MotionGameMapper()
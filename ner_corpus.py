@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from pathlib import Path
+
+import spacy
+from spacy.tokens import DocBin
+from spacy.training import Example
+
+MANIFEST = "manifest.json"
+MISALIGNED = "misaligned.jsonl"
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ner_corpus_cache")
+
+
+def corpus_hash(examples, lang="en"):
+    """
+    Returns a content hash of (text, annotations) examples and the tokenizer that converts them, so a
+    converted corpus is reused until the data, the language or the spaCy version changes.
+    """
+    digest = hashlib.sha256(f"{spacy.__version__}:{lang}".encode())
+    for text, annotations in examples:
+        digest.update(json.dumps([text, [list(span) for span in annotations["entities"]]]).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def convert(examples, output_dir, lang="en", shard_size=10000):
+    """
+    Tokenizes (text, {"entities": [(start, end, label), ...]}) examples and writes them as DocBin shards
+    of shard_size docs to output_dir, with a manifest of the shards and entity labels. An example with a
+    span that does not start and end on token boundaries, or with overlapping spans, is left out and listed in
+    misaligned.jsonl, since training on it would teach the wrong boundaries. Returns the manifest.
+    """
+    nlp = spacy.blank(lang)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    shards = []
+    labels = set()
+    misaligned = 0
+    doc_bin = DocBin()
+
+    def write_shard():
+        path = output_dir / f"shard-{len(shards):05d}.spacy"
+        doc_bin.to_disk(path)
+        shards.append({"file": path.name, "docs": len(doc_bin)})
+
+    with open(output_dir / MISALIGNED, "w", encoding="utf-8") as report:
+        for index, (text, annotations) in enumerate(examples):
+            doc = nlp.make_doc(text)
+            spans = []
+            problems = []
+            for start, end, label in annotations["entities"]:
+                span = doc.char_span(start, end, label=label)
+                if span is None:
+                    problems.append({"span": [start, end, label], "text": text[start:end], "reason": "not on token boundaries"})
+                else:
+                    spans.append(span)
+            if not problems:
+                try:
+                    doc.ents = spans
+                except ValueError as e:
+                    problems.append({"reason": f"overlapping spans: {e}"})
+            if problems:
+                misaligned += 1
+                report.write(json.dumps({"index": index, "text": text, "problems": problems}) + "\n")
+                continue
+            labels.update(span.label_ for span in spans)
+            doc_bin.add(doc)
+            if len(doc_bin) >= shard_size:
+                write_shard()
+                doc_bin = DocBin()
+    if len(doc_bin) or not shards:
+        write_shard()
+
+    manifest = {"lang": lang, "spacy": spacy.__version__, "shards": shards, "docs": sum(shard["docs"] for shard in shards),
+                "labels": sorted(labels), "misaligned": misaligned}
+    # Written last and renamed into place, a directory without a manifest is an interrupted conversion
+    temp_path = output_dir / f"{MANIFEST}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+        manifest_file.flush()
+        os.fsync(manifest_file.fileno())
+    os.replace(temp_path, output_dir / MANIFEST)
+    return manifest
+
+
+class ShardedCorpus:
+    """
+    Reads the DocBin shards written by convert one shard at a time, so only one shard of docs is in memory.
+    """
+
+    def __init__(self, corpus_dir):
+        self.corpus_dir = Path(corpus_dir)
+        with open(self.corpus_dir / MANIFEST, encoding="utf-8") as manifest_file:
+            self.manifest = json.load(manifest_file)
+        self.labels = self.manifest["labels"]
+
+    def __len__(self):
+        return self.manifest["docs"]
+
+    def docs(self, vocab, rng=None):
+        """
+        Yields (index, doc) for every doc of the corpus, where index is the doc's position in the whole corpus.
+        With rng, the shards and the docs within each shard come in a random order.
+        """
+        offsets = []
+        offset = 0
+        for shard in self.manifest["shards"]:
+            offsets.append(offset)
+            offset += shard["docs"]
+        order = list(range(len(self.manifest["shards"])))
+        if rng is not None:
+            rng.shuffle(order)
+        for shard_index in order:
+            doc_bin = DocBin().from_disk(self.corpus_dir / self.manifest["shards"][shard_index]["file"])
+            docs = list(enumerate(doc_bin.get_docs(vocab), offsets[shard_index]))
+            if rng is not None:
+                rng.shuffle(docs)
+            yield from docs
+
+    def examples(self, nlp, rng=None, skip=()):
+        """
+        Yields a training Example per doc whose index is not in skip, see docs.
+        """
+        for index, reference in self.docs(nlp.vocab, rng):
+            if index not in skip:
+                yield Example(nlp.make_doc(reference.text), reference)
+
+
+def held_out(corpus, dev_split, rng):
+    """
+    Returns the indices of the dev_split fraction of the corpus's docs held out for evaluation, drawn with rng.
+    The same seed holds out the same docs, so configurations trained on one corpus are scored on the same docs.
+    """
+    return set(rng.sample(range(len(corpus)), int(len(corpus) * dev_split)))
+
+
+def cached_corpus(examples, cache_dir=DEFAULT_CACHE_DIR, lang="en", shard_size=10000):
+    """
+    Returns the ShardedCorpus of examples from cache_dir, converting them first if these exact examples
+    were not converted before. examples is iterated twice, once to hash it and once to convert it.
+    """
+    corpus_dir = Path(cache_dir) / corpus_hash(examples, lang)
+    if not (corpus_dir / MANIFEST).exists():
+        manifest = convert(examples, corpus_dir, lang, shard_size)
+        if manifest["misaligned"]:
+            print(f"Left out {manifest['misaligned']} examples with misaligned spans, see {corpus_dir / MISALIGNED}")
+    return ShardedCorpus(corpus_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert training examples into DocBin shards for train_ner.py --corpus.")
+    parser.add_argument("output_dir", help="Directory the shards and the manifest are written to.")
+    parser.add_argument("--input", nargs="*", default=[],
+                        help="JSONL files of {\"text\", \"entities\"} objects, e.g. written by utils/synonym_data_generator.py. TRAIN_DATA is always included.")
+    parser.add_argument("--shard-size", type=int, default=10000, help="Number of docs per shard.")
+    args = parser.parse_args()
+
+    from train_data import TRAIN_DATA
+    from utils.synonym_data_generator import read_jsonl
+
+    def examples():
+        yield from TRAIN_DATA
+        for input_path in args.input:
+            yield from read_jsonl(input_path)
+
+    manifest = convert(examples(), args.output_dir, shard_size=args.shard_size)
+    print(f"Wrote {manifest['docs']} docs in {len(manifest['shards'])} shards to {args.output_dir}, labels: {', '.join(manifest['labels'])}")
+    if manifest["misaligned"]:
+        print(f"Left out {manifest['misaligned']} examples with misaligned spans, see {os.path.join(args.output_dir, MISALIGNED)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ner_corpus import DEFAULT_CACHE_DIR, ShardedCorpus, cached_corpus, held_out
+from prefork import pin_threads
+
+# Parameters passed to NERTrainer.train, the others change the architecture of the NER model
+TRAIN_PARAMS = ("n_iter", "drop", "patience")
+TOK2VEC_PARAMS = ("width", "depth", "embed_size")
+PARSER_PARAMS = ("hidden_width", "maxout_pieces")
+DEFAULT_SPEC = {"width": [32, 64, 96], "embed_size": [500, 2000], "drop": [0.2, 0.5]}
+
+
+def grid(spec):
+    """
+    Returns every combination of the values of spec, a dict of parameter name to list of values.
+    """
+    names = sorted(spec)
+    return [dict(zip(names, values)) for values in itertools.product(*(spec[name] for name in names))]
+
+
+def random_search(spec, samples, seed=0):
+    """
+    Returns samples distinct configurations drawn from spec, fewer if the grid is smaller. A parameter is
+    either a list to choose from or a {"min", "max"} range, sampled as an int if both bounds are ints.
+    """
+    rng = random.Random(seed)
+    configurations = []
+    # A range has too many values to enumerate, so duplicates are only skipped for a while
+    attempts = samples * 10
+    while len(configurations) < samples and attempts:
+        attempts -= 1
+        configuration = {}
+        for name in sorted(spec):
+            values = spec[name]
+            if isinstance(values, dict):
+                if isinstance(values["min"], int) and isinstance(values["max"], int):
+                    configuration[name] = rng.randint(values["min"], values["max"])
+                else:
+                    configuration[name] = rng.uniform(values["min"], values["max"])
+            else:
+                configuration[name] = rng.choice(values)
+        if configuration not in configurations:
+            configurations.append(configuration)
+    return configurations
+
+
+def model_config(params):
+    """
+    Returns the NER model config overrides for the architecture parameters in params.
+    """
+    config = {name: params[name] for name in PARSER_PARAMS if name in params}
+    tok2vec = {name: params[name] for name in TOK2VEC_PARAMS if name in params}
+    if tok2vec:
+        config["tok2vec"] = tok2vec
+    return config
+
+
+def measure_latency(nlp, texts, repeat=3):
+    """
+    Returns the per-doc p50/p95 latency in milliseconds of nlp over texts, and its docs per second with nlp.pipe.
+    """
+    for text in texts[:10]:
+        nlp(text)
+    seconds = []
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            nlp(text)
+            seconds.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _ in nlp.pipe(texts):
+            pass
+    pipe_seconds = time.perf_counter() - start
+    p50, p95 = np.percentile(np.asarray(seconds) * 1000, [50, 95])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "docs_per_s": len(texts) * repeat / pipe_seconds}
+
+
+def directory_size(path):
+    return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file())
+
+
+def run_trial(trial):
+    """
+    Trains one configuration into its own directory, replacing the model an earlier sweep trained there, and
+    scores it on the held out docs. The training log
+    goes to train.log in that directory. Returns the trial's result, or its error if training failed.
+    """
+    import spacy
+    from train_ner import NERTrainer
+
+    index, params, corpus_dir, output_dir, dev_split, seed = trial
+    trial_dir = Path(output_dir) / f"trial-{index:03d}"
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    model_dir = trial_dir / "ner_model"
+    if model_dir.exists():
+        # Left by an earlier sweep into the same output, NERTrainer would keep training it with its own architecture
+        shutil.rmtree(model_dir)
+    result = {"trial": index, "params": params, "model_dir": str(model_dir)}
+    start = time.perf_counter()
+    try:
+        with open(trial_dir / "train.log", "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+            trainer = NERTrainer(str(model_dir))
+            training = trainer.train(dev_split=dev_split, seed=seed, corpus_dir=corpus_dir, model_config=model_config(params),
+                                     **{name: params[name] for name in TRAIN_PARAMS if name in params})
+        result["train_seconds"] = time.perf_counter() - start
+        result["best_epoch"] = training["best_epoch"]
+        result["epochs"] = training["epochs"]
+        result["scores"] = training["scores"]
+
+        nlp = spacy.load(model_dir, exclude=["motion_entity_matcher"])
+        corpus = ShardedCorpus(corpus_dir)
+        dev_indices = held_out(corpus, dev_split, random.Random(seed))
+        texts = [doc.text for index, doc in corpus.docs(nlp.vocab) if index in dev_indices]
+        result["latency"] = measure_latency(nlp, texts)
+        result["model_mb"] = directory_size(model_dir / "ner") / 2**20
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def rank(results):
+    """
+    Sorts the results by dev F-score, then by p50 latency, failed trials last. A trial is marked pareto when no
+    other trial is both at least as accurate and at least as fast, and better in one of the two.
+    """
+    scored = [result for result in results if "error" not in result]
+    for result in scored:
+        f_score, latency = result["scores"]["ents_f"], result["latency"]["p50_ms"]
+        result["pareto"] = not any(
+            other["scores"]["ents_f"] >= f_score and other["latency"]["p50_ms"] <= latency
+            and (other["scores"]["ents_f"] > f_score or other["latency"]["p50_ms"] < latency)
+            for other in scored
+        )
+    scored.sort(key=lambda result: (-result["scores"]["ents_f"], result["latency"]["p50_ms"]))
+    return scored + [result for result in results if "error" in result]
+
+
+def format_report(ranked):
+    """
+    Returns the ranked results as a table, pareto trials marked with *.
+    """
+    names = sorted({name for result in ranked for name in result["params"]})
+    header = f"{'rank':>4} {'trial':>5} " + " ".join(f"{name:>12}" for name in names) + f" {'F':>6} {'p50 ms':>8} {'p95 ms':>8} {'docs/s':>8} {'MB':>6}"
+    lines = [header]
+    for position, result in enumerate(ranked, 1):
+        params = " ".join(f"{result['params'].get(name, ''):>12}" if not isinstance(result["params"].get(name), float)
+                          else f"{result['params'][name]:>12.3g}" for name in names)
+        if "error" in result:
+            lines.append(f"{position:>4} {result['trial']:>5} {params} failed: {result['error']}")
+            continue
+        latency = result["latency"]
+        lines.append(f"{position:>4} {result['trial']:>5} {params} {result['scores']['ents_f']:6.3f} {latency['p50_ms']:8.2f} "
+                     f"{latency['p95_ms']:8.2f} {latency['docs_per_s']:8.0f} {result['model_mb']:6.1f}{' *' if result['pareto'] else ''}")
+    lines.append("* no other configuration is both as accurate and as fast")
+    return "\n".join(lines)
+
+
+def sweep(configurations, output_dir, corpus_dir=None, examples=None, workers=1, threads=1, dev_split=0.2, seed=0, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Trains every configuration on the corpus in corpus_dir, or on examples converted into cache_dir, with up to
+    workers trials in parallel and threads threads each. Every configuration holds out the same docs.
+    Writes report.json and report.txt to output_dir and returns the ranked results.
+    """
+    if not 0 < dev_split < 1:
+        raise ValueError("A sweep needs held out docs to score the configurations on, dev_split must be between 0 and 1")
+    if corpus_dir is None:
+        corpus_dir = str(cached_corpus(examples, cache_dir).corpus_dir)
+    trials = [(index, params, corpus_dir, output_dir, dev_split, seed) for index, params in enumerate(configurations)]
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    pin_threads(threads)
+    if workers <= 1:
+        results = [run_trial(trial) for trial in trials]
+    else:
+        # Spawned workers start with the pinned thread variables, forked ones would inherit the parent's pools
+        with multiprocessing.get_context("spawn").Pool(workers, initializer=pin_threads, initargs=(threads,)) as pool:
+            results = []
+            for result in pool.imap_unordered(run_trial, trials):
+                status = result["error"] if "error" in result else f"F {result['scores']['ents_f']:.3f}"
+                print(f"Trial {result['trial']} done: {status}")
+                results.append(result)
+    ranked = rank(results)
+    report = format_report(ranked)
+    with open(Path(output_dir) / "report.json", "w", encoding="utf-8") as report_file:
+        json.dump({"corpus_dir": corpus_dir, "dev_split": dev_split, "seed": seed, "threads": threads, "results": ranked}, report_file, indent=4)
+    with open(Path(output_dir) / "report.txt", "w", encoding="utf-8") as report_file:
+        report_file.write(report + "\n")
+    return ranked
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train NER configurations in parallel and rank them by dev F-score and latency.")
+    parser.add_argument("--spec", default=None,
+                        help="JSON file of parameter name to a list of values (or a {\"min\", \"max\"} range for --search random). "
+                             f"Parameters: {', '.join(TRAIN_PARAMS + TOK2VEC_PARAMS + PARSER_PARAMS)}.")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid", help="Try every combination, or --samples random ones.")
+    parser.add_argument("--samples", type=int, default=8, help="Number of configurations of a random search.")
+    parser.add_argument("--corpus", default=None, help="DocBin corpus written by ner_corpus.py, TRAIN_DATA by default.")
+    parser.add_argument("--output", default="ner_sweep", help="Directory of the trained models and the report.")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2), help="Number of configurations trained at once.")
+    parser.add_argument("--threads", type=int, default=1, help="Threads per worker.")
+    parser.add_argument("--dev-split", type=float, default=0.2, help="Fraction of the docs held out for scoring.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the held out split and the random search.")
+    args = parser.parse_args()
+
+    spec = DEFAULT_SPEC
+    if args.spec:
+        with open(args.spec, encoding="utf-8") as spec_file:
+            spec = json.load(spec_file)
+    unknown = set(spec) - set(TRAIN_PARAMS + TOK2VEC_PARAMS + PARSER_PARAMS)
+    if unknown:
+        parser.error(f"unknown parameters: {', '.join(sorted(unknown))}")
+    configurations = grid(spec) if args.search == "grid" else random_search(spec, args.samples, args.seed)
+    examples = None
+    if args.corpus is None:
+        from train_data import TRAIN_DATA
+        examples = TRAIN_DATA
+    print(f"Training {len(configurations)} configurations on {args.workers} workers")
+    ranked = sweep(configurations, args.output, args.corpus, examples, args.workers, args.threads, args.dev_split, args.seed)
+    print(format_report(ranked))
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+from embedding_store import model_fingerprint
+
+ONNX_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+EXPORT_INFO_FILE = "export.json"
+# Files of the sentence model the encoder needs next to the graph
+# Pooling modes of 1_Pooling/config.json the encoder supports, each adds word_embedding_dimension columns
+POOLING_MODES = ("pooling_mode_cls_token", "pooling_mode_max_tokens", "pooling_mode_mean_tokens", "pooling_mode_mean_sqrt_len_tokens")
+COPIED_FILES = ["tokenizer.json", "modules.json", "sentence_bert_config.json", os.path.join("1_Pooling", "config.json")]
+
+
+def default_onnx_path(model_path):
+    return os.path.normpath(model_path) + "-onnx"
+
+
+def export_onnx(model_path="./fine-tuned-model", onnx_path=None, quantize=True, opset=14):
+    """
+    Exports the transformer of a sentence model to an ONNX graph that returns the token embeddings, plus a
+    dynamically quantized int8 copy (int8 weights, activations quantized at runtime). Pooling and normalization
+    are done by OnnxSentenceEncoder from the copied sentence-transformers configuration.
+    Needs torch, transformers, onnx and onnxruntime. Returns the output directory.
+    """
+    import inspect
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    onnx_path = onnx_path or default_onnx_path(model_path)
+    os.makedirs(onnx_path, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModel.from_pretrained(model_path)
+    model.eval()
+
+    inputs = tokenizer(["export the sentence encoder", "jump"], padding=True, return_tensors="pt")
+    # Graph inputs are named in the order of the forward() arguments
+    input_names = [name for name in inspect.signature(model.forward).parameters if name in inputs]
+    dynamic_axes = {name: {0: "batch", 1: "tokens"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "tokens"}
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(inputs[name] for name in input_names), os.path.join(onnx_path, ONNX_FILE), input_names=input_names,
+                          output_names=["last_hidden_state"], dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(os.path.join(onnx_path, ONNX_FILE), os.path.join(onnx_path, INT8_FILE), weight_type=QuantType.QInt8)
+
+    for name in COPIED_FILES:
+        source = os.path.join(model_path, name)
+        if os.path.exists(source):
+            os.makedirs(os.path.dirname(os.path.join(onnx_path, name)), exist_ok=True)
+            shutil.copyfile(source, os.path.join(onnx_path, name))
+    with open(os.path.join(onnx_path, EXPORT_INFO_FILE), "w", encoding="utf-8") as info_file:
+        json.dump({"source_fingerprint": model_fingerprint(model_path), "opset": opset, "quantized": quantize}, info_file, indent=4)
+    return onnx_path
+
+
+def backend_fingerprint(onnx_path, quantized):
+    """
+    Fingerprint of the exported graph a backend runs, used to key cached and stored embeddings.
+    """
+    with open(os.path.join(onnx_path, EXPORT_INFO_FILE), encoding="utf-8") as info_file:
+        source = json.load(info_file)["source_fingerprint"]
+    return hashlib.sha256(f"{source}:onnx{'-int8' if quantized else ''}".encode("utf-8")).hexdigest()
+
+
+class OnnxSentenceEncoder:
+    """
+    Runs a sentence model exported by export_onnx with onnxruntime on the CPU. encode() takes the same
+    arguments as SentenceTransformer.encode for the ways the mapper calls it and applies the pooling of
+    1_Pooling/config.json and the Normalize module, so its embeddings match the PyTorch model.
+    """
+
+    def __init__(self, onnx_path, quantized=True, intra_op_threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        graph = os.path.join(onnx_path, INT8_FILE if quantized else ONNX_FILE)
+        if not os.path.exists(graph):
+            raise FileNotFoundError(f"{graph} does not exist, export it with: python onnx_encoder.py")
+        self.graph = graph
+        self.reset_session(intra_op_threads)
+
+        with open(os.path.join(onnx_path, "sentence_bert_config.json"), encoding="utf-8") as config_file:
+            self.max_seq_length = json.load(config_file).get("max_seq_length", 512)
+        with open(os.path.join(onnx_path, "1_Pooling", "config.json"), encoding="utf-8") as config_file:
+            self.pooling = json.load(config_file)
+        unsupported = [mode for mode in ("pooling_mode_weightedmean_tokens", "pooling_mode_lasttoken") if self.pooling.get(mode)]
+        if unsupported:
+            raise ValueError(f"Unsupported pooling modes: {unsupported}")
+        with open(os.path.join(onnx_path, "modules.json"), encoding="utf-8") as modules_file:
+            self.normalize = any(module["type"].endswith("Normalize") for module in json.load(modules_file))
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(onnx_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.max_seq_length)
+        self.tokenizer.enable_padding()
+
+    def reset_session(self, intra_op_threads=None):
+        """
+        Creates a new onnxruntime session, e.g. in a forked process where the thread pool of the inherited one is gone.
+        """
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(self.graph, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    @property
+    def embedding_dimension(self):
+        """
+        The width of an embedding, the pooled modes are concatenated.
+        """
+        return self.pooling["word_embedding_dimension"] * sum(bool(self.pooling.get(mode)) for mode in POOLING_MODES)
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """
+        Returns one embedding row per sentence, or a vector for a single sentence string.
+        """
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        if not sentences:
+            return np.zeros((0, self.embedding_dimension), dtype=np.float32)
+        # Length-sorted batches pad less, rows are put back in input order below
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        embeddings = np.empty((len(sentences), self.embedding_dimension), dtype=np.float32)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            embeddings[batch] = self._encode_batch([sentences[i] for i in batch])
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, sentences):
+        encodings = self.tokenizer.encode_batch(sentences)
+        features = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        token_embeddings = self.session.run(None, {name: features[name] for name in self.input_names})[0]
+        return self._pool(token_embeddings, features["attention_mask"])
+
+    def _pool(self, token_embeddings, attention_mask):
+        # Same pooling modes, in the same order, as sentence_transformers.models.Pooling
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = []
+        if self.pooling.get("pooling_mode_cls_token"):
+            pooled.append(token_embeddings[:, 0])
+        if self.pooling.get("pooling_mode_max_tokens"):
+            pooled.append(np.where(mask > 0, token_embeddings, -1e9).max(axis=1))
+        if self.pooling.get("pooling_mode_mean_tokens") or self.pooling.get("pooling_mode_mean_sqrt_len_tokens"):
+            summed = (token_embeddings * mask).sum(axis=1)
+            lengths = np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.pooling.get("pooling_mode_mean_tokens"):
+                pooled.append(summed / lengths)
+            if self.pooling.get("pooling_mode_mean_sqrt_len_tokens"):
+                pooled.append(summed / np.sqrt(lengths))
+        embeddings = np.concatenate(pooled, axis=1).astype(np.float32)
+        if self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export the sentence model to ONNX and an int8 quantized ONNX graph.")
+    parser.add_argument("--model-path", default="./fine-tuned-model", help="Path of the sentence model.")
+    parser.add_argument("--output", default=None, help="Output directory, by default <model-path>-onnx.")
+    parser.add_argument("--no-quantize", action="store_true", help="Only export the fp32 graph.")
+    args = parser.parse_args()
+    print(f"Exported to {export_onnx(args.model_path, args.output, quantize=not args.no_quantize)}")
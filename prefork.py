@@ -0,0 +1,183 @@
+import gc
+import os
+import signal
+import sys
+import time
+
+# Fields of /proc/<pid>/smaps_rollup, in kB
+_SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def memory_usage(pid):
+    """
+    Returns the RSS, PSS, USS (the pages no other process maps) and shared bytes of a process, or None if
+    /proc/<pid>/smaps_rollup cannot be read, e.g. outside Linux. USS is what stopping the process would free,
+    PSS splits every shared page evenly between the processes that map it.
+    """
+    values = dict.fromkeys(_SMAPS_FIELDS, 0)
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as smaps:
+            for line in smaps:
+                name, _, rest = line.partition(":")
+                if name in values:
+                    values[name] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss": values["Rss"],
+        "pss": values["Pss"],
+        "uss": values["Private_Clean"] + values["Private_Dirty"],
+        "shared": values["Shared_Clean"] + values["Shared_Dirty"],
+    }
+
+
+def format_memory_report(processes):
+    """
+    Returns a table of the memory of (role, pid) processes, e.g. the parent and its workers.
+    """
+    lines = [f"{'process':>10} {'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'USS MB':>9}"]
+    total_pss = 0
+    for role, pid in processes:
+        usage = memory_usage(pid)
+        if usage is None:
+            lines.append(f"{role:>10} {pid:>8} {'unavailable':>29}")
+            continue
+        total_pss += usage["pss"]
+        lines.append(f"{role:>10} {pid:>8} {usage['rss'] / 2**20:9.1f} {usage['pss'] / 2**20:9.1f} {usage['uss'] / 2**20:9.1f}")
+    lines.append(f"{'total PSS':>10} {'':>8} {'':>9} {total_pss / 2**20:9.1f}")
+    return "\n".join(lines)
+
+
+# Environment variables read by the BLAS and OpenMP thread pools when a process starts them
+THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def pin_threads(threads):
+    """
+    Limits the process to threads threads, so parallel worker processes do not oversubscribe the cores.
+    Call it before the models are loaded, the thread pools read the environment when they start.
+    """
+    for name in THREAD_ENV:
+        os.environ[name] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def limit_threads_before_load():
+    """
+    Keeps the parent from starting native thread pools while it loads and warms up the models. An OpenMP pool
+    that was running before fork() hangs the first parallel region in the child, and the Rust tokenizers
+    pool does the same. Must be called before torch is imported.
+    """
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(1)
+    else:
+        os.environ["OMP_NUM_THREADS"] = "1"
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+def configure_worker_threads(threads):
+    """
+    Sets the number of threads torch may use in a forked worker, if the parent loaded torch.
+    """
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def freeze_heap():
+    """
+    Moves every object allocated so far out of the garbage collector's reach. Otherwise a collection in a
+    worker writes to the header of every tracked object and copies the pages that hold them.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+class PreforkWorkers:
+    """
+    Forks workers from a parent that already loaded everything they need, so the model weights, the NER model
+    and the label index are shared copy-on-write instead of loaded once per worker. Workers that exit are forked again.
+    """
+
+    def __init__(self, workers, run_worker):
+        """
+        :param workers: The number of worker processes.
+        :param run_worker: Called in each forked worker, its return value is the worker's exit code.
+        """
+        self.workers = workers
+        self.run_worker = run_worker
+        self.pids = []
+        self.stopping = False
+
+    def _fork(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+                code = self.run_worker() or 0
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e}")
+            finally:
+                sys.stdout.flush()
+                # Skips the parent's atexit handlers and the cleanup of objects it still owns
+                os._exit(code)
+        self.pids.append(pid)
+        return pid
+
+    def start(self):
+        for _ in range(self.workers):
+            self._fork()
+
+    def memory_report(self):
+        return format_memory_report([("parent", os.getpid())] + [("worker", pid) for pid in self.pids])
+
+    def supervise(self, report_seconds=None):
+        """
+        Waits until SIGINT or SIGTERM while forking replacements for workers that exit. SIGUSR1 prints the
+        memory report, which is also printed every report_seconds if given.
+        """
+        def request_stop(signum, frame):
+            self.stopping = True
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGUSR1, lambda signum, frame: print(self.memory_report(), flush=True))
+        next_report = time.monotonic() + report_seconds if report_seconds else None
+        while not self.stopping:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid, status = 0, 0
+            if pid and pid in self.pids:
+                self.pids.remove(pid)
+                if not self.stopping:
+                    print(f"Worker {pid} exited with status {status}, forking a new one")
+                    self._fork()
+            if next_report is not None and time.monotonic() >= next_report:
+                print(self.memory_report(), flush=True)
+                next_report += report_seconds
+            time.sleep(0.2)
+
+    def stop(self):
+        """
+        Asks every worker to finish its in-flight requests and exit, and waits for them.
+        """
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.pids = []
@@ -0,0 +1,217 @@
+import argparse
+import cProfile
+import glob
+import io
+import json
+import os
+import platform
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Turn profiling on without code changes: reports go to $MOTION_PROFILE_DIR, a fraction $MOTION_PROFILE_SAMPLE of the calls is profiled
+PROFILE_DIR_ENV = "MOTION_PROFILE_DIR"
+PROFILE_SAMPLE_ENV = "MOTION_PROFILE_SAMPLE"
+
+
+def _function_name(function):
+    filename, line, name = function
+    return f"{filename}:{line}({name})"
+
+
+class Profiler:
+    """
+    Profiles a sampled fraction of the prediction calls with cProfile and tracemalloc. Each profiled call
+    writes <id>.prof (cProfile stats, readable with pstats or snakeviz) and <id>.json (the call's metadata,
+    its duration, hottest functions and top allocations) to reports_dir. Only one call is profiled at a time,
+    calls that overlap a profiled one are not sampled.
+    """
+
+    enabled = True
+
+    def __init__(self, reports_dir, sample_rate=1.0, top=25, seed=None):
+        """
+        :param reports_dir: Directory the reports are written to, created if needed.
+        :param sample_rate: The fraction of calls that is profiled, between 0 and 1.
+        :param top: The number of functions and allocation sites kept in each report.
+        """
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(f"sample_rate must be between 0 and 1, got {sample_rate}")
+        self.reports_dir = reports_dir
+        self.sample_rate = sample_rate
+        self.top = top
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._count = 0
+        os.makedirs(reports_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, reports_dir=None, sample_rate=None):
+        """
+        Returns a Profiler for reports_dir, or $MOTION_PROFILE_DIR if it is None, or NULL_PROFILER if neither is set.
+        The sample rate falls back to $MOTION_PROFILE_SAMPLE and then to 1.
+        """
+        reports_dir = reports_dir or os.environ.get(PROFILE_DIR_ENV)
+        if not reports_dir:
+            return NULL_PROFILER
+        if sample_rate is None:
+            sample_rate = float(os.environ.get(PROFILE_SAMPLE_ENV) or 1.0)
+        return cls(reports_dir, sample_rate)
+
+    def profile(self, kind, **metadata):
+        """
+        Returns a context manager that profiles its block if the call is sampled. kind names the profiled
+        call (e.g. "predict_to_json") and metadata is stored in the report as is.
+        """
+        if self._random.random() >= self.sample_rate or not self._lock.acquire(blocking=False):
+            return nullcontext()
+        return self._profiled(kind, metadata)
+
+    @contextmanager
+    def _profiled(self, kind, metadata):
+        # Called with self._lock held
+        try:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+            profiler = cProfile.Profile()
+            started_at = time.time()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                duration = time.perf_counter() - start
+                after = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+                self._write_report(kind, metadata, profiler, before, after, started_at, duration, peak)
+        finally:
+            self._lock.release()
+
+    def _write_report(self, kind, metadata, profiler, before, after, started_at, duration, peak):
+        self._count += 1
+        report_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started_at))}-{os.getpid()}-{self._count:06d}"
+        path = os.path.join(self.reports_dir, report_id)
+        profiler.dump_stats(f"{path}.prof")
+
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top]
+        # Ignore the profiler's own frames, e.g. taking the snapshots
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        allocations = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")[:self.top]
+        report = {
+            "id": report_id,
+            "kind": kind,
+            "metadata": metadata,
+            "started_at": started_at,
+            "duration_seconds": duration,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "python": platform.python_version(),
+            "sample_rate": self.sample_rate,
+            "peak_traced_bytes": peak,
+            "functions": [{"function": _function_name(function), "calls": calls, "tottime": tottime, "cumtime": cumtime}
+                          for function, (_, calls, tottime, cumtime, _) in functions],
+            "allocations": [{"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "size_bytes": stat.size_diff,
+                             "count": stat.count_diff} for stat in allocations],
+        }
+        with open(f"{path}.json", "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=4)
+
+
+class NullProfiler:
+    """
+    Stands in for Profiler when profiling is turned off.
+    """
+
+    enabled = False
+    _context = nullcontext()
+
+    def profile(self, kind, **metadata):
+        return self._context
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def summarize_reports(reports_dir, top=20, sort="tottime", kind=None):
+    """
+    Aggregates the reports of reports_dir: the hottest functions across all cProfile stats, sorted by sort
+    ("tottime", "cumulative" or "calls"), the allocation sites with the largest total growth and the call durations.
+    With kind, only reports of that kind are used.
+    """
+    reports = []
+    for json_path in sorted(glob.glob(os.path.join(reports_dir, "*.json"))):
+        with open(json_path, encoding="utf-8") as report_file:
+            report = json.load(report_file)
+        if kind is None or report.get("kind") == kind:
+            reports.append((json_path[:-len(".json")], report))
+    if not reports:
+        return {"reports": 0, "functions": [], "allocations": [], "durations": {}}
+
+    stats = pstats.Stats(*[f"{path}.prof" for path, _ in reports if os.path.exists(f"{path}.prof")], stream=io.StringIO())
+    key = {"tottime": 2, "cumulative": 3, "calls": 1}[sort]
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)[:top]
+
+    allocations = {}
+    for _, report in reports:
+        for allocation in report["allocations"]:
+            total = allocations.setdefault(allocation["location"], {"size_bytes": 0, "count": 0, "reports": 0})
+            total["size_bytes"] += allocation["size_bytes"]
+            total["count"] += allocation["count"]
+            total["reports"] += 1
+
+    durations = {}
+    for _, report in reports:
+        durations.setdefault(report["kind"], []).append(report["duration_seconds"])
+    return {
+        "reports": len(reports),
+        "functions": [{"function": _function_name(function), "calls": calls, "tottime": tottime, "cumtime": cumtime}
+                      for function, (_, calls, tottime, cumtime, _) in functions],
+        "allocations": [{"location": location, **total} for location, total in
+                        sorted(allocations.items(), key=lambda item: item[1]["size_bytes"], reverse=True)[:top]],
+        "durations": {name: {"count": len(seconds), "mean_seconds": sum(seconds) / len(seconds), "max_seconds": max(seconds)}
+                      for name, seconds in durations.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the profiling reports written with --profile-dir or $MOTION_PROFILE_DIR.")
+    parser.add_argument("reports_dir", help="Directory of the reports.")
+    parser.add_argument("--top", type=int, default=20, help="Number of functions and allocation sites to show.")
+    parser.add_argument("--sort", choices=["tottime", "cumulative", "calls"], default="tottime", help="Order of the functions.")
+    parser.add_argument("--kind", default=None, help="Only use reports of this kind, e.g. predict_to_json or predict_batch.")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+    args = parser.parse_args()
+
+    summary = summarize_reports(args.reports_dir, args.top, args.sort, args.kind)
+    if args.json:
+        print(json.dumps(summary, indent=4))
+        return
+    if not summary["reports"]:
+        print(f"No reports in {args.reports_dir}")
+        sys.exit(1)
+    print(f"{summary['reports']} reports")
+    for name, durations in summary["durations"].items():
+        print(f"  {name}: {durations['count']} calls, mean {durations['mean_seconds'] * 1000:.1f} ms, max {durations['max_seconds'] * 1000:.1f} ms")
+    print(f"\nHottest functions by {args.sort}:")
+    print(f"{'calls':>10} {'tottime':>10} {'cumtime':>10}  function")
+    for function in summary["functions"]:
+        print(f"{function['calls']:>10} {function['tottime']:>10.4f} {function['cumtime']:>10.4f}  {function['function']}")
+    print("\nLargest allocation sites:")
+    print(f"{'KiB':>10} {'blocks':>10} {'reports':>8}  location")
+    for allocation in summary["allocations"]:
+        print(f"{allocation['size_bytes'] / 1024:>10.1f} {allocation['count']:>10} {allocation['reports']:>8}  {allocation['location']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# The server never reaches out to the Hugging Face hub, every model is read from disk
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+from motion_game_mapper import MotionGameMapper, ENCODER_BACKENDS
+from metrics import MetricsRegistry
+import prefork
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class PredictionService:
+    """
+    Owns the warm MotionGameMapper shared by every request and tracks whether it is ready to serve.
+    """
+
+    def __init__(self, mapper_factory, metrics=None):
+        """
+        :param mapper_factory: Returns the MotionGameMapper to serve.
+        :param metrics: The MetricsRegistry the mapper records into, served on GET /metrics.
+        """
+        self.mapper_factory = mapper_factory
+        self.metrics = metrics
+        self.mapper = None
+        self.ready = threading.Event()
+        self.stopping = threading.Event()
+        self.load_error = None
+
+    def load(self):
+        """
+        Loads the models and runs one prediction so the first real request does not pay for any warm-up.
+        """
+        try:
+            mapper = self.mapper_factory()
+            mapper.predict("I want to play Minecraft and jump with a fist")
+            self.mapper = mapper
+            self.ready.set()
+        except BaseException as e:
+            # The mapper exits the process on load errors, keep serving health checks to report it
+            self.load_error = str(e) or type(e).__name__
+            print(f"Error loading models: {self.load_error}")
+
+    @property
+    def is_ready(self):
+        return self.ready.is_set() and not self.stopping.is_set()
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves GET /healthz, GET /readyz, GET /metrics (Prometheus text, or JSON with ?format=json),
+    POST /predict with {"text": ...} (or a plain text body) and POST /predict_batch with {"texts": [...]}.
+    """
+
+    server_version = "MotionGameMapper/1.0"
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/healthz":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/readyz":
+            if service.is_ready:
+                self._send_json(200, {"status": "ready"})
+            else:
+                status = "stopping" if service.stopping.is_set() else "loading"
+                self._send_json(503, {"status": status, "error": service.load_error})
+        elif self.path in ("/metrics", "/metrics?format=json"):
+            if service.metrics is None:
+                self._send_json(404, {"error": "Metrics are turned off"})
+            elif self.path.endswith("format=json"):
+                self._send_json(200, service.metrics.snapshot())
+            else:
+                self._send_text(200, service.metrics.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path not in ("/predict", "/predict_batch"):
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        if not service.is_ready:
+            self._send_json(503, {"error": "Models are not loaded yet"})
+            return
+        try:
+            payload = self._read_payload()
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        if payload is None:
+            return
+
+        try:
+            if self.path == "/predict":
+                text = payload.get("text") if isinstance(payload, dict) else payload
+                if not isinstance(text, str):
+                    self._send_json(400, {"error": "Expected a \"text\" string"})
+                    return
+                self._send_json(200, service.mapper.predict(text))
+            else:
+                texts = payload.get("texts") if isinstance(payload, dict) else None
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    self._send_json(400, {"error": "Expected a \"texts\" list of strings"})
+                    return
+                self._send_json(200, service.mapper.predict_batch(texts))
+        except Exception as e:
+            print(f"Error during prediction: {e}")
+            self._send_json(500, {"error": str(e)})
+
+    def _read_payload(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length < 0:
+            # rfile.read(-1) would wait for the client to close the connection
+            self._send_json(400, {"error": "Content-Length must not be negative"})
+            return None
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {"error": f"Request body is larger than {MAX_BODY_BYTES} bytes"})
+            return None
+        body = self.rfile.read(length).decode("utf-8")
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                return json.loads(body)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON: {e}")
+        return body
+
+    def _send_json(self, status, data):
+        # Same layout as the file written by predict_to_json
+        self._send_text(status, json.dumps(data, indent=4), "application/json")
+
+    def _send_text(self, status, text, content_type):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else "unix"
+
+
+class WorkerPoolMixIn:
+    """
+    Handles each connection on a fixed pool of worker threads instead of one new thread per connection.
+    """
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_in_worker, request, client_address)
+
+    def _process_request_in_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def start_workers(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="predict")
+
+    def stop_workers(self):
+        # Lets the requests that were already accepted finish
+        self.executor.shutdown(wait=True)
+
+
+class PooledHTTPServer(WorkerPoolMixIn, HTTPServer):
+    pass
+
+
+class PooledUnixHTTPServer(WorkerPoolMixIn, socketserver.UnixStreamServer):
+    def server_bind(self):
+        # A socket file left behind by a crashed server would make bind fail
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+
+def create_servers(service, host="127.0.0.1", port=8765, unix_socket=None, workers=4):
+    """
+    Creates the HTTP server on host:port (unless port is None) and the one on the Unix socket (if given).
+    """
+    servers = []
+    if port is not None:
+        servers.append(PooledHTTPServer((host, port), PredictionRequestHandler))
+    if unix_socket:
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unix domain sockets are not supported on this platform")
+        servers.append(PooledUnixHTTPServer(unix_socket, PredictionRequestHandler))
+    for server in servers:
+        server.service = service
+        server.start_workers(workers)
+    return servers
+
+
+def serve(servers, service, remove_socket=True):
+    """
+    Serves until SIGINT or SIGTERM, then stops accepting connections, finishes in-flight requests and cleans up.
+    Pre-forked workers leave the Unix socket file to the parent.
+    """
+    threads = [threading.Thread(target=server.serve_forever, name="accept", daemon=True) for server in servers]
+    for thread in threads:
+        thread.start()
+
+    def request_stop(signum, frame):
+        service.stopping.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    while not service.stopping.wait(0.5):
+        pass
+
+    print("Shutting down")
+    for server in servers:
+        server.shutdown()
+    for server in servers:
+        server.stop_workers()
+        server.server_close()
+        if remove_socket and isinstance(server, PooledUnixHTTPServer) and os.path.exists(server.server_address):
+            os.unlink(server.server_address)
+    if service.mapper is not None:
+        # Pre-forked workers exit with os._exit, which skips the store's own flush at exit
+        service.mapper.flush_embedding_store()
+
+
+def serve_prefork(servers, service, workers, threads=4, torch_threads=1, memory_report_seconds=None):
+    """
+    Loads and warms up the models in this process, then forks workers that accept connections on the already
+    bound sockets. The workers share the parent's model pages copy-on-write, see prefork.py. Runs until SIGINT
+    or SIGTERM, SIGUSR1 prints the RSS, PSS and USS of the parent and every worker.
+    """
+    prefork.limit_threads_before_load()
+    service.load()
+    if not service.is_ready:
+        raise SystemExit(1)
+    # Otherwise every worker would inherit the warm-up's buffered embeddings and write them again
+    service.mapper.flush_embedding_store()
+    prefork.freeze_heap()
+
+    def run_worker():
+        prefork.configure_worker_threads(torch_threads)
+        service.mapper.after_fork(torch_threads)
+        for server in servers:
+            server.start_workers(threads)
+        serve(servers, service, remove_socket=False)
+
+    pool = prefork.PreforkWorkers(workers, run_worker)
+    pool.start()
+    print(f"Forked {workers} workers: {pool.pids}")
+    pool.supervise(memory_report_seconds)
+
+    print("Shutting down")
+    pool.stop()
+    for server in servers:
+        server.server_close()
+        if isinstance(server, PooledUnixHTTPServer) and os.path.exists(server.server_address):
+            os.unlink(server.server_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve MotionGameMapper predictions from warm models over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface of the HTTP server.")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the HTTP server, 0 picks a free port.")
+    parser.add_argument("--no-http", action="store_true", help="Only listen on the Unix socket.")
+    parser.add_argument("--unix-socket", default=None, help="Path of a Unix domain socket to listen on as well.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker threads handling requests, per process with --prefork.")
+    parser.add_argument("--prefork", type=int, default=0,
+                        help="Load the models once and fork this many worker processes that share them copy-on-write (Linux and macOS).")
+    parser.add_argument("--torch-threads", type=int, default=None, help="Threads of the sentence model per pre-forked worker, by default CPUs / workers.")
+    parser.add_argument("--memory-report-seconds", type=float, default=None,
+                        help="With --prefork, print the RSS, PSS and USS of every process this often. SIGUSR1 prints it once.")
+    parser.add_argument("--model-path", default="./fine-tuned-model", help="Path of the sentence model.")
+    parser.add_argument("--ner-model-path", default="./ner_model", help="Path of the spaCy NER model.")
+    parser.add_argument("--embedding-store", default=None, help="Directory of the on-disk embedding store.")
+    parser.add_argument("--encoder-backend", choices=ENCODER_BACKENDS, default="torch", help="Runtime of the sentence model, onnx needs python onnx_encoder.py first.")
+    parser.add_argument("--game-catalog", default=None, help="SQLite game catalog written by game_catalog.py, instead of game_controls.py.")
+    parser.add_argument("--micro-batch-ms", type=float, default=2.0,
+                        help="How long an encoder call waits for concurrent requests to share its batch, a negative value disables it.")
+    parser.add_argument("--micro-batch-size", type=int, default=64, help="Number of pending phrases that starts an encoder batch right away.")
+    parser.add_argument("--no-metrics", action="store_true", help="Do not record per-stage latencies and counters for GET /metrics.")
+    args = parser.parse_args()
+
+    if args.prefork and not hasattr(os, "fork"):
+        parser.error("--prefork needs os.fork, which this platform does not have")
+    micro_batch_wait_ms = args.micro_batch_ms if args.micro_batch_ms >= 0 else None
+    metrics = None if args.no_metrics else MetricsRegistry()
+    service = PredictionService(lambda: MotionGameMapper(args.model_path, args.ner_model_path, embedding_store_path=args.embedding_store,
+                                                         micro_batch_wait_ms=micro_batch_wait_ms, micro_batch_size=args.micro_batch_size,
+                                                         encoder_backend=args.encoder_backend, game_catalog=args.game_catalog,
+                                                         metrics=metrics), metrics)
+    servers = create_servers(service, args.host, None if args.no_http else args.port, args.unix_socket, args.workers)
+    for server in servers:
+        print(f"Listening on {server.server_address}")
+    if args.prefork:
+        torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.prefork)
+        serve_prefork(servers, service, args.prefork, args.workers, torch_threads, args.memory_report_seconds)
+        return
+    # Listen before loading so health checks answer while the models load
+    threading.Thread(target=service.load, name="load-models", daemon=True).start()
+    serve(servers, service)
+
+
+if __name__ == "__main__":
+    main()
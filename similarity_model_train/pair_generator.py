@@ -0,0 +1,261 @@
+import argparse
+import json
+import random
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from available_gesture_and_pose import available_gestures, available_poses
+from game_catalog import DictGameCatalog, SqliteGameCatalog
+from label_index import normalize_rows
+from title_resolver import TitleResolver
+from train_data import TRAIN_DATA
+
+WORD = re.compile(r"[a-z]+")
+# Pairs of a domain share the candidates their hard negatives are mined from
+GESTURES, POSES, ACTIONS = "gestures", "poses", "actions"
+
+
+def words(text):
+    """
+    Returns the lowercased words of a phrase or label, without the digits and underscores of labels like fist2.
+    """
+    return WORD.findall(text.lower())
+
+
+def label_phrase(label):
+    """
+    Returns how a catalog label is written in a sentence, e.g. three_fingers_pinch -> three fingers pinch.
+    """
+    return " ".join(words(label))
+
+
+def best_label(phrase, labels):
+    """
+    Returns the label whose words overlap most with the words of phrase, if one label's words are all in
+    the phrase or the other way around, else None.
+    """
+    phrase_words = set(words(phrase))
+    best, best_overlap = None, 0
+    for label in labels:
+        label_words = set(words(label))
+        if not label_words or not (label_words <= phrase_words or phrase_words <= label_words):
+            continue
+        overlap = len(label_words & phrase_words)
+        if overlap > best_overlap:
+            best, best_overlap = label, overlap
+    return best
+
+
+class PairGenerator:
+    """
+    Builds positive and hard negative sentence pairs for ModelFineTuner from the catalogs, so the training
+    pairs follow the catalogs instead of being written by hand.
+
+    Positives pair a phrase with the catalog label the mapper should match it to: every gesture and pose label
+    with the way it is written in a sentence, the POSES and GESTURE spans of TRAIN_DATA with the label they
+    name, and the ACTION-O spans with the actions of the sentence's game (or of any game) whose words they contain.
+    Hard negatives are the labels of the same domain the current model finds closest to a positive's phrase,
+    i.e. the ones the mapper would confuse it with. Actions bound to the same key as the positive are never
+    negatives, picking them presses the right key anyway.
+    """
+
+    def __init__(self, model, game_catalog=None, gestures=available_gestures, poses=available_poses, train_data=TRAIN_DATA,
+                 negatives_per_positive=3, batch_size=256, block_size=1024):
+        """
+        :param model: The SentenceTransformer whose embeddings the hard negatives are mined with, usually the model to fine-tune.
+        :param game_catalog: A catalog of game_catalog.py, the dicts of game_controls.py by default.
+        :param negatives_per_positive: The number of hard negatives mined for each positive pair.
+        :param block_size: The number of phrases compared with all candidates at once, bounds the similarity matrix.
+        """
+        self.model = model
+        self.game_catalog = game_catalog if game_catalog is not None else DictGameCatalog()
+        self.gestures = gestures
+        self.poses = poses
+        self.train_data = train_data
+        self.negatives_per_positive = negatives_per_positive
+        self.batch_size = batch_size
+        self.block_size = block_size
+
+    def catalog_actions(self):
+        """
+        Returns every distinct action of the catalog and, per action, the words index used to find the actions
+        a phrase contains without comparing it with each of them.
+        """
+        actions = {}
+        for title in self.game_catalog.titles():
+            for action in self.game_catalog.get(title).actions:
+                actions.setdefault(action, None)
+        actions = list(actions)
+        by_word = {}
+        for action in actions:
+            for word in set(words(action)):
+                by_word.setdefault(word, []).append(action)
+        return actions, by_word
+
+    def positives(self):
+        """
+        Returns the positive pairs as (domain, game, phrase, label) tuples, game is None outside a game's actions.
+        """
+        positives = []
+        for label in self.gestures:
+            positives.append((GESTURES, None, label_phrase(label), label))
+        for label in self.poses:
+            positives.append((POSES, None, label_phrase(label), label))
+
+        actions, by_word = self.catalog_actions()
+        resolver = TitleResolver(self.game_catalog.titles())
+        for text, annotations in self.train_data:
+            spans = [(text[start:end], label) for start, end, label in annotations["entities"]]
+            games = [resolver.resolve(span) for span, label in spans if label == "GAME"]
+            entry = next((self.game_catalog.get(game) for game in games if game), None)
+            for span, label in spans:
+                if label in ("POSES", "GESTURE"):
+                    domain, labels = (POSES, self.poses) if label == "POSES" else (GESTURES, self.gestures)
+                    match = best_label(span, labels)
+                    if match is not None:
+                        positives.append((domain, None, span, match))
+                elif label == "ACTION-O":
+                    span_words = set(words(span))
+                    if entry is not None:
+                        candidates = entry.actions
+                    else:
+                        candidates = dict.fromkeys(action for word in span_words for action in by_word.get(word, ()))
+                    for action in candidates:
+                        if set(words(action)) <= span_words:
+                            positives.append((ACTIONS, entry.title if entry is not None else None, span, action))
+        return [positive for positive in positives if positive[2].lower() != positive[3].lower()]
+
+    def encode(self, texts):
+        return normalize_rows(np.asarray(self.model.encode(texts, batch_size=self.batch_size), dtype=np.float32).reshape(len(texts), -1))
+
+    def nearest(self, queries, candidates, k, excluded):
+        """
+        Returns for every query row the indices of its k most similar candidate rows, most similar first,
+        skipping the candidate indices in excluded[query]. Queries are compared a block at a time, so memory
+        stays block_size x len(candidates) however many queries there are.
+        """
+        neighbours = []
+        k = min(k, len(candidates))
+        for start in range(0, len(queries), self.block_size):
+            similarities = queries[start:start + self.block_size] @ candidates.T
+            for row, query in enumerate(range(start, start + len(similarities))):
+                similarities[row, list(excluded[query])] = -np.inf
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k] if k else np.zeros((len(similarities), 0), dtype=np.int64)
+            for row, indices in enumerate(top):
+                indices = indices[np.argsort(-similarities[row, indices])]
+                neighbours.append([int(index) for index in indices if np.isfinite(similarities[row, index])])
+        return neighbours
+
+    def generate(self):
+        """
+        Returns the deduplicated pairs as dicts with sentence1, sentence2 and similarity 1.0 for positives and
+        0.0 for negatives. A positive also has its hardest negative in negative, for the triplet losses.
+        """
+        positives = self.positives()
+        actions, _ = self.catalog_actions()
+        phrases = list(dict.fromkeys(phrase for _, _, phrase, _ in positives))
+        phrase_rows = {phrase: row for row, phrase in enumerate(phrases)}
+        phrase_embeddings = self.encode(phrases) if phrases else None
+
+        positive_labels = {}
+        for domain, game, phrase, label in positives:
+            positive_labels.setdefault((domain, game, phrase), set()).add(label)
+
+        # Pairs of the same domain and game are mined together against that domain's labels
+        groups = {}
+        for key in positive_labels:
+            groups.setdefault(key[:2], []).append(key[2])
+        group_labels = {}
+        for domain, game in groups:
+            if domain == GESTURES:
+                group_labels[(domain, game)] = self.gestures
+            elif domain == POSES:
+                group_labels[(domain, game)] = self.poses
+            else:
+                group_labels[(domain, game)] = self.game_catalog.get(game).actions if game is not None else actions
+        # Every label is encoded once, however many groups it is a candidate of
+        labels = list(dict.fromkeys(label for candidates in group_labels.values() for label in candidates))
+        label_embeddings = self.encode(labels) if labels else None
+        embedding_rows = {label: row for row, label in enumerate(labels)}
+
+        negatives = {}
+        for (domain, game), group_phrases in groups.items():
+            entry = self.game_catalog.get(game) if game is not None else None
+            candidates = group_labels[(domain, game)]
+            candidate_rows = {label: row for row, label in enumerate(candidates)}
+            excluded = []
+            for phrase in group_phrases:
+                skip = set(positive_labels[(domain, game, phrase)])
+                if entry is not None:
+                    keys = {entry.key_mappings.get(label) for label in skip} - {None}
+                    skip.update(action for action, key in entry.key_mappings.items() if key in keys)
+                skip.update(label for label in candidates if label.lower() == phrase.lower())
+                excluded.append({candidate_rows[label] for label in skip if label in candidate_rows})
+            queries = phrase_embeddings[[phrase_rows[phrase] for phrase in group_phrases]]
+            candidate_embeddings = label_embeddings[[embedding_rows[label] for label in candidates]]
+            neighbours = self.nearest(queries, candidate_embeddings, self.negatives_per_positive, excluded)
+            for phrase, indices in zip(group_phrases, neighbours):
+                negatives[(domain, game, phrase)] = [candidates[index] for index in indices]
+
+        pairs = {}
+
+        def add(phrase, other, similarity, negative=None):
+            key = tuple(sorted((phrase.lower(), other.lower())))
+            if key in pairs or key[0] == key[1]:
+                return
+            pairs[key] = {"sentence1": phrase, "sentence2": other, "similarity": similarity}
+            if negative is not None:
+                pairs[key]["negative"] = negative
+
+        # Positives first, so a label that is a negative for one phrase never overrides a positive pair
+        for domain, game, phrase, label in positives:
+            hardest = negatives[(domain, game, phrase)]
+            add(phrase, label, 1.0, hardest[0] if hardest else None)
+        for (domain, game, phrase), labels in negatives.items():
+            for label in labels:
+                add(phrase, label, 0.0)
+        return list(pairs.values())
+
+
+def write_shards(pairs, output_dir, shard_size=100000, seed=0):
+    """
+    Shuffles the pairs and writes them as JSONL shards of shard_size pairs to output_dir, with a manifest.
+    Returns the shard paths, to be passed to ModelFineTuner.fine_tune.
+    """
+    pairs = list(pairs)
+    random.Random(seed).shuffle(pairs)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for start in range(0, max(len(pairs), 1), shard_size):
+        path = output_dir / f"pairs-{len(paths):05d}.jsonl"
+        with open(path, "w", encoding="utf-8") as shard:
+            shard.writelines(json.dumps(pair) + "\n" for pair in pairs[start:start + shard_size])
+        paths.append(str(path))
+    manifest = {"shards": [Path(path).name for path in paths], "pairs": len(pairs),
+                "positives": sum(pair["similarity"] > 0 for pair in pairs), "negatives": sum(pair["similarity"] == 0 for pair in pairs)}
+    with open(output_dir / "manifest.json", "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate fine-tuning pairs with hard negatives from the game, gesture and pose catalogs.")
+    parser.add_argument("--model", default="./fine-tuned-model", help="Sentence model the hard negatives are mined with.")
+    parser.add_argument("--game-catalog", default=None, help="SQLite game catalog written by game_catalog.py, instead of game_controls.py.")
+    parser.add_argument("--output", default="pairs", help="Directory the JSONL shards are written to.")
+    parser.add_argument("--negatives", type=int, default=3, help="Hard negatives mined per positive pair.")
+    parser.add_argument("--shard-size", type=int, default=100000, help="Pairs per shard.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the order of the pairs.")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    generator = PairGenerator(SentenceTransformer(args.model), SqliteGameCatalog(args.game_catalog) if args.game_catalog else None,
+                              negatives_per_positive=args.negatives)
+    pairs = generator.generate()
+    paths = write_shards(pairs, args.output, args.shard_size, args.seed)
+    print(f"Wrote {len(pairs)} pairs to {len(paths)} shards in {args.output}, train on them with: python similarity_model_train/sim_nlp.py --data {' '.join(paths)}")
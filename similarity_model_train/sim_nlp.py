@@ -1,33 +1,247 @@
-from scipy.spatial.distance import cosine
+import csv
+import json
+import math
+import os
+import random
+import shutil
+import time
+from itertools import islice
+
+import torch
 from sentence_transformers import SentenceTransformer, InputExample, losses
-from torch.utils.data import DataLoader  # Corrected import
-import pandas as pd
+from sentence_transformers.util import batch_to_device
+
+# Losses that treat the other pairs of a batch as negatives, they only train on positive pairs
+IN_BATCH_LOSSES = {
+    "mnrl": losses.MultipleNegativesRankingLoss,
+    "cached-mnrl": losses.CachedMultipleNegativesRankingLoss,
+}
+PAIR_LOSSES = {
+    "cosine": losses.CosineSimilarityLoss,
+    "cosent": losses.CoSENTLoss,
+}
+TRAINER_STATE = "trainer_state.pt"
+
+
+def read_pairs(source):
+    """
+    Yields the pairs of a JSONL or CSV file (by extension) or a list of dicts, each with sentence1, sentence2,
+    an optional similarity and an optional hard negative sentence in negative.
+    """
+    if not isinstance(source, str):
+        yield from source
+    elif source.endswith(".csv"):
+        with open(source, newline="", encoding="utf-8") as csv_file:
+            for row in csv.DictReader(csv_file):
+                if row.get("similarity") not in (None, ""):
+                    row["similarity"] = float(row["similarity"])
+                yield row
+    else:
+        with open(source, encoding="utf-8") as jsonl_file:
+            for line in jsonl_file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def shuffled(items, buffer_size, rng):
+    """
+    Yields items in a random order using a buffer of buffer_size items, so the whole stream never has to be
+    in memory. Items further apart than the buffer keep their relative order.
+    """
+    buffer = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        index = rng.randrange(buffer_size)
+        yield buffer[index]
+        buffer[index] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+class PairStream:
+    """
+    Streams the training pairs of one or more sources as InputExamples, shuffled differently every epoch.
+    """
+
+    def __init__(self, sources, in_batch_negatives=False, hard_negatives=False, positive_threshold=0.5, shuffle_buffer=10000, seed=0):
+        """
+        :param sources: JSONL or CSV file paths, or lists of dicts, see read_pairs.
+        :param in_batch_negatives: Keep only the positive pairs, those with a similarity of at least positive_threshold or none.
+        :param hard_negatives: Add the negative sentence as a third text and skip the pairs without one.
+        :param shuffle_buffer: The number of pairs the shuffle draws from, 1 keeps the file order.
+        :param seed: Together with the epoch, decides the order of the pairs.
+        """
+        self.sources = sources
+        self.in_batch_negatives = in_batch_negatives
+        self.hard_negatives = hard_negatives
+        self.positive_threshold = positive_threshold
+        self.shuffle_buffer = max(1, shuffle_buffer)
+        self.seed = seed
+
+    def rows(self):
+        for source in self.sources:
+            for line, row in enumerate(read_pairs(source), 1):
+                similarity = row.get("similarity")
+                if similarity is None and not self.in_batch_negatives:
+                    where = f"line {line} of {source}" if isinstance(source, str) else f"pair {line}"
+                    raise ValueError(f"{where} has no similarity, which a pair loss trains on; add one or use an in-batch loss like mnrl")
+                if self.in_batch_negatives and similarity is not None and similarity < self.positive_threshold:
+                    continue
+                if self.hard_negatives and not row.get("negative"):
+                    continue
+                yield row
+
+    def examples(self, epoch=0):
+        rng = random.Random(self.seed * 1000003 + epoch)
+        for row in shuffled(self.rows(), self.shuffle_buffer, rng):
+            texts = [row["sentence1"], row["sentence2"]]
+            if self.hard_negatives:
+                texts.append(row["negative"])
+            label = 0.0 if self.in_batch_negatives else float(row["similarity"])
+            yield InputExample(texts=texts, label=label)
+
+    def __len__(self):
+        return sum(1 for _ in self.rows())
+
 
 class ModelFineTuner:
-    def __init__(self, base_model='all-MiniLM-L6-v2', output_path='./fine-tuned-model'):
+    def __init__(self, base_model='all-MiniLM-L6-v2', output_path='./fine-tuned-model', loss="cosine", batch_size=64, shuffle_buffer=10000,
+                 learning_rate=2e-5, checkpoint_steps=1000, checkpoint_limit=2, mini_batch_size=32, seed=0):
+        """
+        :param loss: cosine or cosent train on scored pairs, mnrl and cached-mnrl use the other pairs of the batch
+            as negatives and get better with larger batches. cached-mnrl keeps the memory of a mini_batch_size batch.
+        :param checkpoint_steps: Save a checkpoint to output_path-checkpoints every this many steps, 0 never does.
+        :param checkpoint_limit: The number of checkpoints kept.
+        """
+        if loss not in IN_BATCH_LOSSES and loss not in PAIR_LOSSES:
+            raise ValueError(f"Unknown loss {loss}, expected one of {', '.join(list(PAIR_LOSSES) + list(IN_BATCH_LOSSES))}")
         self.model = SentenceTransformer(base_model)
         self.output_path = output_path
+        # Next to the model, not in it, so the checkpoints are not deployed with it
+        self.checkpoint_path = os.path.normpath(output_path) + "-checkpoints"
+        self.loss = loss
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.learning_rate = learning_rate
+        self.checkpoint_steps = checkpoint_steps
+        self.checkpoint_limit = checkpoint_limit
+        self.mini_batch_size = mini_batch_size
+        self.seed = seed
 
-    def prepare_data(self, data):
+    def prepare_data(self, data, hard_negatives=False):
         """
-        Convert a list of dictionaries to a DataLoader with InputExample objects.
+        Returns the PairStream of data, a list of dictionaries or the paths of JSONL or CSV files of pairs.
         """
-        df = pd.DataFrame(data)
-        examples = [InputExample(texts=[row['sentence1'], row['sentence2']], label=row['similarity']) for index, row in df.iterrows()]
-        dataloader = DataLoader(examples, shuffle=True, batch_size=2)
-        return dataloader
+        if hard_negatives and self.loss not in IN_BATCH_LOSSES:
+            raise ValueError(f"The {self.loss} loss scores pairs and would not use hard negatives, use one of {', '.join(IN_BATCH_LOSSES)}")
+        sources = [data] if isinstance(data, str) or (data and isinstance(data[0], dict)) else data
+        return PairStream(sources, in_batch_negatives=self.loss in IN_BATCH_LOSSES, hard_negatives=hard_negatives,
+                          shuffle_buffer=self.shuffle_buffer, seed=self.seed)
 
-    def fine_tune(self, data, epochs=4, warmup_steps=100):
+    def _loss_model(self):
+        if self.loss == "cached-mnrl":
+            return losses.CachedMultipleNegativesRankingLoss(self.model, mini_batch_size=self.mini_batch_size)
+        return (IN_BATCH_LOSSES.get(self.loss) or PAIR_LOSSES[self.loss])(model=self.model)
+
+    def latest_checkpoint(self):
+        """
+        Returns the path of the checkpoint with the most steps, or None.
+        """
+        if not os.path.isdir(self.checkpoint_path):
+            return None
+        steps = [int(name) for name in os.listdir(self.checkpoint_path)
+                 if name.isdigit() and os.path.exists(os.path.join(self.checkpoint_path, name, TRAINER_STATE))]
+        return os.path.join(self.checkpoint_path, str(max(steps))) if steps else None
+
+    def _save_checkpoint(self, step, optimizer, scheduler):
+        path = os.path.join(self.checkpoint_path, str(step))
+        self.model.save(path)
+        # Written last, a checkpoint without it was interrupted and is never resumed from
+        torch.save({"step": step, "optimizer": optimizer.state_dict(), "scheduler": scheduler.state_dict()}, os.path.join(path, TRAINER_STATE))
+        steps = sorted(int(name) for name in os.listdir(self.checkpoint_path) if name.isdigit())
+        # Checkpoints after this step are left from before the run was resumed from an earlier one, they are not its history
+        kept = set([old_step for old_step in steps if old_step <= step][-self.checkpoint_limit:])
+        for old_step in steps:
+            if old_step not in kept:
+                shutil.rmtree(os.path.join(self.checkpoint_path, str(old_step)))
+
+    def fine_tune(self, data, epochs=4, warmup_steps=100, resume=False, hard_negatives=False, log_steps=100, max_grad_norm=1.0):
         """
         Fine-tune the model on the provided dataset.
+        The pairs are streamed and tokenized one batch at a time. With resume, training continues from the latest
+        checkpoint with its weights, optimizer and learning rate schedule, skipping the pairs it already trained on.
+        Without resume, the checkpoints of a previous run are removed first.
+        Returns the number of steps and pairs trained on and the pairs per second.
         """
-        train_dataloader = self.prepare_data(data)
-        train_loss = losses.CosineSimilarityLoss(model=self.model)
+        stream = self.prepare_data(data, hard_negatives)
+        steps_per_epoch = math.ceil(len(stream) / self.batch_size)
+        total_steps = steps_per_epoch * epochs
+        if not total_steps:
+            raise ValueError("No training pairs")
+
+        checkpoint = self.latest_checkpoint() if resume else None
+        if not resume and os.path.isdir(self.checkpoint_path):
+            # They would be pruned by step together with this run's checkpoints and resumed from later
+            print(f"Removing the checkpoints of a previous run in {self.checkpoint_path}")
+            shutil.rmtree(self.checkpoint_path)
+        if checkpoint:
+            self.model = SentenceTransformer(checkpoint)
+        loss_model = self._loss_model()
+        device = self.model.device
+        loss_model.to(device)
+        # The same parameter groups and schedule as SentenceTransformer.fit
+        no_decay = ["bias", "LayerNorm.bias", "LayerNorm.weight"]
+        parameters = list(loss_model.named_parameters())
+        optimizer = torch.optim.AdamW([
+            {"params": [p for n, p in parameters if not any(nd in n for nd in no_decay)], "weight_decay": 0.01},
+            {"params": [p for n, p in parameters if any(nd in n for nd in no_decay)], "weight_decay": 0.0},
+        ], lr=self.learning_rate)
+        scheduler = SentenceTransformer._get_scheduler(optimizer, "WarmupLinear", warmup_steps, total_steps)
+        step = 0
+        if checkpoint:
+            state = torch.load(os.path.join(checkpoint, TRAINER_STATE))
+            optimizer.load_state_dict(state["optimizer"])
+            scheduler.load_state_dict(state["scheduler"])
+            step = state["step"]
+            print(f"Resuming from {checkpoint} at step {step} of {total_steps}")
 
-        self.model.fit(train_objectives=[(train_dataloader, train_loss)],
-                       epochs=epochs,
-                       warmup_steps=warmup_steps,
-                       output_path=self.output_path)
+        loss_model.train()
+        pairs = 0
+        start = time.perf_counter()
+        window_start, window_pairs, window_loss = start, 0, 0.0
+        for epoch in range(step // steps_per_epoch, epochs):
+            examples = stream.examples(epoch)
+            # The order of an epoch only depends on the seed, so skipping the pairs already trained on resumes exactly
+            done_in_epoch = step - epoch * steps_per_epoch
+            examples = islice(examples, done_in_epoch * self.batch_size, None)
+            for batch in iter(lambda: list(islice(examples, self.batch_size)), []):
+                features, labels = self.model.smart_batching_collate(batch)
+                features = [batch_to_device(feature, device) for feature in features]
+                loss_value = loss_model(features, labels.to(device))
+                loss_value.backward()
+                torch.nn.utils.clip_grad_norm_(loss_model.parameters(), max_grad_norm)
+                optimizer.step()
+                optimizer.zero_grad()
+                scheduler.step()
+                step += 1
+                pairs += len(batch)
+                window_pairs += len(batch)
+                window_loss += loss_value.item()
+
+                if step % log_steps == 0:
+                    now = time.perf_counter()
+                    print(f"Epoch {epoch + 1} step {step}/{total_steps}: loss {window_loss / log_steps:.4f}, {window_pairs / (now - window_start):,.0f} pairs/s")
+                    window_start, window_pairs, window_loss = now, 0, 0.0
+                if self.checkpoint_steps and step % self.checkpoint_steps == 0:
+                    self._save_checkpoint(step, optimizer, scheduler)
+
+        seconds = time.perf_counter() - start
+        self.model.save(self.output_path)
+        pairs_per_s = pairs / seconds if seconds else 0.0
+        print(f"Trained {pairs} pairs in {seconds:.1f} s ({pairs_per_s:,.0f} pairs/s), saved to {self.output_path}")
+        return {"steps": step, "pairs": pairs, "seconds": seconds, "pairs_per_s": pairs_per_s}
 
     def load_fine_tuned_model(self):
         """
@@ -38,17 +252,35 @@ class ModelFineTuner:
 # Example usage:
 
 if __name__ == "__main__":
-    fine_tuner = ModelFineTuner()
+    import argparse
+    parser = argparse.ArgumentParser(description="Fine-tune the sentence model on sentence pairs.")
+    parser.add_argument("--data", nargs="*", default=None,
+                        help="JSONL or CSV files of sentence1, sentence2, similarity (and negative) pairs, a small example dataset by default.")
+    parser.add_argument("--base-model", default="all-MiniLM-L6-v2", help="Model to start from.")
+    parser.add_argument("--output", default="./fine-tuned-model", help="Directory of the fine-tuned model, the checkpoints go to <output>-checkpoints.")
+    parser.add_argument("--loss", choices=list(PAIR_LOSSES) + list(IN_BATCH_LOSSES), default="cosine", help="Training loss.")
+    parser.add_argument("--hard-negatives", action="store_true", help="Train on (sentence1, sentence2, negative) triplets with an in-batch loss.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Pairs per step.")
+    parser.add_argument("--mini-batch-size", type=int, default=32, help="Pairs encoded at once by cached-mnrl.")
+    parser.add_argument("--shuffle-buffer", type=int, default=10000, help="Number of pairs the shuffle draws from.")
+    parser.add_argument("--epochs", type=int, default=4, help="Passes over the pairs.")
+    parser.add_argument("--warmup-steps", type=int, default=100, help="Steps of learning rate warmup.")
+    parser.add_argument("--checkpoint-steps", type=int, default=1000, help="Steps between checkpoints, 0 saves none.")
+    parser.add_argument("--resume", action="store_true", help="Continue from the latest checkpoint in the output directory.")
+    args = parser.parse_args()
+
+    fine_tuner = ModelFineTuner(args.base_model, args.output, args.loss, args.batch_size, args.shuffle_buffer,
+                                checkpoint_steps=args.checkpoint_steps, mini_batch_size=args.mini_batch_size)
 
     # Simulated dataset
-    data = [
+    data = args.data or [
         {"sentence1": "move the ball", "sentence2": "pass", "similarity": 0.9},
         {"sentence1": "move the ball", "sentence2": "walk", "similarity": 0.1},
         {"sentence1": "move the ball", "sentence2": "punt", "similarity": 0.8},
         {"sentence1": "move the ball", "sentence2": "run", "similarity": 0.2},
     ]
 
-    fine_tuner.fine_tune(data=data)
+    fine_tuner.fine_tune(data=data, epochs=args.epochs, warmup_steps=args.warmup_steps, resume=args.resume, hard_negatives=args.hard_negatives)
     fine_tuner.load_fine_tuned_model()
 
     # Now, you can use fine_tuner.model as before to generate embeddings and calculate similarities
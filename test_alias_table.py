@@ -0,0 +1,39 @@
+import unittest
+import json
+import os
+import tempfile
+from alias_table import AliasTable, normalize_alias
+
+
+class TestAliasTable(unittest.TestCase):
+    def setUp(self):
+        self.table = AliasTable({"thumbs up": "thumb_up", "hop": "jump"}, gestures=["index_pinch", "kick"],
+                                poses=["thumb_up", "index_pinch"], actions={"Minecraft": ["jump", "place"], "Tetris": ["rotate"]})
+
+    def test_normalize_alias(self):
+        self.assertEqual(normalize_alias("Index-Pinch"), "index pinch")
+        self.assertEqual(normalize_alias("  my  index_pinch!"), "index pinch")
+
+    def test_near_exact_phrases_and_aliases_resolve(self):
+        self.assertEqual(self.table.lookup("Index pinch", ["thumb_up", "index_pinch"]), "index_pinch")
+        self.assertEqual(self.table.lookup("the thumbs up", ["thumb_up", "index_pinch"]), "thumb_up")
+        self.assertEqual(self.table.lookup("hop", ["jump", "place"]), "jump")
+
+    def test_only_candidates_are_returned(self):
+        self.assertIsNone(self.table.lookup("hop", ["rotate"]))
+        self.assertIsNone(self.table.lookup("clench", ["thumb_up", "index_pinch"]))
+        # Lists that are not catalogs get their own table
+        self.assertEqual(self.table.lookup("run", ["run", "walk"]), "run")
+        self.assertEqual(self.table.stats(), {"hits": 1, "misses": 2, "hit_rate": 1 / 3})
+
+    def test_from_file(self):
+        with tempfile.TemporaryDirectory() as root:
+            alias_path = os.path.join(root, "aliases.json")
+            with open(alias_path, "w", encoding="utf-8") as alias_file:
+                json.dump({"duck": "crouch"}, alias_file)
+            self.assertEqual(AliasTable.from_file(alias_path).lookup("duck", ["crouch", "jump"]), "crouch")
+            self.assertIsNone(AliasTable.from_file(os.path.join(root, "missing.json")).lookup("duck", ["crouch", "jump"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
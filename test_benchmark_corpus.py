@@ -0,0 +1,41 @@
+import unittest
+
+from benchmarks.corpus import clause_templates, generate_corpus
+from game_controls import games_actions
+from available_gesture_and_pose import available_gestures, available_poses
+
+
+class TestBenchmarkCorpus(unittest.TestCase):
+    def test_corpus_is_reproducible(self):
+        self.assertEqual(generate_corpus(20, seed=3), generate_corpus(20, seed=3))
+        self.assertNotEqual(generate_corpus(20, seed=3), generate_corpus(20, seed=4))
+
+    def test_entities_point_at_catalog_entries(self):
+        for command in generate_corpus(50, seed=1):
+            text, game = command["text"], command["game"]
+            labels = [label for _, _, label in command["entities"]]
+            self.assertEqual(labels.count("GAME"), 1)
+            for start, end, label in command["entities"]:
+                if label == "GAME":
+                    self.assertEqual(text[start:end], game)
+                elif label == "ACTION-O":
+                    self.assertIn(text[start:end], games_actions[game])
+
+    def test_bindings_name_catalog_entries(self):
+        commands = generate_corpus(50, seed=2)
+        self.assertTrue(any(command["bindings"] for command in commands))
+        for command in commands:
+            for binding in command["bindings"]:
+                self.assertIn(binding["files"], available_poses if binding["type"] == "poses" else available_gestures)
+                self.assertIn(binding["motion_text"], command["text"])
+                self.assertIn(binding["action"], games_actions[command["game"]])
+
+    def test_templates_are_split_by_clause_kind(self):
+        game_clauses, binding_clauses = clause_templates()
+        self.assertTrue(game_clauses and binding_clauses)
+        for _, entities in binding_clauses:
+            self.assertIn("ACTION-O", [label for _, _, label in entities])
+
+
+if __name__ == '__main__':
+    unittest.main()
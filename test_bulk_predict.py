@@ -0,0 +1,45 @@
+import unittest
+import io
+import json
+from unittest.mock import MagicMock, patch
+import bulk_predict
+
+
+class TestBulkPredict(unittest.TestCase):
+    def setUp(self):
+        self.mapper = MagicMock()
+        self.mapper.predict_batch.side_effect = lambda texts: [{"mode": text} for text in texts]
+
+    def run_bulk(self, text, input_format, chunk_size=2):
+        output = io.StringIO()
+        with patch('bulk_predict.MotionGameMapper', return_value=self.mapper) as mapper_class:
+            count = bulk_predict.run(io.StringIO(text), output, input_format, workers=0, chunk_size=chunk_size, progress=None)
+        self.assertEqual(mapper_class.call_count, 1)
+        return count, [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_text_lines_keep_input_order(self):
+        count, outputs = self.run_bulk("Tetris\n\nMinecraft\nFIFA\n", "text")
+        self.assertEqual(count, 3)
+        self.assertEqual([output["prediction"]["mode"] for output in outputs], ["Tetris", "Minecraft", "FIFA"])
+        self.assertEqual(self.mapper.predict_batch.call_count, 2)
+
+    def test_jsonl_keeps_fields_and_reports_bad_lines(self):
+        text = '{"id": 7, "text": "Tetris"}\n{not json\n"FIFA"\n{"id": 8}\n'
+        count, outputs = self.run_bulk(text, "jsonl", chunk_size=64)
+        self.assertEqual(outputs[0], {"id": 7, "text": "Tetris", "prediction": {"mode": "Tetris"}})
+        self.assertIn("error", outputs[1])
+        self.assertEqual(outputs[2]["prediction"], {"mode": "FIFA"})
+        self.assertEqual(outputs[3]["line"], 4)
+        self.mapper.predict_batch.assert_called_once_with(["Tetris", "FIFA"])
+
+
+    def test_workers_are_pinned_before_the_models_load(self):
+        calls = []
+        with patch('bulk_predict.pin_threads', side_effect=lambda threads: calls.append(("pin", threads))), \
+                patch('bulk_predict.MotionGameMapper', side_effect=lambda **kwargs: calls.append(("load", kwargs)) or self.mapper):
+            bulk_predict._init_worker({}, threads=3)
+        self.assertEqual(calls, [("pin", 3), ("load", {})])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from utils.synonym_data_generator import DataAugmenter, read_jsonl, vocabulary
+
+TRAIN = [
+    ("I want to play Minecraft with my left hand", {"entities": [(15, 24, "GAME"), (33, 37, "ORI"), (38, 42, "LANDMARK")]}),
+    ("Jump when I pose thumb down", {"entities": [(0, 4, "ACTION-O"), (17, 27, "POSES")]}),
+]
+SYNONYMS = {"want": ["desire", "wish for"], "play": ["run"], "with": ["using"], "my": [], "when": ["whenever"],
+            "pose": ["model"], "i": [], "to": [], "left": ["remaining"], "jump": ["leap"]}
+
+
+class TestDataAugmenter(unittest.TestCase):
+    def entity_texts(self, examples):
+        return [[(text[start:end], label) for start, end, label in annotations["entities"]] for text, annotations in examples]
+
+    def test_entities_keep_their_text(self):
+        augmenter = DataAugmenter(TRAIN, synonyms=SYNONYMS, replace_prob=1.0)
+        text, spans = augmenter.synonym_replacement(TRAIN[0][0], TRAIN[0][1]["entities"])
+        self.assertNotIn("want", text)
+        self.assertEqual(self.entity_texts([(text, {"entities": spans})]), self.entity_texts([TRAIN[0]]))
+        # Words inside entities are never replaced, "left" and "Jump" are entities here
+        self.assertIn("left hand", text)
+
+    def test_vocabulary_skips_entity_words(self):
+        self.assertEqual(vocabulary(TRAIN), {"i", "want", "to", "play", "with", "my", "when", "pose"})
+
+    def test_variants_are_distinct_and_reproducible(self):
+        augmenter = DataAugmenter(TRAIN, synonyms=SYNONYMS, variants_per_sentence=3, seed=1)
+        variants = augmenter.variants(0, TRAIN[0][0], TRAIN[0][1]["entities"])
+        texts = [text for text, _ in variants]
+        self.assertEqual(len(set(texts)), len(texts))
+        self.assertNotIn(TRAIN[0][0], texts)
+        self.assertEqual(DataAugmenter(TRAIN, synonyms=SYNONYMS, variants_per_sentence=3, seed=1).variants(0, TRAIN[0][0], TRAIN[0][1]["entities"]), variants)
+
+    def test_worker_pool_gives_the_same_output(self):
+        augmenter = DataAugmenter(TRAIN * 10, synonyms=SYNONYMS, variants_per_sentence=2)
+        self.assertEqual(list(augmenter.iter_augmented(workers=2, chunk_size=3)), list(augmenter.iter_augmented()))
+
+    def test_examples_are_streamed_to_jsonl(self):
+        augmenter = DataAugmenter(TRAIN, synonyms=SYNONYMS, variants_per_sentence=2)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "augmented.jsonl")
+            count = augmenter.write_jsonl(path)
+            examples = list(read_jsonl(path))
+        self.assertEqual(len(examples), count)
+        self.assertEqual(examples[:2], TRAIN)
+        self.assertEqual(self.entity_texts(examples[2:3]), self.entity_texts(TRAIN[:1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import threading
+import numpy as np
+from embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def test_get_counts_hits_and_misses(self):
+        cache = EmbeddingCache(max_entries=10)
+        self.assertIsNone(cache.get("model", "jump"))
+        cache.put("model", "jump", np.ones(4, dtype=np.float32))
+        self.assertIsNotNone(cache.get("model", "  Jump "))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_keys_include_model_identity(self):
+        cache = EmbeddingCache(max_entries=10)
+        cache.put("model-a", "jump", np.ones(4, dtype=np.float32))
+        self.assertIsNone(cache.get("model-b", "jump"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = EmbeddingCache(max_entries=2)
+        cache.put("model", "jump", np.ones(4, dtype=np.float32))
+        cache.put("model", "run", np.ones(4, dtype=np.float32))
+        cache.get("model", "jump")
+        cache.put("model", "walk", np.ones(4, dtype=np.float32))
+        self.assertIsNone(cache.get("model", "run"))
+        self.assertIsNotNone(cache.get("model", "jump"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_byte_cap(self):
+        cache = EmbeddingCache(max_entries=None, max_bytes=40)
+        for phrase in ["jump", "run", "walk"]:
+            cache.put("model", phrase, np.ones(4, dtype=np.float32))
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.stats()["bytes"], 40)
+
+    def test_cached_embeddings_are_read_only(self):
+        cache = EmbeddingCache()
+        cache.put("model", "jump", np.ones(4, dtype=np.float32))
+        with self.assertRaises(ValueError):
+            cache.get("model", "jump")[0] = 0
+
+    def test_concurrent_access(self):
+        cache = EmbeddingCache(max_entries=50)
+
+        def worker(offset):
+            for i in range(500):
+                phrase = f"phrase {(i + offset) % 80}"
+                if cache.get("model", phrase) is None:
+                    cache.put("model", phrase, np.ones(4, dtype=np.float32))
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = cache.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 8 * 500)
+        self.assertLessEqual(stats["entries"], 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
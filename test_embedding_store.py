@@ -0,0 +1,123 @@
+import unittest
+import json
+import os
+import tempfile
+from unittest.mock import patch
+import numpy as np
+from embedding_store import EmbeddingStore, model_fingerprint
+
+
+class TestEmbeddingStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def segment_count(self, store):
+        manifest_path = os.path.join(store.directory, EmbeddingStore.MANIFEST)
+        if not os.path.exists(manifest_path):
+            return 0
+        with open(manifest_path) as manifest:
+            return len(json.load(manifest)["segments"])
+
+    def test_appended_embeddings_survive_reopening(self):
+        store = EmbeddingStore(self.root, "a" * 64)
+        store.append({"jump": np.ones(4), "Index Pinch": np.zeros(4)})
+        store.flush()
+        reopened = EmbeddingStore(self.root, "a" * 64)
+        self.assertEqual(len(reopened), 2)
+        np.testing.assert_array_equal(reopened.get("index pinch"), np.zeros(4, dtype=np.float32))
+        self.assertIsInstance(reopened.get("jump"), np.memmap)
+
+    def test_other_process_segments_are_picked_up(self):
+        reader = EmbeddingStore(self.root, "a" * 64)
+        writer = EmbeddingStore(self.root, "a" * 64)
+        writer.append({"jump": np.ones(4)})
+        self.assertNotIn("jump", reader.get_many(["jump"]))
+        writer.flush()
+        self.assertIn("jump", reader.get_many(["jump", "run"]))
+
+    def test_appends_are_buffered_until_full_or_old(self):
+        store = EmbeddingStore(self.root, "a" * 64, flush_size=2, flush_seconds=60)
+        store.append({"jump": np.ones(4)})
+        # Buffered embeddings are served before they are written
+        np.testing.assert_array_equal(store.get("jump"), np.ones(4, dtype=np.float32))
+        self.assertEqual(self.segment_count(store), 0)
+        store.append({"jump": np.ones(4), "run": np.zeros(4)})
+        self.assertEqual(self.segment_count(store), 1)
+
+        store.flush_seconds = 0
+        store.append({"crouch": np.ones(4)})
+        self.assertEqual(self.segment_count(store), 2)
+        self.assertEqual(len(EmbeddingStore(self.root, "a" * 64)), 3)
+
+    def test_unchanged_store_is_not_listed_again(self):
+        writer = EmbeddingStore(self.root, "a" * 64)
+        writer.append({"jump": np.ones(4)})
+        writer.flush()
+        reader = EmbeddingStore(self.root, "a" * 64)
+        with patch("embedding_store.os.listdir") as listdir, patch("embedding_store.json.load", wraps=json.load) as load:
+            self.assertEqual(reader.get_many(["run", "walk"]), {})
+            listdir.assert_not_called()
+            load.assert_not_called()
+
+    def test_stores_are_separated_by_fingerprint(self):
+        EmbeddingStore(self.root, "a" * 64).append({"jump": np.ones(4)})
+        self.assertIsNone(EmbeddingStore(self.root, "b" * 64).get("jump"))
+
+    def test_leftover_temporary_files_are_ignored(self):
+        store = EmbeddingStore(self.root, "a" * 64)
+        with open(os.path.join(store.directory, "crashed.npy.1234.tmp"), "wb") as partial:
+            partial.write(b"\x93NUMPY")
+        store.append({"jump": np.ones(4)})
+        store.flush()
+        self.assertEqual(len(EmbeddingStore(self.root, "a" * 64)), 1)
+
+    def test_compact_merges_segments(self):
+        store = EmbeddingStore(self.root, "a" * 64, flush_size=1, retire_seconds=0)
+        store.append({"jump": np.ones(4)})
+        store.append({"run": np.full(4, 2.0)})
+        store.compact()
+        self.assertEqual(len([name for name in os.listdir(store.directory) if name.endswith(".npy")]), 1)
+        reopened = EmbeddingStore(self.root, "a" * 64)
+        np.testing.assert_array_equal(reopened.get("run"), np.full(4, 2.0, dtype=np.float32))
+
+    def test_segments_are_merged_automatically(self):
+        writer = EmbeddingStore(self.root, "a" * 64, flush_size=1, max_segments=3, retire_seconds=0)
+        reader = EmbeddingStore(self.root, "a" * 64)
+        for i, phrase in enumerate(["jump", "run", "walk"]):
+            writer.append({phrase: np.full(4, float(i))})
+        self.assertEqual(set(reader.get_many(["jump", "run", "walk"])), {"jump", "run", "walk"})
+        writer.append({"crouch": np.full(4, 3.0)})
+        self.assertEqual(self.segment_count(writer), 1)
+        # The reader maps the merged segment instead of the deleted ones
+        self.assertIn("crouch", reader.get_many(["crouch"]))
+        self.assertEqual(len(reader._segments), 1)
+        np.testing.assert_array_equal(reader.get("run"), np.full(4, 1.0, dtype=np.float32))
+
+    def test_merged_segments_are_kept_for_readers_until_retired(self):
+        writer = EmbeddingStore(self.root, "a" * 64, flush_size=1, max_segments=1)
+        writer.append({"jump": np.ones(4)})
+        writer.append({"run": np.zeros(4)})
+        self.assertEqual(self.segment_count(writer), 1)
+        self.assertEqual(len([name for name in os.listdir(writer.directory) if name.endswith(".npy")]), 3)
+        # A reader whose manifest lists a segment deleted meanwhile skips it and reads the newer manifest next time
+        reader = EmbeddingStore(self.root, "a" * 64)
+        self.assertFalse(reader._open_segment("deleted"))
+        self.assertEqual(len(reader), 2)
+
+    def test_model_fingerprint_changes_with_model_files(self):
+        model_dir = os.path.join(self.root, "model")
+        os.makedirs(model_dir)
+        with open(os.path.join(model_dir, "config.json"), "w") as config:
+            config.write("{}")
+        before = model_fingerprint(model_dir)
+        with open(os.path.join(model_dir, "config.json"), "w") as config:
+            config.write('{"retrained": true}')
+        self.assertNotEqual(before, model_fingerprint(model_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
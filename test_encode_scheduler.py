@@ -0,0 +1,63 @@
+import unittest
+import threading
+import numpy as np
+from encode_scheduler import MicroBatchEncoder
+
+
+class TestMicroBatchEncoder(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+
+    def encode(self, phrases):
+        self.batches.append(list(phrases))
+        return np.array([[len(phrase), ord(phrase[0])] for phrase in phrases], dtype=np.float32)
+
+    def test_concurrent_calls_share_a_batch(self):
+        scheduler = MicroBatchEncoder(self.encode, max_wait_ms=200, max_batch_size=64)
+        phrases = [["jump"], ["crouch", "jump"], ["thumb up"], ["fist"]]
+        results = [None] * len(phrases)
+        barrier = threading.Barrier(len(phrases))
+
+        def call(i):
+            barrier.wait()
+            results[i] = scheduler.encode(phrases[i])
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(len(phrases))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        scheduler.close()
+        self.assertEqual(self.batches, [["fist", "jump", "crouch", "thumb up"]])
+
+        for request, rows in zip(phrases, results):
+            np.testing.assert_array_equal(rows, self.encode(request))
+        stats = scheduler.stats()
+        self.assertEqual((stats["batches"], stats["requests"], stats["max_batch_size"]), (1, 4, 4))
+        self.assertGreaterEqual(stats["max_queue_delay_ms"], 0.0)
+
+    def test_full_batch_does_not_wait(self):
+        scheduler = MicroBatchEncoder(self.encode, max_wait_ms=10000, max_batch_size=2)
+        np.testing.assert_array_equal(scheduler.encode(["jump", "crouch"]), self.encode(["jump", "crouch"]))
+        scheduler.close()
+        self.assertLess(scheduler.stats()["max_queue_delay_ms"], 5000)
+
+    def test_errors_reach_every_caller(self):
+        def fail(phrases):
+            raise RuntimeError("encoder failed")
+
+        scheduler = MicroBatchEncoder(fail, max_wait_ms=0)
+        with self.assertRaises(RuntimeError):
+            scheduler.encode(["jump"])
+        scheduler.close()
+
+    def test_encode_after_close_raises(self):
+        scheduler = MicroBatchEncoder(self.encode, max_wait_ms=0)
+        scheduler.close()
+        scheduler.close()
+        with self.assertRaises(RuntimeError):
+            scheduler.encode(["jump"])
+
+
+if __name__ == '__main__':
+    unittest.main()
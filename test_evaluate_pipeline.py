@@ -0,0 +1,104 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import evaluate_pipeline
+
+GOLD = [
+    {"text": "play Minecraft, jump with a fist", "game": "Minecraft",
+     "entities": [[5, 14, "GAME"], [16, 20, "ACTION-O"], [28, 32, "POSES"]],
+     "bindings": [{"type": "poses", "files": "fist", "action_text": "jump", "action": "jump"}]},
+    # A paraphrased action, the alias table does not resolve it
+    {"text": "play Tetris, fall with a punch", "game": "Tetris",
+     "entities": [[5, 11, "GAME"], [13, 17, "ACTION-O"], [25, 30, "GESTURE"]],
+     "bindings": [{"type": "gestures", "motion_text": "punch", "files": "punch", "action_text": "fall", "action": "drop"}]},
+]
+
+
+def output(mode, action_type=None, files=None, tmpt=None, action_class=None):
+    result = {"mode": mode, "orientation": "", "landmark": "", "poses": [], "gestures": []}
+    if action_type:
+        result[action_type].append({"files": files, "action": {"tmpt": tmpt, "class": action_class, "method": "hold", "args": ["space"]}})
+    return result
+
+
+def doc(entities):
+    return SimpleNamespace(ents=[SimpleNamespace(start_char=start, end_char=end, label_=label) for start, end, label in entities])
+
+
+def fake_mapper():
+    mapper = MagicMock()
+    outputs = {
+        GOLD[0]["text"]: output("Minecraft", "poses", "fist", "jump", "jump"),
+        # The gesture is found but mapped to the wrong action
+        GOLD[1]["text"]: output("Tetris", "gestures", "punch", "fall", "rotate"),
+    }
+    docs = {
+        GOLD[0]["text"]: doc(GOLD[0]["entities"]),
+        # The gesture is missed and the action span is too long
+        GOLD[1]["text"]: doc([[5, 11, "GAME"], [13, 22, "ACTION-O"]]),
+    }
+    mapper.predict_batch.side_effect = lambda texts, batch_size: [outputs[text] for text in texts]
+    mapper.nlp.pipe.side_effect = lambda texts, batch_size: [docs[text] for text in texts]
+    return mapper
+
+
+class TestEvaluatePipeline(unittest.TestCase):
+    def test_scores_entities_mappings_and_latency(self):
+        results = evaluate_pipeline.evaluate(fake_mapper(), GOLD, batch_size=1)
+        entities = results["entities"]
+        self.assertEqual(entities["GAME"]["f"], 1.0)
+        self.assertEqual((entities["ACTION-O"]["precision"], entities["ACTION-O"]["recall"]), (0.5, 0.5))
+        self.assertEqual((entities["GESTURE"]["recall"], entities["GESTURE"]["support"]), (0.0, 1))
+        self.assertAlmostEqual(entities["micro"]["recall"], 4 / 6)
+        mappings = results["mappings"]
+        self.assertEqual(mappings["game"]["accuracy"], 1.0)
+        self.assertEqual(mappings["poses"]["accuracy"], 1.0)
+        self.assertEqual(mappings["gestures"]["accuracy"], 1.0)
+        self.assertEqual(mappings["actions"]["accuracy"], 0.5)
+        self.assertEqual((mappings["actions_literal"]["accuracy"], mappings["actions_literal"]["total"]), (1.0, 1))
+        self.assertEqual((mappings["actions_paraphrased"]["accuracy"], mappings["actions_paraphrased"]["total"]), (0.0, 1))
+        # Only bindings with a motion_text are split
+        self.assertEqual(mappings["gestures_literal"]["total"], 1)
+        self.assertNotIn("poses_literal", mappings)
+        self.assertEqual(results["latency"]["batch"]["count"], 2)
+        self.assertGreater(results["latency"]["texts_per_s"], 0)
+
+    def test_warmup_leaves_no_phrase_embeddings_behind(self):
+        mapper = fake_mapper()
+        store = mapper.embedding_store
+        stores = []
+        predict = mapper.predict_batch.side_effect
+        mapper.predict_batch.side_effect = lambda texts, batch_size: stores.append(mapper.embedding_store) or predict(texts, batch_size)
+        evaluate_pipeline.evaluate(mapper, GOLD, batch_size=1, warmup=1)
+        self.assertEqual(stores, [None, store, store])
+        mapper.embedding_cache.clear.assert_called_once_with()
+
+    def test_thresholds(self):
+        results = evaluate_pipeline.evaluate(fake_mapper(), GOLD, batch_size=2)
+        self.assertEqual(evaluate_pipeline.check_thresholds(results, {"entities.GAME.recall": 0.9}, {"latency.batch.p95_ms": 1000}), [])
+        violations = evaluate_pipeline.check_thresholds(results, {"mappings.actions.accuracy": 0.8, "entities.GAME.recal": 0.5})
+        self.assertEqual(len(violations), 2)
+        self.assertIn("mappings.actions.accuracy = 0.5, minimum 0.8", violations)
+        self.assertIn("entities.GAME.recal: no such metric", violations)
+
+    @patch("motion_game_mapper.MotionGameMapper")
+    def test_exit_status(self, mapper_class):
+        mapper_class.return_value = fake_mapper()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            gold_path = os.path.join(tmp_dir, "gold.jsonl")
+            with open(gold_path, "w") as gold_file:
+                gold_file.writelines(json.dumps(example) + "\n" for example in GOLD)
+            output_path = os.path.join(tmp_dir, "results.json")
+            with patch("builtins.print"):
+                self.assertEqual(evaluate_pipeline.main([gold_path, "--min", "mappings.poses.accuracy=0.9"]), 0)
+                self.assertEqual(evaluate_pipeline.main([gold_path, "--min", "mappings.actions.accuracy=0.9", "--output", output_path]), 1)
+            with open(output_path) as output_file:
+                self.assertEqual(len(json.load(output_file)["violations"]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
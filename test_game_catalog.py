@@ -0,0 +1,42 @@
+import unittest
+import os
+import tempfile
+from game_catalog import DictGameCatalog, SqliteGameCatalog, import_catalog
+
+
+class TestSqliteGameCatalog(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.root.name, "games.db")
+        self.actions = {"Minecraft": ["place", "jump"], "Tetris": ["rotate", "drop", "left"]}
+        self.keys = {"Minecraft": {"place": "right", "jump": "space"}, "Tetris": {"rotate": "up"}}
+        import_catalog(self.path, self.actions, self.keys)
+        self.catalog = SqliteGameCatalog(self.path, cache_size=1)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_matches_the_dict_catalog(self):
+        expected = DictGameCatalog(self.actions, self.keys)
+        for title in ["Minecraft", "Tetris", "Unknown"]:
+            self.assertEqual(self.catalog.get(title), expected.get(title))
+        self.assertEqual(list(self.catalog.titles()), ["Minecraft", "Tetris"])
+        self.assertEqual(len(self.catalog), 2)
+        self.assertNotIn("Unknown", self.catalog)
+
+    def test_cache_is_bounded(self):
+        self.catalog.get("Minecraft")
+        self.catalog.get("Tetris")
+        self.assertEqual(list(self.catalog._entries), ["Tetris"])
+
+    def test_reimport_is_picked_up_on_refresh(self):
+        self.assertEqual(self.catalog.get("Tetris").actions, ["rotate", "drop", "left"])
+        self.assertFalse(self.catalog.refresh())
+        import_catalog(self.path, {"Tetris": ["rotate", "hold"]})
+        self.assertTrue(self.catalog.refresh())
+        self.assertEqual(self.catalog.get("Tetris").actions, ["rotate", "hold"])
+        self.assertEqual(self.catalog.get("Minecraft").actions, ["place", "jump"])
+
+
+if __name__ == '__main__':
+    unittest.main()
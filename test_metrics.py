@@ -0,0 +1,48 @@
+import json
+import unittest
+
+from metrics import MetricsRegistry, NULL_METRICS
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsRegistry(buckets=(0.01, 0.1))
+
+    def test_counters_are_kept_per_label(self):
+        self.metrics.inc("entities_total", label="GAME")
+        self.metrics.inc("entities_total", 2, label="POSES")
+        self.metrics.inc("entities_total", label="GAME")
+        series = {entry["labels"]["label"]: entry["value"] for entry in self.metrics.snapshot()["counters"]["entities_total"]}
+        self.assertEqual(series, {"GAME": 2, "POSES": 2})
+
+    def test_histograms_count_per_bucket(self):
+        for seconds in (0.005, 0.05, 0.5):
+            self.metrics.observe("stage_seconds", seconds, stage="ner")
+        with self.metrics.timer("stage_seconds", stage="ner"):
+            pass
+        histogram = self.metrics.snapshot()["histograms"]["stage_seconds"][0]
+        self.assertEqual(histogram["buckets"], {"0.01": 2, "0.1": 1})
+        self.assertEqual(histogram["count"], 4)
+        self.assertAlmostEqual(histogram["sum"], 0.555, places=3)
+        json.loads(self.metrics.to_json())
+
+    def test_prometheus_buckets_are_cumulative(self):
+        self.metrics.inc("predictions_total")
+        for seconds in (0.005, 0.05, 0.5):
+            self.metrics.observe("stage_seconds", seconds, stage="encode")
+        lines = self.metrics.to_prometheus().splitlines()
+        self.assertIn("# TYPE motion_game_mapper_predictions_total counter", lines)
+        self.assertIn("motion_game_mapper_predictions_total 1", lines)
+        self.assertIn('motion_game_mapper_stage_seconds_bucket{stage="encode",le="0.1"} 2', lines)
+        self.assertIn('motion_game_mapper_stage_seconds_bucket{stage="encode",le="+Inf"} 3', lines)
+        self.assertIn('motion_game_mapper_stage_seconds_count{stage="encode"} 3', lines)
+
+    def test_null_metrics_record_nothing(self):
+        self.assertFalse(NULL_METRICS.enabled)
+        NULL_METRICS.inc("predictions_total")
+        with NULL_METRICS.timer("stage_seconds", stage="ner"):
+            pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+import unittest
+
+import spacy
+
+import ner_corpus
+from train_data import TRAIN_DATA
+
+
+class TestNERCorpus(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_convert_writes_shards_and_reads_them_back(self):
+        manifest = ner_corpus.convert(TRAIN_DATA, self.tmp_dir.name, shard_size=10)
+        self.assertEqual(manifest["docs"], len(TRAIN_DATA))
+        self.assertEqual([shard["docs"] for shard in manifest["shards"]], [10, 10, len(TRAIN_DATA) - 20])
+        self.assertIn("GAME", manifest["labels"])
+
+        corpus = ner_corpus.ShardedCorpus(self.tmp_dir.name)
+        nlp = spacy.blank("en")
+        docs = list(corpus.docs(nlp.vocab))
+        self.assertEqual([index for index, _ in docs], list(range(len(TRAIN_DATA))))
+        text, annotations = TRAIN_DATA[0]
+        self.assertEqual(docs[0][1].text, text)
+        self.assertEqual([(ent.start_char, ent.end_char, ent.label_) for ent in docs[0][1].ents], [tuple(span) for span in annotations["entities"]])
+
+        examples = list(corpus.examples(nlp, skip={0}))
+        self.assertEqual(len(examples), len(TRAIN_DATA) - 1)
+        self.assertEqual(examples[0].reference.text, TRAIN_DATA[1][0])
+
+    def test_misaligned_spans_are_reported_and_left_out(self):
+        data = [
+            ("I want to play Minecraft", {"entities": [(15, 24, "GAME")]}),
+            ("I want to play Minecraft", {"entities": [(15, 20, "GAME")]}),
+            ("jump with thumb up", {"entities": [(0, 4, "ACTION-O"), (0, 9, "POSES")]}),
+        ]
+        manifest = ner_corpus.convert(data, self.tmp_dir.name)
+        self.assertEqual((manifest["docs"], manifest["misaligned"]), (1, 2))
+        with open(os.path.join(self.tmp_dir.name, ner_corpus.MISALIGNED)) as report:
+            problems = [json.loads(line) for line in report]
+        self.assertEqual([problem["index"] for problem in problems], [1, 2])
+        self.assertEqual(problems[0]["problems"][0]["text"], "Minec")
+
+    def test_cached_corpus_is_converted_once_per_content(self):
+        first = ner_corpus.cached_corpus(TRAIN_DATA[:5], self.tmp_dir.name)
+        again = ner_corpus.cached_corpus(TRAIN_DATA[:5], self.tmp_dir.name)
+        other = ner_corpus.cached_corpus(TRAIN_DATA[:6], self.tmp_dir.name)
+        self.assertEqual(first.corpus_dir, again.corpus_dir)
+        self.assertNotEqual(first.corpus_dir, other.corpus_dir)
+        self.assertEqual(len(os.listdir(self.tmp_dir.name)), 2)
+        self.assertEqual([name for name in os.listdir(first.corpus_dir) if name.endswith(".tmp")], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+
+import spacy
+
+import ner_sweep
+from train_data import TRAIN_DATA
+
+
+class TestNERSweep(unittest.TestCase):
+    def test_grid_and_random_search(self):
+        spec = {"width": [32, 64], "drop": [0.2, 0.5, 0.8]}
+        configurations = ner_sweep.grid(spec)
+        self.assertEqual(len(configurations), 6)
+        self.assertIn({"drop": 0.5, "width": 64}, configurations)
+
+        # A grid of 6 cannot give 10 distinct samples
+        self.assertEqual(len(ner_sweep.random_search(spec, 10)), 6)
+        samples = ner_sweep.random_search({"embed_size": {"min": 100, "max": 3000}, "drop": {"min": 0.1, "max": 0.6}}, 5, seed=3)
+        self.assertEqual(samples, ner_sweep.random_search({"embed_size": {"min": 100, "max": 3000}, "drop": {"min": 0.1, "max": 0.6}}, 5, seed=3))
+        self.assertTrue(all(isinstance(sample["embed_size"], int) and 0.1 <= sample["drop"] <= 0.6 for sample in samples))
+
+    def test_model_config_splits_architecture_parameters(self):
+        config = ner_sweep.model_config({"width": 64, "embed_size": 500, "hidden_width": 32, "drop": 0.2})
+        self.assertEqual(config, {"hidden_width": 32, "tok2vec": {"width": 64, "embed_size": 500}})
+        self.assertEqual(ner_sweep.model_config({"n_iter": 10}), {})
+
+    def test_rank_marks_the_pareto_front(self):
+        def result(trial, f_score, p50_ms):
+            return {"trial": trial, "params": {"width": trial}, "scores": {"ents_f": f_score}, "latency": {"p50_ms": p50_ms, "p95_ms": p50_ms, "docs_per_s": 1.0}, "model_mb": 1.0}
+        results = [result(0, 0.8, 2.0), result(1, 0.9, 5.0), result(2, 0.7, 3.0), {"trial": 3, "params": {}, "error": "ValueError: boom"}]
+        ranked = ner_sweep.rank(results)
+        self.assertEqual([result["trial"] for result in ranked], [1, 0, 2, 3])
+        self.assertEqual([result.get("pareto") for result in ranked], [True, True, False, None])
+        self.assertIn("failed: ValueError: boom", ner_sweep.format_report(ranked))
+
+    def test_sweep_trains_and_reports_each_configuration(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ranked = ner_sweep.sweep([{"n_iter": 2, "width": 32}, {"n_iter": 2, "embed_size": 300}], os.path.join(tmp_dir, "sweep"),
+                                     examples=TRAIN_DATA, dev_split=0.25, cache_dir=os.path.join(tmp_dir, "cache"))
+            self.assertEqual(sorted(result["trial"] for result in ranked), [0, 1])
+            for result in ranked:
+                self.assertNotIn("error", result)
+                self.assertIn("ents_f", result["scores"])
+                self.assertGreater(result["latency"]["docs_per_s"], 0)
+                self.assertTrue(os.path.isdir(result["model_dir"]))
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, "sweep", "report.json")))
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, "sweep", "report.txt")))
+
+            # A rerun into the same output trains a new model instead of the earlier sweep's
+            with open(os.path.join(tmp_dir, "sweep", "report.json")) as report_file:
+                corpus_dir = json.load(report_file)["corpus_dir"]
+            result = ner_sweep.run_trial((0, {"n_iter": 1, "width": 64}, corpus_dir, os.path.join(tmp_dir, "sweep"), 0.25, 0))
+            self.assertNotIn("error", result)
+            config = spacy.load(result["model_dir"], exclude=["motion_entity_matcher"]).config
+            self.assertEqual(config["components"]["ner"]["model"]["tok2vec"]["width"], 64)
+
+    def test_sweep_needs_held_out_docs(self):
+        with self.assertRaises(ValueError):
+            ner_sweep.sweep([{}], "unused", examples=TRAIN_DATA, dev_split=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+from motion_game_mapper import MotionGameMapper
+from onnx_encoder import OnnxSentenceEncoder
+
+
+class TestOnnxSentenceEncoder(unittest.TestCase):
+    def make_encoder(self, **pooling):
+        # Pooling does not need the onnxruntime session
+        encoder = OnnxSentenceEncoder.__new__(OnnxSentenceEncoder)
+        encoder.pooling = dict({"word_embedding_dimension": 2, "pooling_mode_mean_tokens": True}, **pooling)
+        encoder.normalize = False
+        return encoder
+
+    def test_mean_pooling_ignores_padding(self):
+        token_embeddings = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]]], dtype=np.float32)
+        pooled = self.make_encoder()._pool(token_embeddings, np.array([[1, 1, 0]]))
+        np.testing.assert_allclose(pooled, [[2.0, 3.0]])
+
+    def test_pooling_modes_are_concatenated_and_normalized(self):
+        encoder = self.make_encoder(pooling_mode_cls_token=True)
+        encoder.normalize = True
+        token_embeddings = np.array([[[3.0, 0.0], [3.0, 0.0]]], dtype=np.float32)
+        pooled = encoder._pool(token_embeddings, np.array([[1, 1]]))
+        np.testing.assert_allclose(pooled, [[np.sqrt(0.5), 0.0, np.sqrt(0.5), 0.0]], rtol=1e-6)
+
+    def test_encode_concatenates_the_pooling_modes(self):
+        encoder = self.make_encoder(pooling_mode_cls_token=True, pooling_mode_max_tokens=True)
+        encoder.input_names = ["input_ids", "attention_mask"]
+        # One token per character, embedded as (position, length) so every row is known
+        encoder.tokenizer = MagicMock()
+        encoder.tokenizer.encode_batch.side_effect = lambda sentences: [
+            MagicMock(ids=[1] * len(sentence) + [0] * (max(map(len, sentences)) - len(sentence)),
+                      attention_mask=[1] * len(sentence) + [0] * (max(map(len, sentences)) - len(sentence)),
+                      type_ids=[0] * max(map(len, sentences)))
+            for sentence in sentences
+        ]
+        encoder.session = MagicMock()
+        encoder.session.run.side_effect = lambda outputs, features: [np.stack([
+            [[position, mask.sum()] for position in range(len(mask))] for mask in features["attention_mask"]
+        ]).astype(np.float32)]
+
+        self.assertEqual(encoder.embedding_dimension, 6)
+        embeddings = encoder.encode(["jump", "go", "crouch"], batch_size=2)
+        self.assertEqual(embeddings.shape, (3, 6))
+        # cls, max over the real tokens, mean over the real tokens
+        np.testing.assert_allclose(embeddings[0], [0, 4, 3, 4, 1.5, 4])
+        np.testing.assert_allclose(embeddings[1], [0, 2, 1, 2, 0.5, 2])
+        np.testing.assert_allclose(embeddings[2], [0, 6, 5, 6, 2.5, 6])
+        self.assertEqual(encoder.encode("go").shape, (6,))
+        self.assertEqual(encoder.encode([]).shape, (0, 6))
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            MotionGameMapper(encoder_backend="tensorrt", lazy_load=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
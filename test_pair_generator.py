@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from game_catalog import DictGameCatalog
+from similarity_model_train.pair_generator import PairGenerator, best_label, label_phrase, write_shards
+
+
+class BagOfWordsModel:
+    """
+    Embeds a text as the counts of its words, so texts sharing words are similar.
+    """
+
+    def __init__(self):
+        self.vocabulary = {}
+
+    def encode(self, texts, batch_size=32):
+        rows = []
+        for text in texts:
+            row = np.zeros(64, dtype=np.float32)
+            for word in text.lower().replace("_", " ").split():
+                row[self.vocabulary.setdefault(word, len(self.vocabulary)) % 64] += 1
+            rows.append(row)
+        return np.array(rows)
+
+
+TRAIN_DATA = [
+    ("I want to play Minecraft and make a fist to mine blocks", {"entities": [(15, 24, "GAME"), (36, 40, "POSES"), (44, 55, "ACTION-O")]}),
+    ("pass the ball with an index pinch", {"entities": [(0, 13, "ACTION-O"), (22, 33, "GESTURE")]}),
+]
+CATALOG = DictGameCatalog(
+    {"Minecraft": ["mine", "break", "place", "mine blocks fast"], "FIFA": ["pass", "shoot", "pass back"]},
+    {"Minecraft": {"mine": "left", "break": "left", "place": "right", "mine blocks fast": "ctrl+left"}, "FIFA": {"pass": "a", "shoot": "b", "pass back": "c"}},
+)
+
+
+class TestPairGenerator(unittest.TestCase):
+    def setUp(self):
+        self.generator = PairGenerator(BagOfWordsModel(), CATALOG, gestures=["index_pinch", "punch"], poses=["fist", "fist2", "palm_stop"],
+                                       train_data=TRAIN_DATA, negatives_per_positive=2, block_size=2)
+
+    def test_labels_and_spans(self):
+        self.assertEqual(label_phrase("three_fingers_pinch"), "three fingers pinch")
+        self.assertEqual(best_label("clenching a fist", ["fist", "palm_stop"]), "fist")
+        self.assertIsNone(best_label("thumb down", ["fist", "palm_stop"]))
+
+    def test_positives_come_from_catalogs_and_train_data(self):
+        positives = self.generator.positives()
+        self.assertIn(("gestures", None, "index pinch", "index_pinch"), positives)
+        self.assertIn(("poses", None, "palm stop", "palm_stop"), positives)
+        self.assertIn(("poses", None, "fist", "fist2"), positives)
+        # The ACTION-O span of a sentence with a game is matched against that game's actions only
+        self.assertIn(("actions", "Minecraft", "mine blocks", "mine"), positives)
+        # Without a game, against every action of the catalog that shares a word with it
+        self.assertIn(("actions", None, "pass the ball", "pass"), positives)
+        self.assertNotIn(("actions", None, "pass the ball", "pass back"), positives)
+        self.assertFalse([positive for positive in positives if positive[2] == positive[3]])
+
+    def test_hard_negatives_skip_positives_and_actions_on_the_same_key(self):
+        pairs = self.generator.generate()
+        by_text = {(pair["sentence1"], pair["sentence2"]): pair for pair in pairs}
+        self.assertEqual(by_text[("mine blocks", "mine")]["similarity"], 1.0)
+        # break is bound to the same key as mine, so picking it is not a mistake
+        self.assertNotIn(("mine blocks", "break"), by_text)
+        self.assertEqual(by_text[("mine blocks", "mine blocks fast")]["similarity"], 0.0)
+        self.assertEqual(by_text[("mine blocks", "mine")]["negative"], "mine blocks fast")
+        keys = [tuple(sorted((pair["sentence1"].lower(), pair["sentence2"].lower()))) for pair in pairs]
+        self.assertEqual(len(keys), len(set(keys)))
+
+    def test_nearest_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        queries, candidates = rng.normal(size=(7, 8)), rng.normal(size=(20, 8))
+        excluded = [{0, 1}] * 7
+        neighbours = self.generator.nearest(queries, candidates, 3, excluded)
+        for query, indices in zip(queries, neighbours):
+            similarities = candidates @ query
+            similarities[[0, 1]] = -np.inf
+            self.assertEqual(indices, list(np.argsort(-similarities)[:3]))
+
+    def test_write_shards(self):
+        pairs = self.generator.generate()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = write_shards(pairs, tmp_dir, shard_size=5)
+            self.assertEqual(len(paths), -(-len(pairs) // 5))
+            written = [json.loads(line) for path in paths for line in open(path)]
+            self.assertEqual(sorted(map(json.dumps, written)), sorted(map(json.dumps, pairs)))
+            with open(os.path.join(tmp_dir, "manifest.json")) as manifest_file:
+                self.assertEqual(json.load(manifest_file)["pairs"], len(pairs))
+
+
+if __name__ == '__main__':
+    unittest.main()
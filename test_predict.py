@@ -3,6 +3,28 @@ from unittest.mock import patch, MagicMock
 from unittest.mock import mock_open
 # Assuming the class-based implementation is saved in a file named `motion_game_mapper.py`
 from motion_game_mapper import MotionGameMapper
+from label_index import LabelIndex
+from game_controls import games_actions
+from available_gesture_and_pose import available_poses
+from metrics import MetricsRegistry
+
+
+class FakeEncoder:
+    """
+    Embeds each phrase as a bag of its characters so similar spellings end up close together.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, sentences, **kwargs):
+        import numpy as np
+        self.calls.append(sentences)
+        single = isinstance(sentences, str)
+        vectors = np.zeros((1 if single else len(sentences), 128), dtype=np.float32)
+        for row, sentence in enumerate([sentences] if single else sentences):
+            for char in sentence.lower():
+                vectors[row, ord(char) % 128] += 1
+        return vectors[0] if single else vectors
 
 class TestMotionGameMapper(unittest.TestCase):
     def setUp(self):
@@ -44,6 +66,108 @@ class TestMotionGameMapper(unittest.TestCase):
 
         self.assertEqual(output_data["mode"], 'Tetris')
 
+    def test_predict_batch_matches_single_text_path(self):
+        def make_doc(entities):
+            doc = MagicMock()
+            doc.ents = []
+            for label, text in entities:
+                ent = MagicMock()
+                ent.label_, ent.text = label, text
+                doc.ents.append(ent)
+            return doc
+
+        texts = {
+            "play Minecraft, jump with fist": [("GAME", "Minecraft"), ("ACTION-O", "jump"), ("POSES", "fist")],
+            "kicking to shoot a goal in FIFA": [("GESTURE", "kicking"), ("ACTION-O", "shoot a goal"), ("GAME", "FIFA")],
+            "no game here": [("POSES", "fist"), ("ACTION-O", "jump")],
+        }
+        self.mapper.sentence_model = FakeEncoder()
+        self.mapper.label_index = LabelIndex(self.mapper.sentence_model)
+        self.mapper.nlp = MagicMock(side_effect=lambda text: make_doc(texts[text]))
+        self.mapper.nlp.pipe = MagicMock(side_effect=lambda batch, batch_size: [make_doc(texts[text]) for text in batch])
+
+        expected = []
+        for text in texts:
+            output_data = self.mapper.initialize_output_structure()
+            self.mapper._predict_without_comma(text, output_data)
+            expected.append(output_data)
+        self.mapper.embedding_cache.clear()
+        encode_calls = len(self.mapper.sentence_model.calls)
+
+        self.assertEqual(self.mapper.predict_batch(list(texts), batch_size=2), expected)
+        # All distinct phrases of the batch are encoded in a single call
+        self.assertEqual(len(self.mapper.sentence_model.calls), encode_calls + 1)
+        self.assertEqual(expected[0]["poses"][0]["files"], "fist")
+        self.assertEqual(expected[2]["mode"], "No Game Selected")
+
+    def test_repeated_phrases_hit_the_embedding_cache(self):
+        self.mapper.sentence_model = FakeEncoder()
+        self.mapper.label_index = LabelIndex(self.mapper.sentence_model)
+        minecraft_actions = games_actions["Minecraft"]
+        match = self.mapper._similarities_match("jumping", minecraft_actions)
+        self.assertEqual(self.mapper._similarities_match("Jumping", minecraft_actions), match)
+        # One call to build the label index and one for the first "jumping"
+        self.assertEqual(len(self.mapper.sentence_model.calls), 2)
+        stats = self.mapper.cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_literal_catalog_phrases_skip_the_encoder(self):
+        self.mapper.sentence_model = FakeEncoder()
+        self.mapper.label_index = LabelIndex(self.mapper.sentence_model)
+        encode_calls = len(self.mapper.sentence_model.calls)
+        self.assertEqual(self.mapper._similarities_match("index pinch", available_poses), "index_pinch")
+        self.assertEqual(self.mapper._similarities_match("Thumbs up", available_poses), "thumb_up")
+        self.assertEqual(len(self.mapper.sentence_model.calls), encode_calls)
+        self.assertEqual(self.mapper.alias_stats()["hits"], 2)
+
+    def test_game_entities_resolve_to_catalog_titles(self):
+        self.mapper.sentence_model = FakeEncoder()
+        self.mapper.label_index = LabelIndex(self.mapper.sentence_model, actions={})
+        doc = MagicMock()
+        doc.ents = []
+        for label, text in [("GAME", "minecarft"), ("POSES", "fist"), ("ACTION-O", "jump")]:
+            ent = MagicMock()
+            ent.label_, ent.text = label, text
+            doc.ents.append(ent)
+        output_data = self.mapper.initialize_output_structure()
+        self.mapper._populate_output(doc, output_data)
+        self.assertEqual(output_data["mode"], "Minecraft")
+        self.assertEqual(output_data["poses"][0]["action"]["args"], ["space"])
+
+    def test_metrics_record_components_and_unmatched_phrases(self):
+        self.mapper.metrics = MetricsRegistry()
+        self.mapper.sentence_model = FakeEncoder()
+        self.mapper.label_index = LabelIndex(self.mapper.sentence_model, actions={})
+        doc = MagicMock()
+        doc.ents = []
+        for label, text in [("GAME", "Minecraft"), ("POSES", "fist"), ("ACTION-O", "jump"), ("POSES", "fist"), ("ACTION-O", "zzzz")]:
+            ent = MagicMock()
+            ent.label_, ent.text = label, text
+            doc.ents.append(ent)
+        self.mapper.nlp = MagicMock()
+        self.mapper.nlp.pipeline = [("ner", MagicMock(return_value=doc)), ("motion_entity_matcher", MagicMock(return_value=doc))]
+        self.mapper.predict("I want to play Minecraft")
+
+        snapshot = self.mapper.metrics.snapshot()
+        components = {entry["labels"]["component"] for entry in snapshot["histograms"]["component_seconds"]}
+        self.assertEqual(components, {"tokenizer", "ner", "motion_entity_matcher"})
+        counters = {name: {tuple(entry["labels"].values()): entry["value"] for entry in series} for name, series in snapshot["counters"].items()}
+        self.assertEqual(counters["entities_total"], {("GAME",): 1, ("POSES",): 2, ("ACTION-O",): 2})
+        self.assertEqual(counters["action_pairs_total"], {(): 2})
+        self.assertEqual(counters["none_matches_total"], {("action",): 1})
+        self.assertEqual(counters["predictions_total"], {(): 1})
+
+    def test_lazy_load_defers_model_loading(self):
+        with patch('motion_game_mapper.SentenceTransformer') as sentence_transformer, patch('motion_game_mapper.spacy.load') as spacy_load:
+            mapper = MotionGameMapper(lazy_load=True)
+            spacy_load.assert_not_called()
+            output_data = mapper.initialize_output_structure()
+            mapper._predict_without_comma("I love my hands", output_data)
+            spacy_load.assert_called_once()
+            # Without a game nothing is matched, so the sentence model is never needed
+            sentence_transformer.assert_not_called()
+            self.assertIn("load_ner_model", mapper.timings)
+
     def test_motion_to_action_mapping_returns_none_for_unknown_game(self):
         motion = "fly"
         game = "UnknownGame"
@@ -110,6 +234,41 @@ class TestMotionGameMapper(unittest.TestCase):
         self.assertTrue(all(not output_data[key] for key in expected_keys), "Output for empty sentences should not populate any data.")
 
 
+class TestLabelIndex(unittest.TestCase):
+    def setUp(self):
+        self.encoder = FakeEncoder()
+        self.actions = {"Minecraft": ["jump", "mine", "walk"]}
+        self.index = LabelIndex(self.encoder, gestures=["kick", "punch"], poses=["fist", "peace"], actions=self.actions)
+
+    def test_labels_are_encoded_once(self):
+        self.assertEqual(len(self.encoder.calls), 1)
+        self.assertEqual(self.encoder.calls[0], ["kick", "punch", "fist", "peace", "jump", "mine", "walk"])
+
+    def test_best_match_uses_precomputed_matrix(self):
+        matrix = self.index.matrix_for(self.actions["Minecraft"])
+        self.assertEqual(matrix.shape, (3, 128))
+        target = self.encoder.encode("jump")
+        self.assertEqual(LabelIndex.best_match(target, self.actions["Minecraft"], matrix), "jump")
+
+    def test_unknown_label_list_is_not_indexed(self):
+        self.assertIsNone(self.index.matrix_for(["run", "jump"]))
+
+    def test_refresh_rebuilds_when_catalog_changes(self):
+        self.assertFalse(self.index.refresh())
+        self.actions["Tetris"] = ["rotate", "drop"]
+        self.assertTrue(self.index.refresh())
+        self.assertIsNotNone(self.index.matrix_for(["rotate", "drop"]))
+
+
+    def test_games_are_embedded_on_first_use(self):
+        index = LabelIndex(self.encoder, gestures=["kick"], poses=["fist"], actions={}, max_games=1)
+        self.assertEqual(len(self.encoder.calls), 2)
+        matrix = index.matrix_for_game("Tetris", ["rotate", "drop"])
+        self.assertIs(index.matrix_for_game("Tetris", ["rotate", "drop"]), matrix)
+        self.assertEqual(self.encoder.calls[-1], ["rotate", "drop"])
+        index.matrix_for_game("FIFA", ["pass", "shoot"])
+        self.assertEqual(index.game_stats(), {"loaded": 1, "loads": 2, "evictions": 1})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from prefork import PreforkWorkers, memory_usage, format_memory_report
+from motion_game_mapper import MotionGameMapper
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+class TestPreforkWorkers(unittest.TestCase):
+    def test_workers_share_the_parents_state_and_stop(self):
+        shared = {"loaded": "in the parent"}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            def run_worker():
+                path = os.path.join(tmp_dir, str(os.getpid()))
+                with open(f"{path}.tmp", "w") as marker:
+                    marker.write(shared["loaded"])
+                os.rename(f"{path}.tmp", path)
+                time.sleep(30)
+
+            pool = PreforkWorkers(2, run_worker)
+            pool.start()
+            pids = list(pool.pids)
+            deadline = time.monotonic() + 10
+            while len([name for name in os.listdir(tmp_dir) if not name.endswith(".tmp")]) < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            pool.stop()
+            self.assertEqual(sorted(os.listdir(tmp_dir)), sorted(map(str, pids)))
+            with open(os.path.join(tmp_dir, str(pids[0]))) as marker:
+                self.assertEqual(marker.read(), "in the parent")
+        self.assertEqual(pool.pids, [])
+
+    def test_memory_usage_of_this_process(self):
+        usage = memory_usage(os.getpid())
+        if usage is None:
+            self.skipTest("/proc/<pid>/smaps_rollup is not available")
+        self.assertGreater(usage["rss"], 0)
+        self.assertLessEqual(usage["uss"], usage["rss"])
+        self.assertIn("parent", format_memory_report([("parent", os.getpid())]))
+
+
+class TestAfterFork(unittest.TestCase):
+    def test_encode_scheduler_is_started_again(self):
+        with patch('motion_game_mapper.SentenceTransformer'), patch('motion_game_mapper.spacy.load'):
+            mapper = MotionGameMapper(micro_batch_wait_ms=1.0)
+        scheduler = mapper.encode_scheduler
+        mapper.after_fork()
+        self.assertIsNot(mapper.encode_scheduler, scheduler)
+        self.assertTrue(mapper.encode_scheduler._thread.is_alive())
+        scheduler.close()
+        mapper.encode_scheduler.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
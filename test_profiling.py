@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from profiling import Profiler, NULL_PROFILER, PROFILE_DIR_ENV, summarize_reports
+
+
+def busy_function():
+    return sum(len(str(number)) for number in range(20000))
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.reports_dir = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_sampled_calls_write_a_report(self):
+        profiler = Profiler(self.reports_dir, sample_rate=1.0)
+        with profiler.profile("predict_to_json", text="I want to play Tetris"):
+            busy_function()
+        files = sorted(os.listdir(self.reports_dir))
+        self.assertEqual([os.path.splitext(name)[1] for name in files], [".json", ".prof"])
+        with open(os.path.join(self.reports_dir, files[0]), encoding="utf-8") as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report["kind"], "predict_to_json")
+        self.assertEqual(report["metadata"], {"text": "I want to play Tetris"})
+        self.assertTrue(any("busy_function" in function["function"] for function in report["functions"]))
+
+    def test_unsampled_calls_are_not_profiled(self):
+        profiler = Profiler(self.reports_dir, sample_rate=0.0)
+        with profiler.profile("predict_batch", texts=3):
+            busy_function()
+        self.assertEqual(os.listdir(self.reports_dir), [])
+
+    def test_profiling_is_off_without_a_directory(self):
+        with patch.dict(os.environ, {PROFILE_DIR_ENV: ""}):
+            self.assertIs(Profiler.from_env(), NULL_PROFILER)
+        with patch.dict(os.environ, {PROFILE_DIR_ENV: self.reports_dir}):
+            self.assertEqual(Profiler.from_env().reports_dir, self.reports_dir)
+
+    def test_summary_aggregates_reports(self):
+        profiler = Profiler(self.reports_dir)
+        for kind in ("predict_to_json", "predict_to_json", "predict_batch"):
+            with profiler.profile(kind):
+                busy_function()
+        summary = summarize_reports(self.reports_dir, sort="cumulative")
+        self.assertEqual(summary["reports"], 3)
+        self.assertEqual(summary["durations"]["predict_to_json"]["count"], 2)
+        busy = [function for function in summary["functions"] if "busy_function" in function["function"]]
+        self.assertEqual(busy[0]["calls"], 3)
+        self.assertEqual(summarize_reports(self.reports_dir, kind="predict_batch")["reports"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
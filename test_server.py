@@ -0,0 +1,88 @@
+import unittest
+import json
+import threading
+import http.client
+from unittest.mock import MagicMock
+from server import PredictionService, create_servers
+from metrics import MetricsRegistry
+
+
+class TestPredictionServer(unittest.TestCase):
+    def setUp(self):
+        self.mapper = MagicMock()
+        self.mapper.predict.side_effect = lambda text: {"mode": text, "orientation": "", "landmark": "", "poses": [], "gestures": []}
+        self.mapper.predict_batch.side_effect = lambda texts: [self.mapper.predict(text) for text in texts]
+        self.service = PredictionService(lambda: self.mapper)
+        self.server = create_servers(self.service, port=0, workers=2)[0]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.stop_workers()
+        self.server.server_close()
+
+    def request(self, method, path, body=None, content_type="application/json"):
+        connection = http.client.HTTPConnection(*self.server.server_address)
+        connection.request(method, path, body=body, headers={"Content-Type": content_type})
+        response = connection.getresponse()
+        data = json.loads(response.read())
+        connection.close()
+        return response.status, data
+
+    def test_readiness_follows_model_loading(self):
+        self.assertEqual(self.request("GET", "/healthz")[0], 200)
+        self.assertEqual(self.request("GET", "/readyz")[0], 503)
+        self.assertEqual(self.request("POST", "/predict", json.dumps({"text": "Tetris"}))[0], 503)
+        self.service.load()
+        self.assertEqual(self.request("GET", "/readyz")[0], 200)
+        self.service.stopping.set()
+        self.assertEqual(self.request("GET", "/readyz"), (503, {"status": "stopping", "error": None}))
+
+    def test_predict_returns_the_output_structure(self):
+        self.service.load()
+        status, data = self.request("POST", "/predict", json.dumps({"text": "Tetris"}))
+        self.assertEqual(status, 200)
+        self.assertEqual(data["mode"], "Tetris")
+        status, data = self.request("POST", "/predict", "Minecraft", content_type="text/plain")
+        self.assertEqual(data["mode"], "Minecraft")
+
+    def test_predict_batch(self):
+        self.service.load()
+        status, data = self.request("POST", "/predict_batch", json.dumps({"texts": ["Tetris", "FIFA"]}))
+        self.assertEqual([output["mode"] for output in data], ["Tetris", "FIFA"])
+
+    def test_bad_requests(self):
+        self.service.load()
+        self.assertEqual(self.request("POST", "/predict", "{not json")[0], 400)
+        self.assertEqual(self.request("POST", "/predict", json.dumps({"texts": []}))[0], 400)
+        self.assertEqual(self.request("GET", "/unknown")[0], 404)
+        self.assertEqual(self.request("GET", "/metrics")[0], 404)
+
+    def test_negative_content_length_is_rejected(self):
+        self.service.load()
+        connection = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        connection.putrequest("POST", "/predict")
+        connection.putheader("Content-Type", "application/json")
+        connection.putheader("Content-Length", "-1")
+        connection.endheaders()
+        response = connection.getresponse()
+        self.assertEqual(response.status, 400)
+        response.read()
+        connection.close()
+
+    def test_metrics_endpoint(self):
+        metrics = MetricsRegistry()
+        metrics.inc("predictions_total", 3)
+        self.server.service = PredictionService(lambda: self.mapper, metrics)
+        self.assertEqual(self.request("GET", "/metrics?format=json")[1]["counters"]["predictions_total"], [{"labels": {}, "value": 3}])
+        connection = http.client.HTTPConnection(*self.server.server_address)
+        connection.request("GET", "/metrics")
+        response = connection.getresponse()
+        self.assertTrue(response.getheader("Content-Type").startswith("text/plain"))
+        self.assertIn("motion_game_mapper_predictions_total 3", response.read().decode())
+        connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
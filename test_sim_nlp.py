@@ -0,0 +1,138 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from similarity_model_train.sim_nlp import ModelFineTuner, PairStream, shuffled
+
+PAIRS = [
+    {"sentence1": "move the ball", "sentence2": "pass", "similarity": 0.9},
+    {"sentence1": "move the ball", "sentence2": "walk", "similarity": 0.1},
+    {"sentence1": "move the ball", "sentence2": "punt", "similarity": 0.8},
+    {"sentence1": "jump", "sentence2": "kick", "similarity": 0.2},
+    {"sentence1": "kick", "sentence2": "punt", "similarity": 0.7},
+    {"sentence1": "run", "sentence2": "walk", "similarity": 0.8},
+    {"sentence1": "jump", "sentence2": "run", "similarity": 0.6},
+    {"sentence1": "pass", "sentence2": "punt", "similarity": 0.9},
+]
+
+
+def build_tiny_model(path):
+    """
+    Saves a randomly initialized one layer sentence model to path, so fine-tuning runs without a download.
+    """
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    words = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted({word for pair in PAIRS for key in ("sentence1", "sentence2") for word in pair[key].split()})
+    bert_path = os.path.join(path, "bert")
+    os.makedirs(bert_path)
+    vocab_path = os.path.join(path, "vocab.txt")
+    with open(vocab_path, "w") as vocab_file:
+        vocab_file.write("\n".join(words))
+    BertTokenizerFast(vocab_path).save_pretrained(bert_path)
+    BertModel(BertConfig(vocab_size=len(words), hidden_size=16, num_hidden_layers=1, num_attention_heads=2, intermediate_size=32)).save_pretrained(bert_path)
+    model_path = os.path.join(path, "base")
+    SentenceTransformer(modules=[models.Transformer(bert_path), models.Pooling(16)]).save(model_path)
+    return model_path
+
+
+class TestPairStream(unittest.TestCase):
+    def test_shuffle_buffer(self):
+        items = list(range(100))
+        first = list(shuffled(items, 10, random.Random(1)))
+        self.assertEqual(sorted(first), items)
+        self.assertNotEqual(first, items)
+        self.assertEqual(first, list(shuffled(items, 10, random.Random(1))))
+        self.assertEqual(list(shuffled(items, 1, random.Random(1))), items)
+
+    def test_reads_jsonl_and_csv_and_keeps_positives_for_in_batch_losses(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            jsonl_path = os.path.join(tmp_dir, "pairs.jsonl")
+            with open(jsonl_path, "w") as jsonl_file:
+                jsonl_file.writelines(json.dumps(pair) + "\n" for pair in PAIRS[:4])
+            csv_path = os.path.join(tmp_dir, "pairs.csv")
+            with open(csv_path, "w") as csv_file:
+                csv_file.write("sentence1,sentence2,similarity\n")
+                csv_file.writelines(f"{pair['sentence1']},{pair['sentence2']},{pair['similarity']}\n" for pair in PAIRS[4:])
+
+            stream = PairStream([jsonl_path, csv_path], shuffle_buffer=3)
+            self.assertEqual(len(stream), len(PAIRS))
+            examples = list(stream.examples(epoch=0))
+            self.assertEqual(sorted(example.label for example in examples), sorted(pair["similarity"] for pair in PAIRS))
+            self.assertNotEqual([example.texts for example in examples], [example.texts for example in stream.examples(epoch=1)])
+
+            positives = PairStream([jsonl_path, csv_path], in_batch_negatives=True)
+            self.assertEqual(len(positives), sum(pair["similarity"] >= 0.5 for pair in PAIRS))
+
+    def test_hard_negatives_become_a_third_text(self):
+        stream = PairStream([[{"sentence1": "a", "sentence2": "b", "negative": "c"}, {"sentence1": "a", "sentence2": "d"}]], in_batch_negatives=True, hard_negatives=True)
+        self.assertEqual([example.texts for example in stream.examples()], [["a", "b", "c"]])
+
+    def test_pairs_without_similarity_are_reported_for_pair_losses(self):
+        pairs = [{"sentence1": "a", "sentence2": "b", "similarity": 0.9}, {"sentence1": "a", "sentence2": "c"}]
+        self.assertEqual(len(PairStream([pairs], in_batch_negatives=True)), 2)
+        with self.assertRaisesRegex(ValueError, "pair 2 has no similarity"):
+            len(PairStream([pairs]))
+
+
+class TestModelFineTuner(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.base_model = build_tiny_model(cls.tmp_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_fine_tune_streams_batches_and_saves(self):
+        output_path = os.path.join(self.tmp_dir.name, "mnrl")
+        fine_tuner = ModelFineTuner(self.base_model, output_path, loss="mnrl", batch_size=2, checkpoint_steps=0)
+        stats = fine_tuner.fine_tune(PAIRS, epochs=2, warmup_steps=1)
+        positives = sum(pair["similarity"] >= 0.5 for pair in PAIRS)
+        self.assertEqual(stats["pairs"], positives * 2)
+        self.assertEqual(stats["steps"], 6)
+        self.assertGreater(stats["pairs_per_s"], 0)
+        fine_tuner.load_fine_tuned_model()
+        self.assertEqual(fine_tuner.model.encode(["pass"]).shape, (1, 16))
+
+    def test_hard_negatives_need_an_in_batch_loss(self):
+        fine_tuner = ModelFineTuner(self.base_model, os.path.join(self.tmp_dir.name, "cosent"), loss="cosent")
+        with self.assertRaises(ValueError):
+            fine_tuner.fine_tune(PAIRS, hard_negatives=True)
+
+    def test_resume_continues_from_the_latest_checkpoint(self):
+        import shutil
+        output_path = os.path.join(self.tmp_dir.name, "cosine")
+        fine_tuner = ModelFineTuner(self.base_model, output_path, batch_size=2, checkpoint_steps=2, checkpoint_limit=3)
+        self.assertEqual(fine_tuner.fine_tune(PAIRS, epochs=1, warmup_steps=1)["steps"], 4)
+        self.assertEqual(sorted(os.listdir(fine_tuner.checkpoint_path)), ["2", "4"])
+        self.assertTrue(fine_tuner.latest_checkpoint().endswith("4"))
+
+        # As if training had stopped between step 2 and 4
+        shutil.rmtree(os.path.join(fine_tuner.checkpoint_path, "4"))
+        resumed = ModelFineTuner(self.base_model, output_path, batch_size=2, checkpoint_steps=2)
+        stats = resumed.fine_tune(PAIRS, epochs=1, warmup_steps=1, resume=True)
+        self.assertEqual((stats["steps"], stats["pairs"]), (4, 4))
+
+    def test_checkpoints_of_other_runs_are_not_kept(self):
+        import shutil
+        output_path = os.path.join(self.tmp_dir.name, "rerun")
+        fine_tuner = ModelFineTuner(self.base_model, output_path, batch_size=2, checkpoint_steps=2, checkpoint_limit=2)
+        fine_tuner.fine_tune(PAIRS, epochs=1, warmup_steps=1)
+        # A previous run that got further, a new run without resume must neither keep nor resume from it
+        shutil.copytree(os.path.join(fine_tuner.checkpoint_path, "4"), os.path.join(fine_tuner.checkpoint_path, "10"))
+        fine_tuner.fine_tune(PAIRS, epochs=1, warmup_steps=1)
+        self.assertEqual(sorted(os.listdir(fine_tuner.checkpoint_path)), ["2", "4"])
+
+        # Resumed from step 2, the step 4 checkpoint and the interrupted one after it are of the abandoned history
+        shutil.copytree(os.path.join(fine_tuner.checkpoint_path, "4"), os.path.join(fine_tuner.checkpoint_path, "6"))
+        os.remove(os.path.join(fine_tuner.checkpoint_path, "6", "trainer_state.pt"))
+        shutil.rmtree(os.path.join(fine_tuner.checkpoint_path, "4"))
+        fine_tuner.fine_tune(PAIRS, epochs=1, warmup_steps=1, resume=True)
+        self.assertEqual(sorted(os.listdir(fine_tuner.checkpoint_path)), ["2", "4"])
+
+
+if __name__ == '__main__':
+    unittest.main()
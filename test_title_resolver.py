@@ -0,0 +1,35 @@
+import unittest
+from title_resolver import TitleResolver, bounded_edit_distance, normalize_title
+from game_controls import games_actions
+
+
+class TestTitleResolver(unittest.TestCase):
+    def setUp(self):
+        self.resolver = TitleResolver(list(games_actions) + ["Rocket Leader", "Minecraft Dungeons"])
+
+    def test_case_spacing_and_punctuation(self):
+        self.assertEqual(normalize_title("Batman (Arkham Series)"), "batmanarkhamseries")
+        for text, title in [("minecraft", "Minecraft"), ("Rocket league", "Rocket League"), ("rocketleague", "Rocket League"),
+                            ("batman arkham series", "Batman (Arkham Series)"), ("fifa", "FIFA")]:
+            self.assertEqual(self.resolver.resolve(text), title)
+
+    def test_small_typos(self):
+        self.assertEqual(self.resolver.resolve("Minecarft"), "Minecraft")
+        self.assertEqual(self.resolver.resolve("Horizon Zero Dawm"), "Horizon Zero Dawn")
+        self.assertEqual(self.resolver.resolve("Subway Surfers"), "Subway Surfer")
+
+    def test_unknown_short_and_ambiguous_titles(self):
+        self.assertIsNone(self.resolver.resolve("Halo Infinite"))
+        # Too short for typos
+        self.assertIsNone(self.resolver.resolve("fif"))
+        # Two edits away from both "Rocket League" and "Rocket Leader"
+        self.assertIsNone(self.resolver.resolve("Rocket Leagr"))
+
+    def test_bounded_edit_distance(self):
+        self.assertEqual(bounded_edit_distance("tetris", "tetirs", 2), 1)
+        self.assertEqual(bounded_edit_distance("kitten", "sitting", 3), 3)
+        self.assertEqual(bounded_edit_distance("kitten", "sitting", 1), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
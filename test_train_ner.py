@@ -0,0 +1,78 @@
+import unittest
+import spacy
+from spacy.tokens import Span
+import entity_matchers
+
+
+class TestMotionEntityMatcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.nlp = spacy.blank("en")
+        cls.matcher = cls.nlp.add_pipe("motion_entity_matcher")
+
+    def make_doc(self, text, entities):
+        doc = self.nlp.make_doc(text)
+        doc.ents = [Span(doc, start, end, label=label) for start, end, label in entities]
+        return doc
+
+    def test_patterns_are_derived_from_catalogs(self):
+        self.assertIn([{"LOWER": "index"}, {"LOWER": "pinch"}], entity_matchers.phrase_patterns(self.nlp, ["index_pinch"]))
+        doc = self.make_doc("I want to play Subway Surfer", [(4, 6, "GAME")])
+        doc = self.matcher(doc)
+        self.assertEqual([(ent.text, ent.label_) for ent in doc.ents], [("Subway Surfer", "GAME")])
+        self.assertEqual(len(doc), 5)
+
+    def test_gesture_wins_over_pose(self):
+        # "index pinch" is both a gesture and a pose
+        doc = self.matcher(self.make_doc("do index pinch", [(1, 3, "POSES")]))
+        self.assertEqual([(ent.text, ent.label_) for ent in doc.ents], [("index pinch", "GESTURE")])
+
+    def test_matches_do_not_create_entities(self):
+        doc = self.matcher(self.make_doc("I love Minecraft", []))
+        self.assertEqual(list(doc.ents), [])
+
+    def test_game_is_split_off_a_longer_entity(self):
+        doc = self.matcher(self.make_doc("play FIFA now", [(0, 2, "ACTION-O")]))
+        self.assertEqual([(ent.text, ent.label_) for ent in doc.ents], [("play", "ACTION-O"), ("FIFA", "GAME")])
+
+    def test_pose_inside_a_longer_entity_keeps_the_entity(self):
+        doc = self.matcher(self.make_doc("clenching a fist to jump", [(0, 3, "GESTURE"), (4, 5, "ACTION-O")]))
+        self.assertEqual([(ent.text, ent.label_) for ent in doc.ents], [("clenching a fist", "GESTURE"), ("jump", "ACTION-O")])
+
+    def test_many_merges_in_one_doc(self):
+        text = "thumb up to jump, three fingers pinch to crouch and walk left to run in rocket league"
+        doc = self.make_doc(text, [(0, 2, "POSES"), (3, 4, "ACTION-O"), (5, 8, "POSES"), (9, 10, "ACTION-O"), (11, 13, "GESTURE"), (14, 15, "ACTION-O"), (16, 18, "GAME")])
+        doc = self.matcher(doc)
+        self.assertEqual(
+            [(ent.text, ent.label_) for ent in doc.ents],
+            [("thumb up", "POSES"), ("jump", "ACTION-O"), ("three fingers pinch", "POSES"), ("crouch", "ACTION-O"),
+             ("walk left", "GESTURE"), ("run", "ACTION-O"), ("rocket league", "GAME")],
+        )
+        self.assertTrue(all(len(ent) == 1 for ent in doc.ents if ent.label_ != "ACTION-O"))
+
+
+
+class TestNERTrainer(unittest.TestCase):
+    def test_training_stops_early_and_saves_the_model(self):
+        import os
+        import tempfile
+        from train_ner import NERTrainer
+        from train_data import TRAIN_DATA
+        data = list(TRAIN_DATA)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_dir = os.path.join(tmp_dir, "ner_model")
+            trainer = NERTrainer(model_dir)
+            result = trainer.train(data, n_iter=50, dev_split=0.25, patience=2, batch_sizes=(8.0, 16.0, 1.5))
+            self.assertLess(result["epochs"], 50)
+            self.assertLessEqual(result["best_epoch"], result["epochs"])
+            self.assertIn("ents_f", result["scores"])
+            self.assertIn("ner", spacy.load(model_dir).pipe_names)
+            # The loaded NER component keeps its architecture
+            with self.assertRaises(ValueError):
+                NERTrainer(model_dir).train(data, n_iter=1, model_config={"tok2vec": {"width": 64}})
+        # The caller's list is not shuffled in place
+        self.assertEqual(data, TRAIN_DATA)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import MagicMock
+import spacy
+from motion_game_mapper import MotionGameMapper
+from transcript_session import TranscriptSession, split_clauses
+
+
+class TestTranscriptSession(unittest.TestCase):
+    def setUp(self):
+        nlp = spacy.blank("en")
+        ruler = nlp.add_pipe("entity_ruler")
+        ruler.add_patterns([{"label": "GAME", "pattern": "Minecraft"}, {"label": "POSES", "pattern": "thumb up"},
+                            {"label": "GESTURE", "pattern": "fist"}, {"label": "ACTION-O", "pattern": "jump"},
+                            {"label": "ACTION-O", "pattern": "crouch"}])
+        self.mapper = MagicMock()
+        self.mapper.nlp = MagicMock(side_effect=nlp)
+        self.mapper.nlp.pipe.side_effect = nlp.pipe
+        self.mapper.initialize_output_structure = MotionGameMapper.initialize_output_structure
+        self.mapper._parse_entities = MotionGameMapper._parse_entities
+        self.mapper._refresh_catalogs.return_value = False
+        self.mapper.resolve_game.side_effect = lambda game: game
+        self.mapper._bind_pair.side_effect = lambda pose_or_gesture, action, game: (
+            "poses" if pose_or_gesture[0] == "P" else "gestures", {"files": pose_or_gesture[1], "action": {"tmpt": action[1]}})
+        self.session = TranscriptSession(self.mapper)
+
+    def test_split_clauses(self):
+        self.assertEqual(split_clauses("I want to play Minecraft, thumb up to jump I want to crouch"),
+                         ["I want to play Minecraft,", "thumb up to jump", "I want to crouch"])
+
+    def test_updates_report_diffs_and_only_parse_the_tail(self):
+        diff = self.session.update("I want to play Minecraft,")
+        self.assertEqual(diff["fields"], {"mode": "Minecraft"})
+        self.session.update("I want to play Minecraft, thumb up")
+        self.mapper.nlp.reset_mock()
+        diff = self.session.update("I want to play Minecraft, thumb up to jump")
+        self.mapper.nlp.assert_called_once_with("thumb up to jump")
+        self.assertEqual(diff, {"fields": {}, "added": [{"type": "poses", "index": 0, "binding": {"files": "thumb up", "action": {"tmpt": "jump"}}}],
+                                "changed": [], "removed": []})
+
+        diff = self.session.update("I want to play Minecraft, thumb up to jump, fist to crouch")
+        self.assertEqual([(change["type"], change["index"]) for change in diff["added"]], [("gestures", 0)])
+        self.assertEqual(diff["changed"], [])
+        self.assertEqual(self.mapper._bind_pair.call_count, 2)
+        self.assertEqual(len(self.session.output["poses"]), 1)
+
+    def test_revised_tail_changes_and_removes_bindings(self):
+        self.session.update("I want to play Minecraft, thumb up to jump")
+        diff = self.session.update("I want to play Minecraft, thumb up to crouch")
+        self.assertEqual(diff["changed"][0]["binding"]["action"], {"tmpt": "crouch"})
+        diff = self.session.update("I want to play Minecraft,")
+        self.assertEqual(diff["removed"], [{"type": "poses", "index": 0}])
+
+
+if __name__ == '__main__':
+    unittest.main()
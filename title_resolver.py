@@ -0,0 +1,110 @@
+import re
+import numpy as np
+
+
+def normalize_title(title):
+    """
+    Lowercases and drops everything but letters and digits, so "Rocket League", "rocket-league" and
+    "rocketleague" all become "rocketleague".
+    """
+    return re.sub(r"[^0-9a-z]+", "", title.lower())
+
+
+def trigrams(text):
+    # Padded so the first and last characters are part of as many trigrams as the others
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """
+    Edit distance of a and b where swapping two adjacent characters counts as one edit (optimal string
+    alignment), or max_distance + 1 as soon as it is known to be larger. Only the diagonal band of
+    width max_distance is computed.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    too_far = max_distance + 1
+    before_previous = None
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            cost = a[i - 1] != b[j - 1]
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if cost and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before_previous[j - 2] + 1)
+            current[j] = value
+        if min(current) > max_distance:
+            return too_far
+        before_previous, previous = previous, current
+    return min(previous[-1], too_far)
+
+
+class TitleResolver:
+    """
+    Resolves a GAME entity to the canonical catalog title despite case, spacing, punctuation and small typos.
+    Titles that normalize the same are an exact dict hit. Otherwise trigram postings select the titles that
+    share enough trigrams to be within the allowed edit distance, and only those are compared character by
+    character, so a lookup stays well under a millisecond for tens of thousands of titles.
+    """
+
+    def __init__(self, titles, min_fuzzy_length=4):
+        """
+        :param titles: The canonical titles, e.g. the keys of games_actions.
+        :param min_fuzzy_length: Shorter normalized inputs must match exactly, typos in them are too ambiguous.
+        """
+        self.min_fuzzy_length = min_fuzzy_length
+        self.exact = {}
+        self.titles = []
+        self.normalized = []
+        postings = {}
+        for title in titles:
+            normalized = normalize_title(title)
+            if not normalized or normalized in self.exact:
+                continue
+            self.exact[normalized] = title
+            title_id = len(self.titles)
+            self.titles.append(title)
+            self.normalized.append(normalized)
+            for trigram in trigrams(normalized):
+                postings.setdefault(trigram, []).append(title_id)
+        self.postings = {trigram: np.array(ids, dtype=np.int32) for trigram, ids in postings.items()}
+        self.trigram_counts = np.array([len(trigrams(normalized)) for normalized in self.normalized], dtype=np.int32)
+        self.lengths = np.array([len(normalized) for normalized in self.normalized], dtype=np.int32)
+
+    @staticmethod
+    def max_distance(length):
+        # One typo in short titles, two in longer ones
+        return 1 if length < 9 else 2
+
+    def resolve(self, text):
+        """
+        Returns the canonical title text refers to, or None if there is no title close enough or several are equally close.
+        """
+        normalized = normalize_title(text)
+        title = self.exact.get(normalized)
+        if title is not None or len(normalized) < self.min_fuzzy_length or not self.titles:
+            return title
+
+        max_distance = self.max_distance(len(normalized))
+        query = trigrams(normalized)
+        lists = [self.postings[trigram] for trigram in query if trigram in self.postings]
+        if not lists:
+            return None
+        title_ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        # An edit changes at most 3 trigrams of each side, a swap of two adjacent characters 4
+        needed = np.maximum(np.maximum(len(query), self.trigram_counts[title_ids]) - 4 * max_distance, 1)
+        keep = (shared >= needed) & (np.abs(self.lengths[title_ids] - len(normalized)) <= max_distance)
+        title_ids, shared = title_ids[keep], shared[keep]
+
+        best, best_distance, tied = None, max_distance + 1, False
+        for title_id in title_ids[np.argsort(-shared, kind="stable")]:
+            distance = bounded_edit_distance(normalized, self.normalized[title_id], max_distance)
+            if distance < best_distance:
+                best, best_distance, tied = self.titles[title_id], distance, False
+            elif distance == best_distance and distance <= max_distance:
+                tied = True
+        return None if tied else best
@@ -1,11 +1,13 @@
 import spacy
-from spacy.training import Example
-from spacy.matcher import Matcher
-from spacy.util import filter_spans
+from spacy.util import minibatch, compounding
 import random
+import time
+from itertools import islice
 from pathlib import Path
 from train_data import TRAIN_DATA
-from spacy.language import Language
+from ner_corpus import DEFAULT_CACHE_DIR, ShardedCorpus, cached_corpus, held_out
+# The matcher components live in entity_matchers so inference does not import the training code
+from entity_matchers import game_entity_matcher, gesture_entity_matcher, pose_entity_matcher
 import os
 os.environ["KMP_DUPLICATE_LIB_OK"]="TRUE"
 
@@ -25,42 +27,88 @@ class NERTrainer:
             self.nlp = spacy.blank("en")  # Create a blank Language class
 
     def _add_entity_matchers(self):
-        # List of component names to add
-        component_names = [
-            "game_entity_matcher",
-            "gesture_entity_matcher",
-            "pose_entity_matcher",
-        ]
-        for component_name in component_names:
-            # Check if the component is not already in the pipeline
-            if component_name not in self.nlp.pipe_names:
-                # Add the component to the pipeline using its registered name
-                self.nlp.add_pipe(component_name, last=True)
-
-    def train(self, new_data=TRAIN_DATA, n_iter=200):
-        if "ner" not in self.nlp.pipe_names:
-            ner = self.nlp.add_pipe("ner", last=True)
+        # The fused matcher replaces the three per-label matchers of older models
+        for component_name in ["game_entity_matcher", "gesture_entity_matcher", "pose_entity_matcher"]:
+            if component_name in self.nlp.pipe_names:
+                self.nlp.remove_pipe(component_name)
+        # Check if the component is not already in the pipeline
+        if "motion_entity_matcher" not in self.nlp.pipe_names:
+            # Add the component to the pipeline using its registered name
+            self.nlp.add_pipe("motion_entity_matcher", last=True)
+
+    def train(self, new_data=TRAIN_DATA, n_iter=200, dev_split=0.2, patience=20, batch_sizes=(4.0, 32.0, 1.001), drop=0.5, seed=0,
+              corpus_dir=None, cache_dir=DEFAULT_CACHE_DIR, model_config=None):
+        """
+        Trains the NER component on new_data in minibatches whose size compounds from batch_sizes[0] up to
+        batch_sizes[1] by a factor of batch_sizes[2] per batch. A dev_split fraction of the examples is held
+        out and scored after every epoch. Training stops once the entity F-score has not improved for patience
+        epochs, and the weights of the best epoch are the ones that are saved.
+        The examples are streamed from the DocBin shards in corpus_dir, written by ner_corpus.py, or else from
+        new_data converted once into cache_dir and reused while new_data does not change.
+        model_config overrides the architecture of a new NER component, e.g. {"tok2vec": {"width": 64}}, and
+        raises ValueError for a loaded model that already has one, whose architecture is fixed.
+        Returns the best epoch, its dev scores and the number of epochs run.
+        """
+        new_ner = "ner" not in self.nlp.pipe_names
+        if model_config and not new_ner:
+            raise ValueError(f"{self.model_dir} already has an NER component, model_config only applies to a new one")
+        corpus = ShardedCorpus(corpus_dir) if corpus_dir else cached_corpus(new_data, cache_dir)
+        if new_ner:
+            ner = self.nlp.add_pipe("ner", last=True, config={"model": model_config} if model_config else {})
         else:
             ner = self.nlp.get_pipe("ner")
         
         # Add new entity labels to the NER model
-        for _, annotations in new_data:
-            for ent in annotations.get("entities"):
-                ner.add_label(ent[2])
+        for label in corpus.labels:
+            ner.add_label(label)
+
+        # Only the held out examples are kept in memory, the training examples are read shard by shard every epoch
+        rng = random.Random(seed)
+        dev_indices = held_out(corpus, dev_split, rng)
+        dev_examples = [example for index, example in enumerate(corpus.examples(self.nlp)) if index in dev_indices]
+        print(f"Training on {len(corpus) - len(dev_examples)} examples, {len(dev_examples)} held out")
+
+        def train_examples():
+            return corpus.examples(self.nlp, rng, skip=dev_indices)
 
         other_pipes = [pipe for pipe in self.nlp.pipe_names if pipe != "ner"]
-        with self.nlp.disable_pipes(*other_pipes):  # Only train NER
-            optimizer = self.nlp.resume_training()
-            for itn in range(n_iter):
-                random.shuffle(new_data)
+        with self.nlp.select_pipes(disable=other_pipes):  # Only train NER
+            if new_ner:
+                # A new NER component has no weights to resume from
+                optimizer = self.nlp.initialize(lambda: islice(train_examples(), 1000))
+            else:
+                optimizer = self.nlp.resume_training()
+            batch_sizes = compounding(*batch_sizes)
+            best = {"epoch": None, "scores": None, "weights": None}
+            epoch = 0
+            for epoch in range(1, n_iter + 1):
                 losses = {}
-                for text, annotations in new_data:
-                    doc = self.nlp.make_doc(text)
-                    example = Example.from_dict(doc, annotations)
-                    self.nlp.update([example], drop=0.5, losses=losses, sgd=optimizer)
-                print(f"Losses at iteration {itn}: {losses}")
-
+                words = 0
+                start = time.perf_counter()
+                for batch in minibatch(train_examples(), size=batch_sizes):
+                    self.nlp.update(batch, drop=drop, losses=losses, sgd=optimizer)
+                    words += sum(len(example.reference) for example in batch)
+                seconds = time.perf_counter() - start
+                message = f"Epoch {epoch}: {seconds:.2f} s, {words / seconds:,.0f} words/s, NER loss {losses.get('ner', 0.0):.2f}"
+
+                if not dev_examples:
+                    print(message)
+                    continue
+                scores = self.nlp.evaluate(dev_examples)
+                f_score = scores["ents_f"] or 0.0
+                print(f"{message}, dev P/R/F {scores['ents_p'] or 0.0:.3f}/{scores['ents_r'] or 0.0:.3f}/{f_score:.3f}")
+                if best["scores"] is None or f_score > best["scores"]["ents_f"]:
+                    best = {"epoch": epoch, "scores": {key: scores[key] or 0.0 for key in ("ents_p", "ents_r", "ents_f")},
+                            "weights": ner.to_bytes()}
+                elif epoch - best["epoch"] >= patience:
+                    print(f"No improvement for {patience} epochs, stopping")
+                    break
+
+        if best["weights"] is not None:
+            print(f"Keeping the weights of epoch {best['epoch']} (dev F {best['scores']['ents_f']:.3f})")
+            ner.from_bytes(best["weights"])
         self._save_model()
+        return {"best_epoch": best["epoch"] or epoch, "scores": best["scores"], "epochs": epoch}
 
     def _save_model(self):
         output_dir = Path(self.model_dir)
@@ -70,135 +118,14 @@ class NERTrainer:
         print(f"Saved model to: {output_dir}")
 
 
-
-# Function to add game matcher to an NLP object
-@Language.component("game_entity_matcher")
-def game_entity_matcher(doc):
-    matcher = Matcher(doc.vocab)
-    patterns = [
-        [{"LOWER": "minecraft"}],
-        [{"LOWER": "rocket"}, {"LOWER": "league"}],
-        [{"LOWER": "tetris"}],
-        [{"LOWER": "tetris"}],
-        [{"LOWER": "horizon"}],
-        [{"LOWER": "fifa"}],
-        [{"LOWER": "final"}, {"LOWER": "fantasy"}],
-        [{"LOWER": "poker"}],
-        [{"LOWER": "roblox"}],
-        [{"LOWER": "final"}, {"LOWER": "fantasy"}, {"IS_DIGIT": True}],
-        [{"LOWER": "final"}, {"LOWER": "fantasy"}, {"TEXT": {"REGEX": "^(X|V|I)+$"}}],
-        [{"LOWER": "rocketleague"}, {"OP": "?"}],
-        [{"LOWER": "star"}, {"LOWER": "wars"}, {"IS_ALPHA": True, "OP": "*"}],
-    ]
-    matcher.add("GAME", patterns)
-    matches = matcher(doc)
-    spans = [doc[start:end] for match_id, start, end in matches]
-    filtered_spans = filter_spans(spans)
-
-    with doc.retokenize() as retokenizer:
-        for span in filtered_spans:
-            retokenizer.merge(span)
-
-    for span in filtered_spans:
-        span.root.ent_type_ = "GAME"
-    return doc
-
-@Language.component("gesture_entity_matcher")
-def gesture_entity_matcher(doc):
-    matcher = Matcher(doc.vocab)
-    # Patterns based on the gestures list
-    gesture_patterns = [
-        [{"LOWER": "bow"}, {"LOWER": "arrow"}],
-        [{"LOWER": "fighting"}, {"LOWER": "stance"}],
-        [{"LOWER": "front"}, {"LOWER": "kick"}],
-        [{"LOWER": "hadouken"}],
-        [{"LOWER": "helicopter"}],
-        [{"LOWER": "index"}, {"LOWER": "pinch"}],
-        [{"LOWER": "kick"}],
-        [{"LOWER": "left"}, {"LOWER": "hook"}],
-        [{"LOWER": "left"}, {"LOWER": "kick"}],
-        [{"LOWER": "left"}, {"LOWER": "punch"}],
-        [{"LOWER": "mine"}],
-        [{"LOWER": "punch"}],
-        [{"LOWER": "push"}, {"LOWER": "back"}],
-        [{"LOWER": "right"}, {"LOWER": "clockwise"}, {"LOWER": "circle"}],
-        [{"LOWER": "right"}, {"LOWER": "hook"}],
-        [{"LOWER": "right"}, {"LOWER": "kick"}],
-        [{"LOWER": "right"}, {"LOWER": "punch"}],
-        [{"LOWER": "uppercut"}],
-        [{"LOWER": "walk"}, {"LOWER": "left"}],
-        [{"LOWER": "walk"}, {"LOWER": "right"}],
-    ]
-    matcher
-    matcher.add("GESTURE", gesture_patterns)
-    matches = matcher(doc)
-    spans = [doc[start:end] for match_id, start, end in matches]
-    filtered_spans = filter_spans(spans)
-
-    with doc.retokenize() as retokenizer:
-        for span in filtered_spans:
-            retokenizer.merge(span)
-
-    for span in filtered_spans:
-        span.root.ent_type_ = "GESTURE"
-    return doc
-
-@Language.component("pose_entity_matcher")
-def pose_entity_matcher(doc):
-    matcher = Matcher(doc.vocab)
-    # Patterns based on the poses list
-    pose_patterns = [
-        [{"LOWER": "fist"}],
-        [{"LOWER": "fist2"}],
-        [{"LOWER": "five"}, {"LOWER": "fingers"}, {"LOWER": "pinch"}],
-        [{"LOWER": "four"}, {"LOWER": "fingers"}, {"LOWER": "pinch"}],
-        [{"LOWER": "full"}, {"LOWER": "pinch"}],
-        [{"LOWER": "gun"}, {"LOWER": "click"}],
-        [{"LOWER": "gun"}, {"LOWER": "click2"}],
-        [{"LOWER": "gun"}, {"LOWER": "click3"}],
-        [{"LOWER": "hand"}, {"LOWER": "backward"}],
-        [{"LOWER": "hand"}, {"LOWER": "forward"}],
-        [{"LOWER": "index"}, {"LOWER": "pinch"}],
-        [{"LOWER": "index"}],
-        [{"LOWER": "palm"}, {"LOWER": "stop"}],
-        [{"LOWER": "peace"}],
-        [{"LOWER": "pinky"}, {"LOWER": "2"}, {"LOWER": "up"}],
-        [{"LOWER": "pinky"}, {"LOWER": "3"}, {"LOWER": "up"}],
-        [{"LOWER": "pinky"}, {"LOWER": "up"}, {"LOWER": "education"}],
-        [{"LOWER": "pinky"}, {"LOWER": "up"}],
-        [{"LOWER": "punch"}, {"LOWER": "heavy"}],
-        [{"LOWER": "punch"}, {"LOWER": "light"}],
-        [{"LOWER": "shoot"}],
-        [{"LOWER": "three"}, {"LOWER": "fingers"}, {"LOWER": "pinch"}, {"LOWER": "hand"}, {"LOWER": "closed"}],
-        [{"LOWER": "three"}, {"LOWER": "fingers"}, {"LOWER": "pinch"}],
-        [{"LOWER": "three"}, {"LOWER": "fingers"}, {"LOWER": "release"}, {"LOWER": "hand"}, {"LOWER": "closed"}],
-        [{"LOWER": "three"}, {"LOWER": "fingers"}],
-        [{"LOWER": "thumb"}, {"LOWER": "index"}, {"LOWER": "pinch"}, {"LOWER": "hand"}, {"LOWER": "closed"}],
-        [{"LOWER": "thumb"}, {"LOWER": "index"}, {"LOWER": "pinch"}],
-        [{"LOWER": "thumb"}, {"LOWER": "index"}, {"LOWER": "release"}, {"LOWER": "hand"}, {"LOWER": "closed"}],
-        [{"LOWER": "thumb"}, {"LOWER": "index"}, {"LOWER": "release"}],
-        [{"LOWER": "thumb"}, {"LOWER": "middle"}, {"LOWER": "pinch"}],
-        [{"LOWER": "thumb"}, {"LOWER": "middle"}, {"LOWER": "release"}],
-        [{"LOWER": "thumb"}, {"LOWER": "pinky"}, {"LOWER": "pinch"}],
-        [{"LOWER": "thumb"}, {"LOWER": "pinky"}, {"LOWER": "release"}],
-        [{"LOWER": "thumb"}, {"LOWER": "ring"}, {"LOWER": "pinch"}],
-        [{"LOWER": "thumb"}, {"LOWER": "ring"}, {"LOWER": "release"}],
-        [{"LOWER": "thumb"}, {"LOWER": "up"}],
-    ]
-    matcher.add("POSES", pose_patterns)
-    matches = matcher(doc)
-    spans = [doc[start:end] for match_id, start, end in matches]
-    filtered_spans = filter_spans(spans)
-
-    with doc.retokenize() as retokenizer:
-        for span in filtered_spans:
-            retokenizer.merge(span)
-
-    for span in filtered_spans:
-        span.root.ent_type_ = "POSES"
-    return doc
-
-
 if __name__ == "__main__":
-    trainer = NERTrainer()
-    trainer.train()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the NER model on TRAIN_DATA.")
+    parser.add_argument("--corpus", default=None, help="DocBin corpus written by ner_corpus.py to train on instead of TRAIN_DATA.")
+    parser.add_argument("--model-dir", default="./ner_model", help="Model to continue training, created if it does not exist.")
+    parser.add_argument("--n-iter", type=int, default=200, help="Maximum number of epochs.")
+    parser.add_argument("--dev-split", type=float, default=0.2, help="Fraction of the examples held out for early stopping, 0 trains on all of them.")
+    parser.add_argument("--patience", type=int, default=20, help="Epochs without a better dev F-score before training stops.")
+    args = parser.parse_args()
+    trainer = NERTrainer(args.model_dir)
+    trainer.train(n_iter=args.n_iter, dev_split=args.dev_split, patience=args.patience, corpus_dir=args.corpus)
\ No newline at end of file
@@ -0,0 +1,94 @@
+import copy
+import re
+
+# Clauses end at punctuation or right before a new request, e.g. "... thumb down I want to ..."
+CLAUSE_BOUNDARY = re.compile(r"(?<=[.,;!?])\s+|\s+(?=(?:I want|I'd like|then)\b)", re.IGNORECASE)
+OUTPUT_FIELDS = ("mode", "orientation", "landmark")
+BINDING_TYPES = ("poses", "gestures")
+
+
+def split_clauses(transcript):
+    """
+    Splits a transcript into clauses. A growing transcript only changes its last clause or appends new ones.
+    """
+    return [clause for clause in CLAUSE_BOUNDARY.split(transcript.strip()) if clause]
+
+
+def config_diff(old, new):
+    """
+    Returns the changes from one output structure to the next: the changed fields and the pose and gesture
+    bindings that were added, changed or removed, identified by their list and index.
+    """
+    diff = {"fields": {field: new[field] for field in OUTPUT_FIELDS if old[field] != new[field]}, "added": [], "changed": [], "removed": []}
+    for binding_type in BINDING_TYPES:
+        old_bindings, new_bindings = old[binding_type], new[binding_type]
+        for index, binding in enumerate(new_bindings):
+            if index >= len(old_bindings):
+                diff["added"].append({"type": binding_type, "index": index, "binding": binding})
+            elif binding != old_bindings[index]:
+                diff["changed"].append({"type": binding_type, "index": index, "binding": binding})
+        for index in range(len(new_bindings), len(old_bindings)):
+            diff["removed"].append({"type": binding_type, "index": index})
+    return diff
+
+
+class TranscriptSession:
+    """
+    Follows a live transcript that grows as it is dictated. Each update only runs NER on the clauses that
+    changed since the last update, usually just the tail one, and reuses the entities of the stable prefix.
+    Pose and gesture bindings are remembered too, so per-update work does not grow with the utterance.
+    """
+
+    def __init__(self, mapper):
+        self.mapper = mapper
+        self.transcript = ""
+        self.output = mapper.initialize_output_structure()
+        # (clause, [(label, text), ...]) per clause of the transcript
+        self._clauses = []
+        # (pose_or_gesture, action, game) -> (binding type, binding)
+        self._bindings = {}
+
+    def update(self, transcript):
+        """
+        Takes the whole transcript so far and returns the config diff from the previous update, see config_diff.
+        The full output structure is kept in self.output.
+        """
+        clauses = split_clauses(transcript)
+        stable = 0
+        while stable < min(len(clauses), len(self._clauses)) and self._clauses[stable][0] == clauses[stable]:
+            stable += 1
+        changed = clauses[stable:]
+        docs = self.mapper.nlp.pipe(changed) if len(changed) > 1 else [self.mapper.nlp(clause) for clause in changed]
+        self._clauses = self._clauses[:stable] + [(clause, [(ent.label_, ent.text) for ent in doc.ents]) for clause, doc in zip(changed, docs)]
+        self.transcript = transcript
+
+        output = self._build_output()
+        diff = config_diff(self.output, output)
+        self.output = output
+        return diff
+
+    def _build_output(self):
+        output = self.mapper.initialize_output_structure()
+        fields, game, pairs = self.mapper._parse_entities([entity for _, entities in self._clauses for entity in entities])
+        output.update(fields)
+        if game == '':
+            output["mode"] = "No Game Selected"
+            return output
+        game = self.mapper.resolve_game(game)
+        output["mode"] = game
+        if pairs and self.mapper._refresh_catalogs():
+            # The catalogs changed, earlier matches may be stale
+            self._bindings.clear()
+        for pose_or_gesture, action in pairs:
+            key = (pose_or_gesture, action, game)
+            if key not in self._bindings:
+                self._bindings[key] = self.mapper._bind_pair(pose_or_gesture, action, game)
+            binding_type, binding = self._bindings[key]
+            output[binding_type].append(copy.deepcopy(binding))
+        return output
+
+    def reset(self):
+        """
+        Starts over for a new utterance.
+        """
+        self.__init__(self.mapper)
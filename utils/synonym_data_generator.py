@@ -1,92 +1,231 @@
-from spacy.util import filter_spans
-import nltk
-from nltk.corpus import wordnet
+import bisect
+import json
+import multiprocessing
+import os
 import random
-from itertools import chain
+import re
+import tempfile
+from itertools import islice
 from train_data import TRAIN_DATA
 
-nltk.download('wordnet', quiet=True)
+# Words are runs of letters, so punctuation and numbers next to them are never replaced
+WORD = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?")
+DEFAULT_SYNONYM_CACHE = os.path.join(tempfile.gettempdir(), "synonym_cache", "synonyms.json")
+
+# The synonym table and settings of the current worker process, set by _init_worker
+_worker_augmenter = None
+
+
+def build_synonym_table(words, max_synonyms=10):
+    """
+    Looks every word up in WordNet once and returns a dict of lowercased word to its synonyms.
+    Words without synonyms map to an empty list, so they are not looked up again.
+    """
+    import nltk
+    from nltk.corpus import wordnet
+    nltk.download('wordnet', quiet=True)
+    table = {}
+    for word in words:
+        synonyms = []
+        for synset in wordnet.synsets(word):
+            for lemma in synset.lemma_names():
+                synonym = lemma.replace("_", " ")
+                if synonym.lower() != word and synonym not in synonyms:
+                    synonyms.append(synonym)
+        table[word] = synonyms[:max_synonyms]
+    return table
+
+
+def load_synonym_table(words, cache_path=DEFAULT_SYNONYM_CACHE):
+    """
+    Returns the synonym table of words, read from the JSON cache at cache_path. Words missing from the
+    cache are looked up in WordNet and the cache is updated, so each word is looked up once ever.
+    """
+    table = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as cache_file:
+            table = json.load(cache_file)
+    missing = sorted(set(words) - table.keys())
+    if missing:
+        table.update(build_synonym_table(missing))
+        if cache_path:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as cache_file:
+                json.dump(table, cache_file, indent=1, sort_keys=True)
+    return table
+
+
+def vocabulary(train_data):
+    """
+    Returns the lowercased words of train_data that are outside every entity, the only ones that get replaced.
+    """
+    words = set()
+    for text, annotations in train_data:
+        spans = annotations["entities"]
+        for match in WORD.finditer(text):
+            if not any(match.start() < end and start < match.end() for start, end, _ in spans):
+                words.add(match.group().lower())
+    return words
+
 
 class DataAugmenter:
     """
     A class for augmenting NLP training data using synonym replacement.
+    Only words outside the entity spans are replaced, so entities keep their text and their offsets are
+    moved by the length changes of the words before them. The synonym table is built once for the
+    vocabulary of the data and cached on disk, and variants are generated in parallel and streamed.
     """
 
-    def __init__(self, train_data):
+    def __init__(self, train_data, synonyms=None, synonym_cache_path=DEFAULT_SYNONYM_CACHE, variants_per_sentence=1, replace_prob=0.5, seed=0):
         """
         Initializes the DataAugmenter with the training data.
 
         :param train_data: The initial training data.
+        :param synonyms: An optional dict of lowercased word to synonyms, by default looked up in WordNet.
+        :param synonym_cache_path: JSON file the WordNet lookups are cached in, None to not cache them.
+        :param variants_per_sentence: The number of distinct variants generated per sentence, fewer if a sentence has too few synonyms.
+        :param replace_prob: The probability that a word with synonyms is replaced.
+        :param seed: The same seed generates the same variants, with any number of workers.
         """
         self.train_data = train_data
+        self.synonyms = synonyms if synonyms is not None else load_synonym_table(vocabulary(train_data), synonym_cache_path)
+        self.variants_per_sentence = variants_per_sentence
+        self.replace_prob = replace_prob
+        self.seed = seed
 
-    def synonym_replacement(self, text, entity_spans):
+    def synonym_replacement(self, text, entity_spans, rng=random):
         """
         Replaces words in the given text with their synonyms.
 
         :param text: The text to process.
         :param entity_spans: The spans of entities in the text.
+        :param rng: The random generator that picks the words and synonyms.
         :return: A tuple of the new text and updated entity spans.
         """
-        words = text.split()
-        new_words = words.copy()
-        changes = {}  # Track changes in word lengths
+        pieces = []
+        # End offset of each replaced word and the total length change up to and including it
+        ends = []
+        shifts = []
+        shift = 0
+        position = 0
+        for match in WORD.finditer(text):
+            start, end = match.span()
+            if any(start < span_end and span_start < end for span_start, span_end, _ in entity_spans):
+                continue
+            synonyms = self.synonyms.get(match.group().lower())
+            if not synonyms or rng.random() >= self.replace_prob:
+                continue
+            synonym = rng.choice(synonyms)
+            if match.group()[0].isupper():
+                synonym = synonym[0].upper() + synonym[1:]
+            pieces.append(text[position:start])
+            pieces.append(synonym)
+            position = end
+            shift += len(synonym) - (end - start)
+            ends.append(end)
+            shifts.append(shift)
+        pieces.append(text[position:])
 
-        for i, word in enumerate(words):
-            synonyms = set(chain.from_iterable([syn.lemma_names() for syn in wordnet.synsets(word)]))
-            synonyms.discard(word.lower())  # Discard the original word to avoid redundancy
-            if synonyms:
-                synonym = random.choice(list(synonyms))
-                changes[i] = (len(word), len(synonym))  # Original and new length
-                new_words[i] = synonym
+        def moved(offset):
+            index = bisect.bisect_right(ends, offset)
+            return offset + (shifts[index - 1] if index else 0)
 
-        new_text = ' '.join(new_words)
-        new_spans = self.adjust_entity_spans(text, new_text, entity_spans)
+        return "".join(pieces), [(moved(start), moved(end), label) for start, end, label in entity_spans]
 
-        return new_text, new_spans
+    def variants(self, index, text, entity_spans):
+        """
+        Returns up to variants_per_sentence distinct variants of the sentence at index of the training data.
+        """
+        rng = random.Random(self.seed * 1000003 + index)
+        seen = {text}
+        variants = []
+        # Sentences with few synonyms cannot have many distinct variants, give up after a few misses
+        attempts = self.variants_per_sentence * 4
+        while len(variants) < self.variants_per_sentence and attempts:
+            attempts -= 1
+            new_text, new_spans = self.synonym_replacement(text, entity_spans, rng)
+            if new_text not in seen:
+                seen.add(new_text)
+                variants.append((new_text, {"entities": new_spans}))
+        return variants
 
-    def augment_data_with_synonyms(self):
+    def iter_augmented(self, workers=1, chunk_size=64):
+        """
+        Yields the variants of every sentence in training data order. With more than one worker, the
+        sentences are spread over a process pool.
+        """
+        tasks = ((index, text, [tuple(span) for span in annotations["entities"]]) for index, (text, annotations) in enumerate(self.train_data))
+        chunks = iter(lambda: list(islice(tasks, chunk_size)), [])
+        if workers <= 1:
+            for chunk in chunks:
+                yield from _augment_chunk(chunk, self)
+            return
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(self.synonyms, self.variants_per_sentence, self.replace_prob, self.seed)) as pool:
+            for variants in pool.imap(_augment_chunk, chunks):
+                yield from variants
+
+    def augment_data_with_synonyms(self, workers=1):
         """
         Augments the training data with synonym replacements.
 
         :return: The augmented training data.
         """
-        augmented_data = []
-        for text, annotations in self.train_data:
-            entity_spans = [(start, end, label) for start, end, label in annotations['entities']]
-            augmented_text, new_entity_spans = self.synonym_replacement(text, entity_spans)
-            new_annotations = {"entities": new_entity_spans}
-            augmented_data.append((augmented_text, new_annotations))
-        return augmented_data + self.train_data
-
-    @staticmethod
-    def adjust_entity_spans(original_text, new_text, original_spans):
-        """
-        Adjusts the entity spans in the new text.
+        return list(self.iter_augmented(workers)) + self.train_data
 
-        :param original_text: The original text.
-        :param new_text: The new text with synonyms replaced.
-        :param original_spans: The original entity spans.
-        :return: The adjusted entity spans.
+    def write_jsonl(self, output_path, workers=1, include_original=True):
+        """
+        Streams the variants (and the original examples) to output_path, one {"text", "entities"} object per
+        line, without holding them in memory. Returns the number of lines written.
         """
-        from difflib import SequenceMatcher
-        matcher = SequenceMatcher(None, original_text, new_text)
-        new_spans = []
-
-        for opcode in matcher.get_opcodes():
-            tag, i1, i2, j1, j2 = opcode
-            if tag == 'equal':
-                shift = j1 - i1
-                for start, end, label in original_spans:
-                    if start >= i1 and end <= i2:
-                        new_start = start + shift
-                        new_end = end + shift
-                        new_spans.append((new_start, new_end, label))
-        return new_spans
+        count = 0
+        with open(output_path, "w", encoding="utf-8") as output_file:
+            examples = self.iter_augmented(workers)
+            if include_original:
+                examples = _chain(self.train_data, examples)
+            for text, annotations in examples:
+                output_file.write(json.dumps({"text": text, "entities": [list(span) for span in annotations["entities"]]}) + "\n")
+                count += 1
+        return count
+
+
+def read_jsonl(input_path):
+    """
+    Yields the (text, {"entities": [...]}) examples of a file written by DataAugmenter.write_jsonl.
+    """
+    with open(input_path, encoding="utf-8") as input_file:
+        for line in input_file:
+            if line.strip():
+                record = json.loads(line)
+                yield record["text"], {"entities": [tuple(span) for span in record["entities"]]}
+
+
+def _chain(first, second):
+    yield from first
+    yield from second
+
+
+def _init_worker(synonyms, variants_per_sentence, replace_prob, seed):
+    global _worker_augmenter
+    _worker_augmenter = DataAugmenter([], synonyms, None, variants_per_sentence, replace_prob, seed)
+
+
+def _augment_chunk(chunk, augmenter=None):
+    augmenter = augmenter or _worker_augmenter
+    return [variant for index, text, spans in chunk for variant in augmenter.variants(index, text, spans)]
+
 
 # Example usage:
 if __name__ == "__main__":
-    # Assuming TRAIN_DATA is defined elsewhere and imported
-    augmenter = DataAugmenter(TRAIN_DATA)
-    augmented_data = augmenter.augment_data_with_synonyms()
-    print(augmented_data)
+    import argparse
+    parser = argparse.ArgumentParser(description="Grow TRAIN_DATA with synonym replacement variants.")
+    parser.add_argument("--output", default=None, help="Stream the examples to this JSONL file instead of printing them.")
+    parser.add_argument("--variants", type=int, default=1, help="Number of variants per sentence.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    augmenter = DataAugmenter(TRAIN_DATA, variants_per_sentence=args.variants, seed=args.seed)
+    if args.output:
+        print(f"Wrote {augmenter.write_jsonl(args.output, args.workers)} examples to {args.output}")
+    else:
+        print(augmenter.augment_data_with_synonyms(args.workers))